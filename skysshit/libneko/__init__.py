@@ -48,6 +48,8 @@ from libneko import (
     filesystem,
     funcmods,
     logging,
+    loopmonitor,
+    metrics,
     other,
     permissions,
     properties,
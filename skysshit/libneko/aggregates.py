@@ -41,6 +41,7 @@ __all__ = (
     "TwoWayDict",
     "ObservableAsyncQueue",
     "ObservableAsyncQueueType",
+    "QueueSnapshot",
     "ValueT",
     "ImmutableProxy",
     "Proxy",
@@ -50,6 +51,7 @@ __all__ = (
 
 import asyncio
 import types
+import weakref
 from collections import *
 
 import typing
@@ -63,28 +65,29 @@ class FrozenOrderedSet(typing.AbstractSet, typing.Generic[SetType]):
     """
     An ordered unique set implementation that is frozen after definition.
 
-    This uses a tuple underneath. To have mutability, you may use ``MutableOrderedSet``
-    instead. That relies on a different internal representation.
+    This uses a tuple underneath, along with a dict mapping each element to its
+    index, so membership tests, indexing and :meth:`index` are all O(1). To have
+    mutability, you may use ``MutableOrderedSet`` instead.
+
+    This supports everything :class:`frozenset` does, with results keeping the
+    order of the left hand operand followed by the right.
     """
 
-    def __init__(self, iterable: typing.Iterable = None) -> None:
-        data = list()
+    __slots__ = ("_data", "_index")
 
-        # Do this as sets have a lower time complexity for lookups, so this will
-        # be exponentially more efficient for large datasets.
-        hashed_unordered_data = set()
+    def __init__(self, iterable: typing.Iterable = None) -> None:
+        # Maps each element to its index. Dicts keep insertion order, so this
+        # also gives us the order to store the data in.
+        self._index = {}
 
-        for item in iterable:
-            if item not in hashed_unordered_data:
-                data.append(item)
-                hashed_unordered_data.add(item)
+        for item in iterable or ():
+            self._index.setdefault(item, len(self._index))
 
-        self._data = tuple(data)
-        del data, hashed_unordered_data
+        self._data = tuple(self._index)
 
     def __contains__(self, x: SetType) -> bool:
         """Return true if the given object is present in the set."""
-        return x in self._data
+        return x in self._index
 
     def __len__(self) -> int:
         """Get the length of the set."""
@@ -94,49 +97,149 @@ class FrozenOrderedSet(typing.AbstractSet, typing.Generic[SetType]):
         """Return an iterator across the set."""
         return iter(self._data)
 
+    def __reversed__(self) -> typing.Iterator[SetType]:
+        """Return an iterator across the set, last element first."""
+        return reversed(self._data)
+
     def __getitem__(self, index: int) -> SetType:
         """Access the element at the given index in the set."""
         return self._data[index]
 
+    def index(self, x: SetType) -> int:
+        """Get the index of the given element. Raises ValueError if not present."""
+        try:
+            return self._index[x]
+        except KeyError:
+            raise ValueError(f"{x!r} is not in set") from None
+
+    def __hash__(self) -> int:
+        """Hashes the same as a frozenset of the same elements, which it also compares equal to."""
+        return hash(frozenset(self._index))
+
     def __str__(self) -> str:
         """Get the string representation of the set."""
         return f'{{{",".join(repr(k) for k in self)}}}'
 
     __repr__ = __str__
 
+    def copy(self):
+        """Return a shallow copy of the set."""
+        return type(self)(self)
+
+    def union(self, *others: typing.Iterable):
+        """Return the elements in this set or any of the others."""
+        return type(self)(item for iterable in (self, *others) for item in iterable)
+
+    def intersection(self, *others: typing.Iterable):
+        """Return the elements in this set and all of the others."""
+        others = [o if isinstance(o, typing.AbstractSet) else set(o) for o in others]
+        return type(self)(item for item in self if all(item in o for o in others))
+
+    def difference(self, *others: typing.Iterable):
+        """Return the elements in this set but none of the others."""
+        others = [o if isinstance(o, typing.AbstractSet) else set(o) for o in others]
+        return type(self)(item for item in self if not any(item in o for o in others))
+
+    def symmetric_difference(self, other: typing.Iterable):
+        """Return the elements in exactly one of this set and the other."""
+        other = other if isinstance(other, typing.AbstractSet) else FrozenOrderedSet(other)
+        return type(self)(
+            [*(item for item in self if item not in other), *(item for item in other if item not in self)]
+        )
 
-class MutableOrderedSet(typing.AbstractSet, typing.Generic[SetType]):
+    def issubset(self, other: typing.Iterable) -> bool:
+        """Return true if every element of this set is in the other."""
+        return self <= (other if isinstance(other, typing.AbstractSet) else set(other))
+
+    def issuperset(self, other: typing.Iterable) -> bool:
+        """Return true if every element of the other is in this set."""
+        return all(item in self for item in other)
+
+    def __and__(self, other):
+        # The default implementation keeps the order of the other operand.
+        if not isinstance(other, typing.Iterable):
+            return NotImplemented
+        return self.intersection(other)
+
+
+# Marks a removed element in a ``MutableOrderedSet``.
+_TOMBSTONE = object()
+
+
+class MutableOrderedSet(typing.MutableSet, typing.Generic[SetType]):
     """
     A set data-type that maintains insertion order. This implementation is mutable.
 
-    This is implemented as a valueless ordered dict underneath, and thus
-    time complexities should match that implementation.
+    Elements are kept in a list, along with a dict mapping each element to its slot
+    in the list, so membership tests and adding are O(1). Removing an element leaves
+    a tombstone in its slot rather than shifting everything after it down, and the
+    list is compacted once tombstones make up half of it.
+
+    Indexing is O(1) as long as there are no tombstones between the first and last
+    elements (so removing from either end never slows it down). Otherwise the first
+    index after removals compacts the list, so indexing is O(1) amortized over the
+    removals since.
 
     Any implementation here should match the implementation of the Python Set type.
     """
 
+    __slots__ = ("_items", "_index", "_start", "_holes")
+
     def __init__(self, iterable: typing.Iterable = None) -> None:
-        # This implementation is just a dictionary that only utilises the keys.
-        if iterable:
-            self._dict = OrderedDict({k: None for k in iterable})
-        else:
-            self._dict = OrderedDict()
+        #: Maps each element to its slot in ``_items``.
+        self._index = {}
+        for item in iterable or ():
+            self._index.setdefault(item, len(self._index))
+        self._items = list(self._index)
+        # Slot of the first element; everything before it is a tombstone.
+        self._start = 0
+        # Number of tombstones after the first element.
+        self._holes = 0
+
+    def _compact(self) -> None:
+        """Remove all tombstones."""
+        self._items = [item for item in self._items if item is not _TOMBSTONE]
+        self._index = {item: i for i, item in enumerate(self._items)}
+        self._start = self._holes = 0
 
     def __contains__(self, x: SetType) -> bool:
         """Return true if the given object is present in the set."""
-        return x in self._dict
+        return x in self._index
 
     def __len__(self) -> int:
         """Get the length of the set."""
-        return len(self._dict)
+        return len(self._index)
 
     def __iter__(self) -> typing.Iterator[SetType]:
         """Return an iterator across the set."""
-        return iter(self._dict)
+        return (item for item in self._items[self._start :] if item is not _TOMBSTONE)
+
+    def __reversed__(self) -> typing.Iterator[SetType]:
+        """Return an iterator across the set, last element first."""
+        return (item for item in reversed(self._items) if item is not _TOMBSTONE)
 
     def __getitem__(self, index: int) -> SetType:
         """Access the element at the given index in the set."""
-        return list(self._dict.keys())[index]
+        if self._holes:
+            self._compact()
+
+        size = len(self._index)
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(size))]
+
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("set index out of range")
+        return self._items[self._start + index]
+
+    def index(self, x: SetType) -> int:
+        """Get the index of the given element. Raises ValueError if not present."""
+        if x not in self._index:
+            raise ValueError(f"{x!r} is not in set")
+        if self._holes:
+            self._compact()
+        return self._index[x] - self._start
 
     def __str__(self) -> str:
         """Get the string representation of the set."""
@@ -145,12 +248,102 @@ class MutableOrderedSet(typing.AbstractSet, typing.Generic[SetType]):
     __repr__ = __str__
 
     def add(self, x: SetType) -> None:
-        """Adds a new element to the set."""
-        self._dict[x] = None
+        """Adds a new element to the set. Does nothing if it is already present."""
+        if x not in self._index:
+            self._index[x] = len(self._items)
+            self._items.append(x)
 
     def discard(self, x: SetType) -> None:
-        """Removes an element from the set."""
-        self._dict.pop(x)
+        """Removes an element from the set. Does nothing if it is not present."""
+        try:
+            slot = self._index.pop(x)
+        except KeyError:
+            return
+
+        items = self._items
+        items[slot] = _TOMBSTONE
+
+        if slot == len(items) - 1:
+            # Removed the last element, so drop it and any tombstones before it.
+            items.pop()
+            while len(items) > self._start and items[-1] is _TOMBSTONE:
+                items.pop()
+                self._holes -= 1
+            if len(items) <= self._start:
+                # That was the only element.
+                items.clear()
+                self._start = self._holes = 0
+        elif slot == self._start:
+            # Removed the first element, so skip the tombstones after it.
+            self._start += 1
+            while items[self._start] is _TOMBSTONE:
+                self._start += 1
+                self._holes -= 1
+        else:
+            self._holes += 1
+
+        if self._start + self._holes > len(items) // 2:
+            self._compact()
+
+    def pop(self, index: int = -1) -> SetType:
+        """
+        Remove and return the element at the given index, which defaults to the last.
+
+        Raises KeyError if the set is empty.
+        """
+        if not self._index:
+            raise KeyError("pop from an empty set")
+        item = self[index]
+        self.discard(item)
+        return item
+
+    def clear(self) -> None:
+        """Remove every element."""
+        self._items = []
+        self._index = {}
+        self._start = self._holes = 0
+
+    def copy(self):
+        """Return a shallow copy of the set."""
+        return type(self)(self)
+
+    union = FrozenOrderedSet.union
+    intersection = FrozenOrderedSet.intersection
+    difference = FrozenOrderedSet.difference
+    symmetric_difference = FrozenOrderedSet.symmetric_difference
+    issubset = FrozenOrderedSet.issubset
+    issuperset = FrozenOrderedSet.issuperset
+    __and__ = FrozenOrderedSet.__and__
+
+    def update(self, *others: typing.Iterable) -> None:
+        """Add the elements of all of the others."""
+        for other in others:
+            for item in other:
+                self.add(item)
+
+    def intersection_update(self, *others: typing.Iterable) -> None:
+        """Keep only the elements that are also in all of the others."""
+        others = [o if isinstance(o, typing.AbstractSet) else set(o) for o in others]
+        for item in [item for item in self if not all(item in o for o in others)]:
+            self.discard(item)
+
+    def difference_update(self, *others: typing.Iterable) -> None:
+        """Remove the elements of all of the others."""
+        for other in others:
+            for item in other:
+                self.discard(item)
+
+    def symmetric_difference_update(self, other: typing.Iterable) -> None:
+        """Keep the elements in exactly one of this set and the other."""
+        for item in FrozenOrderedSet(other):
+            if item in self:
+                self.discard(item)
+            else:
+                self.add(item)
+
+
+#: The default ordered set type.
+OrderedSet = MutableOrderedSet
 
 
 class TwoWayDict(OrderedDict):
@@ -205,42 +398,206 @@ class TwoWayDict(OrderedDict):
 ObservableAsyncQueueType = typing.TypeVar("QueueType")
 
 
-class ObservableAsyncQueue(asyncio.Queue, typing.Generic[ObservableAsyncQueueType]):
+class _RingBuffer(typing.Sequence):
     """
-    Override of an asyncio queue to provide a way of safely viewing the
-    queue contents non-asynchronously using shallow copies.
+    A double-ended queue in a circular list. Unlike a deque, indexing anywhere is O(1).
 
-    This is a really bad implementation. Probably will write a less crappy one in the
-    future when I feel like it.
+    Pushing and popping at either end is amortized O(1). The capacity doubles when
+    full, and halves when less than a quarter full.
     """
 
-    @cached_property()
-    def view(self) -> deque:
-        return self._queue.copy()
+    __slots__ = ("_items", "_head", "_size")
 
-    def _put(self, item):
-        super()._put(item)
+    _MIN_CAPACITY = 8
+
+    def __init__(self, iterable: typing.Iterable = ()) -> None:
+        items = list(iterable)
+        self._size = len(items)
+        capacity = self._MIN_CAPACITY
+        while capacity < self._size:
+            capacity *= 2
+        self._items = items + [None] * (capacity - self._size)
+        self._head = 0
+
+    def _resize(self, capacity: int) -> None:
+        self._items = list(self) + [None] * (capacity - self._size)
+        self._head = 0
 
-        # Maybe invalidate the cache if there is one.
-        if "view" in self.__dict__:
-            del self.__dict__["view"]
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("queue index out of range")
+        return self._items[(self._head + index) % len(self._items)]
+
+    def __iter__(self):
+        items, head, capacity = self._items, self._head, len(self._items)
+        for i in range(self._size):
+            yield items[(head + i) % capacity]
 
+    def __eq__(self, other):
+        if not isinstance(other, (typing.Sequence, deque)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def append(self, item) -> None:
+        """Pushes onto the back."""
+        if self._size == len(self._items):
+            self._resize(2 * len(self._items))
+        self._items[(self._head + self._size) % len(self._items)] = item
+        self._size += 1
+
+    def appendleft(self, item) -> None:
+        """Pushes onto the front."""
+        if self._size == len(self._items):
+            self._resize(2 * len(self._items))
+        self._head = (self._head - 1) % len(self._items)
+        self._items[self._head] = item
+        self._size += 1
+
+    def popleft(self):
+        """Pops from the front."""
+        if not self._size:
+            raise IndexError("pop from an empty queue")
+        item, self._items[self._head] = self._items[self._head], None
+        self._head = (self._head + 1) % len(self._items)
+        self._size -= 1
+        self._maybe_shrink()
         return item
 
-    def _get(self):
-        item = super()._get()
+    def pop(self):
+        """Pops from the back."""
+        if not self._size:
+            raise IndexError("pop from an empty queue")
+        index = (self._head + self._size - 1) % len(self._items)
+        item, self._items[index] = self._items[index], None
+        self._size -= 1
+        self._maybe_shrink()
+        return item
+
+    def _maybe_shrink(self) -> None:
+        capacity = len(self._items)
+        if capacity > self._MIN_CAPACITY and self._size < capacity // 4:
+            self._resize(capacity // 2)
+
+    def clear(self) -> None:
+        """Removes everything."""
+        self._items = [None] * self._MIN_CAPACITY
+        self._head = self._size = 0
+
+    def copy(self) -> "_RingBuffer":
+        """Makes a shallow copy."""
+        copy = _RingBuffer()
+        copy._items, copy._head, copy._size = self._items.copy(), self._head, self._size
+        return copy
+
+
+class QueueSnapshot(typing.Sequence, typing.Generic[ObservableAsyncQueueType]):
+    """
+    A read-only view of the contents of an :class:`ObservableAsyncQueue` at one
+    point in time.
+
+    Taking a snapshot does not copy anything. Instead, the next change made to the
+    queue while the snapshot is still referenced somewhere copies the queue's
+    contents first, leaving the snapshot with the old ones.
+
+    Attributes:
+        version:
+            The version of the queue this is a snapshot of.
+    """
+
+    __slots__ = ("_buffer", "version", "__weakref__")
+
+    def __init__(self, buffer: _RingBuffer, version: int) -> None:
+        self._buffer = buffer
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        return self._buffer[index]
+
+    def __iter__(self) -> typing.Iterator[ObservableAsyncQueueType]:
+        # A generator, so that the iterator keeps the snapshot alive (and so unchanged) until it is done with it.
+        yield from self._buffer
+
+    def __eq__(self, other):
+        if isinstance(other, QueueSnapshot):
+            other = other._buffer
+        return self._buffer == other
+
+    def __str__(self) -> str:
+        return str(list(self._buffer))
 
-        # Maybe invalidate the cache if there is one.
-        if "view" in self.__dict__:
-            del self.__dict__["view"]
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(version={self.version}, {list(self._buffer)!r})"
 
+
+class ObservableAsyncQueue(asyncio.Queue, typing.Generic[ObservableAsyncQueueType]):
+    """
+    Override of an asyncio queue to provide a way of safely viewing the
+    queue contents non-asynchronously.
+
+    The contents are held in a ring buffer, so peeking at any index is O(1) and
+    never copies anything. Every change to the queue increments :attr:`version`.
+
+    :attr:`view` gives a :class:`QueueSnapshot` of the queue as it is now. The same
+    snapshot is shared by everyone asking for it until the queue next changes, and
+    the contents are only copied if the queue changes while a snapshot of it is
+    still being held onto, so the first change after that pays for the copy.
+    """
+
+    def _init(self, maxsize):
+        self._queue = _RingBuffer()
+        self._version = 0
+        self._snapshot = None
+
+    @property
+    def version(self) -> int:
+        """A number that increases every time the queue is changed."""
+        return self._version
+
+    @property
+    def view(self) -> QueueSnapshot[ObservableAsyncQueueType]:
+        """A snapshot of the queue contents as they are right now."""
+        if self._snapshot is None:
+            self._snapshot = QueueSnapshot(self._queue, self._version)
+        return self._snapshot
+
+    def _will_change(self) -> None:
+        """Must be called before changing the queue contents."""
+        self._version += 1
+
+        snapshot, self._snapshot = self._snapshot, None
+        if snapshot is not None:
+            ref = weakref.ref(snapshot)
+            del snapshot
+            if ref() is not None:
+                # Someone is still using the snapshot, so leave it the old contents.
+                self._queue = self._queue.copy()
+
+    def _put(self, item):
+        self._will_change()
+        self._queue.append(item)
         return item
 
+    def _get(self):
+        self._will_change()
+        return self._queue.popleft()
+
     def clear(self) -> None:
         """
         Clears the queue immediately without notifying any waiters. They will
         continue as they were.
         """
+        self._will_change()
         self._queue.clear()
 
     async def get(self) -> ObservableAsyncQueueType:
@@ -255,8 +612,31 @@ class ObservableAsyncQueue(asyncio.Queue, typing.Generic[ObservableAsyncQueueTyp
         """
         return await super().put(item)
 
+    async def put_many(self, items: typing.Iterable[ObservableAsyncQueueType]) -> None:
+        """
+        Put each of the items onto the queue in order, waiting for space as needed.
+        """
+        for item in items:
+            if self.full():
+                await self.put(item)
+            else:
+                self.put_nowait(item)
+
+    async def get_many(self, limit: int = None) -> typing.List[ObservableAsyncQueueType]:
+        """
+        Waits for at least one item, then gets everything else already in the queue,
+        up to ``limit`` items in total if given.
+        """
+        if limit is not None and limit < 1:
+            raise ValueError("Must get at least one item.")
+
+        items = [await self.get()]
+        while not self.empty() and (limit is None or len(items) < limit):
+            items.append(self.get_nowait())
+        return items
+
     def __getitem__(self, item) -> ObservableAsyncQueueType:
-        return self.view[item]
+        return self._queue[item]
 
     def __setitem__(self, _, __):
         raise NotImplementedError("Please use the put coroutine.")
@@ -271,19 +651,17 @@ class ObservableAsyncQueue(asyncio.Queue, typing.Generic[ObservableAsyncQueueTyp
         """
         Returns an iterator across the current queue state at the time of calling.
 
-        This will not be updated with the cache.
+        This will not be affected by later changes to the queue.
         """
-        view = self.view
-        return iter(view)
+        return iter(self.view)
 
     def __contains__(self, item: object) -> bool:
         """
         Checks if the item is in this object at the current point in time.
 
-        This shouldn't be updated with the cache, so should be deterministic.
         :param item: the item to look for.
         """
-        return item in self.view
+        return item in self._queue
 
     async def unshift(self, item: ObservableAsyncQueueType):
         """
@@ -309,10 +687,11 @@ class ObservableAsyncQueue(asyncio.Queue, typing.Generic[ObservableAsyncQueueTyp
                     self._wakeup_next(self._putters)
                 raise
 
+        self._will_change()
         self._queue.appendleft(item)
-
-        if "view" in self.__dict__:
-            del self.__dict__["view"]
+        self._unfinished_tasks += 1
+        self._finished.clear()
+        self._wakeup_next(self._getters)
 
         return item
 
@@ -320,11 +699,11 @@ class ObservableAsyncQueue(asyncio.Queue, typing.Generic[ObservableAsyncQueueTyp
         """
         Pops the last item from the queue.
         """
-        item = self._queue.pop()
-        if "view" in self.__dict__:
-            del self.__dict__["view"]
+        if not self._queue:
+            raise IndexError("pop from an empty queue")
 
-        return item
+        self._will_change()
+        return self._queue.pop()
 
 
 ValueT = typing.TypeVar("ValueT")
@@ -29,13 +29,19 @@ as JSON.
 """
 import asyncio
 import atexit
+import concurrent.futures
 import os
+import itertools
 import textwrap
 import time
 import typing
+import zlib
 
 from libneko import aiojson, filesystem, logging
 
+#: How many values are serialized between giving other tasks a turn when compacting the log.
+SNAPSHOT_CHUNK_SIZE = 500
+
 
 class AsyncSimpleDatabase(logging.Log):
     """
@@ -67,6 +73,27 @@ class AsyncSimpleDatabase(logging.Log):
             disk. Writes will still update the disk, but will do so in the background. This makes
             the cache significantly faster, but will not detect changes to the database on disk if
             changed by another program.
+            If False, then the file's modification time, size and inode are checked before each
+            access, and the file is only read again if any of them changed since we last read or
+            wrote it; otherwise everything is served from memory.
+        journal:
+            Defaults to False. If True, then rather than rewriting the entire file on each
+            mutation, mutations are appended to a write-ahead log (``file_name + ".wal"``)
+            in group commits, and the log is compacted into the JSON file in the background
+            once it grows large. Mutations wait for the commit they are part of to hit the
+            disk, so concurrent mutations share a single write and fsync. Repeated writes to
+            the same key in one commit are coalesced into one. This takes precedence over
+            ``cache_period``, and implies that nothing else writes to the file.
+        commit_latency:
+            Only used in journal mode. The longest a mutation waits for others to join its
+            commit, in seconds. Defaults to 10ms.
+        commit_batch_size:
+            Only used in journal mode. A commit is made straight away once this many keys
+            have been changed. Defaults to 512.
+        compact_after:
+            Only used in journal mode. The minimum number of records the log must hold before
+            it is compacted; it is also never compacted before it holds as many records as
+            there are keys. Defaults to 1000.
 
     Example::
         file = AsyncSimpleDatabase('file.json')
@@ -97,6 +124,10 @@ class AsyncSimpleDatabase(logging.Log):
         cache_period: float = None,
         expect_no_other_access=True,
         loop: asyncio.AbstractEventLoop = ...,
+        journal: bool = False,
+        commit_latency: float = 0.01,
+        commit_batch_size: int = 512,
+        compact_after: int = 1000,
     ) -> None:
 
         self._expect_no_other_access = expect_no_other_access
@@ -107,6 +138,26 @@ class AsyncSimpleDatabase(logging.Log):
         self._cache_task = None
         self._closed = False
         self._at_exit = None
+        #: Whether the cache changed since it was last written in full.
+        self._dirty = False
+        #: The (inode, size, mtime) of the file as we last read or wrote it.
+        self._file_signature = None
+
+        # Journal mode state. Pending changes map each key to ("set", value) or ("del", None).
+        self._journaled = journal
+        self._commit_latency = commit_latency
+        self._commit_batch_size = commit_batch_size
+        self._compact_after = compact_after
+        self._wal = None
+        # Everything touching the log file runs on this one thread, in the order it was submitted.
+        self._wal_executor = None
+        self._wal_records = 0
+        self._pending = {}
+        self._commit_future = None
+        self._commit_handle = None
+        self._commit_scheduled = False
+        self._commit_lock = asyncio.Lock(loop=self._loop)
+        self._compaction = None
 
         #: Event to wait for that will fire once data has been loaded for the first time.
         self._ready = asyncio.Event(loop=self._loop)
@@ -115,7 +166,7 @@ class AsyncSimpleDatabase(logging.Log):
         reader_task: asyncio.Task = self._loop.create_task(self.read_data_from_disk())
         reader_task.add_done_callback(self._fire_ready)
 
-        if cache_period is not None:
+        if cache_period is not None and not journal:
             asyncio.ensure_future(self._auto_cache_job(cache_period))
 
         self._make_at_exit()
@@ -150,7 +201,7 @@ class AsyncSimpleDatabase(logging.Log):
                 await asyncio.sleep(cache_period)
                 if self._closed:
                     raise asyncio.CancelledError("Object was closed.")
-                else:
+                elif self._dirty:
                     await self.write_to_disk()
             except Exception as ex:
                 if isinstance(ex, asyncio.CancelledError):
@@ -167,9 +218,18 @@ class AsyncSimpleDatabase(logging.Log):
         if self._closed:
             raise ValueError(f"Cannot use a closed {type(self).__name__}")
         else:
-            if self._expect_no_other_access and not self.is_auto_caching:
-                await self.read_data_from_disk()
             await self._ready.wait()
+            if not self._expect_no_other_access and not self.is_auto_caching and not self._journaled:
+                if self._get_file_signature() != self._file_signature:
+                    self.log.info("%s changed on disk, reloading it", self._file_name)
+                    await self.read_data_from_disk()
+
+    def _get_file_signature(self):
+        try:
+            stat = os.stat(self._file_name)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
 
     async def read_data_from_disk(self) -> None:
         """Reads the most recent data stored on disk, replacing anything currently in memory."""
@@ -177,6 +237,8 @@ class AsyncSimpleDatabase(logging.Log):
             await self._unsafe_write()
 
         async with self._lock, filesystem.aioopen(self._file_name) as fp:
+            # Taken before reading, so a change made while we read is picked up next time.
+            signature = self._get_file_signature()
             start = time.monotonic()
             obj = await aiojson.aioload(fp)
             end = time.monotonic()
@@ -188,19 +250,220 @@ class AsyncSimpleDatabase(logging.Log):
 
             self.log.info(f"Serialized from {self._file_name} in {(end - start) * 1_000_000:.2f}µs")
 
+            if self._journaled:
+                for path in (self._old_wal_path, self._wal_path):
+                    records = await self._loop.run_in_executor(None, self._replay, path, obj)
+                    self._wal_records += records
+
             self._cache = obj
+            self._file_signature = signature
 
     async def _unsafe_write(self) -> None:
+        self._dirty = False
         async with filesystem.aioopen(self._file_name, "w") as fp:
             start = time.monotonic()
             await aiojson.aiodump(self._cache, fp)
             end = time.monotonic()
             self.log.info(f"Serialized to {self._file_name} in {(end - start) * 1_000_000:.2f}µs")
+        self._file_signature = self._get_file_signature()
 
     async def write_to_disk(self) -> None:
-        """Writes the most recent data to disk from memory, destroying anything on disk."""
-        async with self._lock:
-            await self._unsafe_write()
+        """
+        Writes the most recent data to disk from memory, destroying anything on disk.
+
+        In journal mode, this commits any pending changes and compacts the log instead.
+        """
+        if self._journaled:
+            await self.flush()
+            await self._compact()
+        else:
+            async with self._lock:
+                await self._unsafe_write()
+
+    @property
+    def _wal_path(self) -> str:
+        return self._file_name + ".wal"
+
+    @property
+    def _old_wal_path(self) -> str:
+        # The log being compacted. Only left behind if compaction did not complete.
+        return self._file_name + ".wal.1"
+
+    def _replay(self, path, obj) -> int:
+        """
+        Applies the records in the log at the given path to the given dict, returning how many
+        there were. A record left half-written by a crash is cut off the end of the log.
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as fp:
+            data = fp.read()
+
+        count, good = 0, 0
+        for line in data.split(b"\n")[:-1]:
+            try:
+                record = aiojson.loads(line)
+                (op, change), = record.items()
+                (key, value), = change.items()
+            except ValueError:
+                break
+            if op == "set":
+                obj[key] = value
+            else:
+                obj.pop(key, None)
+            count += 1
+            good += len(line) + 1
+
+        if good != len(data):
+            self.log.warning("Discarding incomplete record at the end of %s", path)
+            os.truncate(path, good)
+        return count
+
+    def _journal(self, op, key, value=None) -> asyncio.Future:
+        """Queues a change up to be committed, returning a future that completes once it is."""
+        self._pending[key] = (op, value)
+        if self._wal_executor is None:
+            self._wal_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"libneko.aiofiledb {self._file_name}"
+            )
+        if self._commit_future is None:
+            self._commit_future = self._loop.create_future()
+        future = self._commit_future
+
+        if len(self._pending) >= self._commit_batch_size:
+            self._start_commit()
+        elif not self._commit_scheduled:
+            self._commit_scheduled = True
+            self._commit_handle = self._loop.call_later(self._commit_latency, self._start_commit)
+        return future
+
+    def _start_commit(self) -> None:
+        if self._commit_handle is not None:
+            self._commit_handle.cancel()
+            self._commit_handle = None
+        self._commit_scheduled = True
+        self._loop.create_task(self._commit())
+
+    async def _commit(self) -> None:
+        async with self._commit_lock:
+            pending, self._pending = self._pending, {}
+            future, self._commit_future = self._commit_future, None
+            self._commit_scheduled = False
+            if self._commit_handle is not None:
+                self._commit_handle.cancel()
+                self._commit_handle = None
+            if not pending:
+                if future is not None:
+                    future.set_result(None)
+                return
+
+            # Serialize here, so the records reflect the state at the time of the commit.
+            lines = self._records(pending)
+            try:
+                await self._loop.run_in_executor(self._wal_executor, self._append, lines)
+            except Exception as ex:
+                self.log.exception("Failed to commit %s change(s) to %s", len(pending), self._wal_path)
+                future.set_exception(ex)
+                return
+
+            self._wal_records += len(pending)
+            future.set_result(None)
+
+        if self._wal_records >= max(self._compact_after, len(self._cache)) and not self.is_compacting:
+            self._compaction = self._loop.create_task(self._compact())
+            self._compaction.add_done_callback(self._on_compacted)
+
+    def _on_compacted(self, task) -> None:
+        # Nothing else awaits a background compaction. If it failed, the old log is still there
+        # and will be replayed (and compacted again) along with the new one.
+        if not task.cancelled() and task.exception() is not None:
+            self.log.error("Failed to compact %s", self._file_name, exc_info=task.exception())
+
+    @staticmethod
+    def _records(pending) -> str:
+        # Each record is a single line, and nests the key in an object so it is coerced to a
+        # string the same way as it is in the JSON file.
+        return "".join(aiojson.dumps({op: {key: value}}) + "\n" for key, (op, value) in pending.items())
+
+    def _append(self, lines) -> None:
+        if self._wal is None:
+            self._wal = open(self._wal_path, "a", encoding="utf-8")
+        self._wal.write(lines)
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+
+    async def flush(self) -> None:
+        """Commits any pending changes right away, and waits for them to hit the disk."""
+        if self._journaled and self._pending:
+            future = self._commit_future
+            self._start_commit()
+            await future
+
+    @property
+    def is_compacting(self) -> bool:
+        """Returns True if the log is being compacted into the JSON file in the background."""
+        return self._compaction is not None and not self._compaction.done()
+
+    async def _compact(self) -> None:
+        """Starts a new log, and writes a snapshot of everything up to it to the JSON file."""
+        async with self._commit_lock:
+            # Taken while no commits are running, so the snapshot covers everything in the old log.
+            self._dirty = False
+            if self._wal_executor is not None:
+                await self._loop.run_in_executor(self._wal_executor, self._rotate_wal)
+            else:
+                await self._loop.run_in_executor(None, self._rotate_wal)
+            self._wal_records = 0
+            snapshot = await self._serialize_snapshot()
+        await self._loop.run_in_executor(None, self._write_snapshot, snapshot)
+
+    async def _serialize_snapshot(self) -> str:
+        """
+        Serializes the cache on the event loop, as values may be mutated in place by whoever
+        holds them, which another thread could catch halfway. Yields to other tasks every
+        SNAPSHOT_CHUNK_SIZE values. Any value changed after being serialized is in the new log
+        as well, which replays on top of the snapshot.
+        """
+        parts = []
+        for i, key in enumerate(list(self._cache)):
+            if i and not i % SNAPSHOT_CHUNK_SIZE:
+                await asyncio.sleep(0)
+            if key in self._cache:
+                # Nested in an object, so the key is coerced to a string the same way as usual.
+                parts.append(aiojson.dumps({key: self._cache[key]})[1:-1])
+        return "{" + ", ".join(parts) + "}"
+
+    def _close_wal(self) -> None:
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def _rotate_wal(self) -> None:
+        self._close_wal()
+        if not os.path.exists(self._wal_path):
+            return
+        if os.path.exists(self._old_wal_path):
+            # A previous compaction failed, so the old log is still needed; add to it instead.
+            with open(self._wal_path, "rb") as src, open(self._old_wal_path, "ab") as dst:
+                dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self._wal_path)
+        else:
+            os.replace(self._wal_path, self._old_wal_path)
+
+    def _write_snapshot(self, snapshot) -> None:
+        start = time.monotonic()
+        tmp = self._file_name + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fp:
+            fp.write(snapshot)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, self._file_name)
+        if os.path.exists(self._old_wal_path):
+            os.remove(self._old_wal_path)
+        end = time.monotonic()
+        self.log.info(f"Compacted into {self._file_name} in {(end - start) * 1_000_000:.2f}µs")
 
     @property
     def is_ready(self) -> bool:
@@ -217,6 +480,13 @@ class AsyncSimpleDatabase(logging.Log):
         """
         return self._cache_task is not None
 
+    @property
+    def is_journaled(self) -> bool:
+        """
+        Returns True if mutations are committed to a write-ahead log rather than rewriting the file.
+        """
+        return self._journaled
+
     @property
     def is_closed(self) -> bool:
         """Returns True if this object is considered to be dead and no longer up-to-date."""
@@ -247,12 +517,46 @@ class AsyncSimpleDatabase(logging.Log):
         Sets the value at the given key.
         """
         await self._ensure_not_closed_and_ready()
+        commit = None
         async with self._lock:
             self._cache[key] = value
+            self._dirty = True
+
+            if self._journaled:
+                commit = self._journal("set", key, value)
+            elif not self.is_auto_caching:
+                await self._unsafe_write()
+
+        if commit is not None:
+            await commit
+
+    async def get_many(self, keys: typing.Iterable[typing.AnyStr]) -> typing.Dict[str, aiojson.JSONType]:
+        """
+        Returns a dict of the values at each of the given keys. Keys that are not present are
+        left out.
+        """
+        await self._ensure_not_closed_and_ready()
+        async with self._lock:
+            return {key: self._cache[key] for key in keys if key in self._cache}
 
-            if not self.is_auto_caching:
+    async def set_many(self, items: typing.Mapping[typing.AnyStr, aiojson.JSONType]) -> None:
+        """
+        Sets the value at each of the given keys, writing them to disk together.
+        """
+        await self._ensure_not_closed_and_ready()
+        commits = set()
+        async with self._lock:
+            self._cache.update(items)
+            self._dirty = True
+
+            if self._journaled:
+                commits = {self._journal("set", key, value) for key, value in items.items()}
+            elif not self.is_auto_caching:
                 await self._unsafe_write()
 
+        if commits:
+            await asyncio.gather(*commits)
+
     async def delete(self, key: typing.AnyStr, ignore_missing: bool = False) -> None:
         """
         Deletes the key.
@@ -265,6 +569,7 @@ class AsyncSimpleDatabase(logging.Log):
                 a KeyError is raised instead.
         """
         await self._ensure_not_closed_and_ready()
+        commit = None
         async with self._lock:
             try:
                 del self._cache[key]
@@ -272,7 +577,14 @@ class AsyncSimpleDatabase(logging.Log):
                 if not ignore_missing:
                     raise ex from None
             else:
-                await self._unsafe_write()
+                self._dirty = True
+                if self._journaled:
+                    commit = self._journal("del", key)
+                elif not self.is_auto_caching:
+                    await self._unsafe_write()
+
+        if commit is not None:
+            await commit
 
     async def size(self) -> int:
         """Returns the number of items in the collection."""
@@ -304,6 +616,20 @@ class AsyncSimpleDatabase(logging.Log):
                 pass
             self._cache_task = None
 
+        if self._journaled and not self._closed and self._wal_executor is not None:
+            # We cannot await a commit here, so queue anything pending up behind any commit that
+            # is already being written, and block until the log thread has written all of it.
+            if self._commit_handle is not None:
+                self._commit_handle.cancel()
+            pending, self._pending = self._pending, {}
+            if pending:
+                self._wal_executor.submit(self._append, self._records(pending))
+                if self._commit_future is not None and not self._commit_future.done():
+                    self._commit_future.set_result(None)
+            self._wal_executor.submit(self._close_wal).result()
+            self._wal_executor.shutdown()
+            self._wal_executor = None
+
         self._closed = True
         atexit.unregister(self._at_exit)
 
@@ -315,6 +641,129 @@ class AsyncSimpleDatabase(logging.Log):
         return self.dump()
 
 
+class ShardedAsyncSimpleDatabase(logging.Log):
+    """
+    Spreads keys over several :class:`AsyncSimpleDatabase` files, each with its own lock,
+    dirty tracking and flush schedule. Operations on keys in different shards do not wait
+    on each other, and flushing only ever rewrites the shards that changed, rather than
+    everything.
+
+    Keys are assigned to shards by a stable hash of their string form, so ``1`` and ``"1"``
+    end up in the same shard, just as they end up as the same key once written to JSON.
+    The shard count is part of each shard's file name, so changing it starts afresh rather
+    than mixing up which keys live where.
+
+    Parameters:
+        file_name:
+            The base file name; shard ``i`` of ``n`` is stored in ``{file_name}.{i}-of-{n}``.
+        shards:
+            The number of shards. Defaults to 16.
+
+    Any other keyword arguments are passed on to each :class:`AsyncSimpleDatabase`.
+    """
+
+    def __init__(self, file_name, *, shards: int = 16, **kwargs) -> None:
+        if shards < 1:
+            raise ValueError("There must be at least one shard")
+        self._file_name = file_name
+        self._shards = [
+            AsyncSimpleDatabase(f"{file_name}.{i}-of-{shards}", **kwargs) for i in range(shards)
+        ]
+        super().__init__()
+
+    @property
+    def shards(self) -> typing.Sequence[AsyncSimpleDatabase]:
+        """The underlying databases, one per shard."""
+        return self._shards
+
+    def shard_for(self, key: typing.Any) -> AsyncSimpleDatabase:
+        """Returns the shard that the given key belongs in."""
+        return self._shards[zlib.crc32(str(key).encode()) % len(self._shards)]
+
+    def _group(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.shard_for(key), []).append(key)
+        return groups
+
+    async def wait_for_ready(self) -> None:
+        await asyncio.gather(*(shard.wait_for_ready() for shard in self._shards))
+
+    @property
+    def is_ready(self) -> bool:
+        return all(shard.is_ready for shard in self._shards)
+
+    @property
+    def is_closed(self) -> bool:
+        return all(shard.is_closed for shard in self._shards)
+
+    async def get(self, key: typing.AnyStr) -> aiojson.JSONType:
+        """Returns the value at the given key, or raises a KeyError if it is not present."""
+        return await self.shard_for(key).get(key)
+
+    async def get_or_default(
+        self, key: typing.AnyStr, default: typing.Any = None
+    ) -> aiojson.JSONType:
+        """Similar to :meth:`get`, but returns `default` instead if nothing is found."""
+        return await self.shard_for(key).get_or_default(key, default)
+
+    async def set(self, key: typing.AnyStr, value: aiojson.JSONType) -> None:
+        """Sets the value at the given key."""
+        await self.shard_for(key).set(key, value)
+
+    async def delete(self, key: typing.AnyStr, ignore_missing: bool = False) -> None:
+        """Deletes the key. See :meth:`AsyncSimpleDatabase.delete`."""
+        await self.shard_for(key).delete(key, ignore_missing)
+
+    async def get_many(self, keys: typing.Iterable[typing.AnyStr]) -> typing.Dict[str, aiojson.JSONType]:
+        """
+        Returns a dict of the values at each of the given keys, looking each shard up
+        concurrently. Keys that are not present are left out.
+        """
+        results = await asyncio.gather(
+            *(shard.get_many(group) for shard, group in self._group(keys).items())
+        )
+        return dict(itertools.chain.from_iterable(result.items() for result in results))
+
+    async def set_many(self, items: typing.Mapping[typing.AnyStr, aiojson.JSONType]) -> None:
+        """
+        Sets the value at each of the given keys, with a single write per shard involved.
+        """
+        await asyncio.gather(
+            *(
+                shard.set_many({key: items[key] for key in group})
+                for shard, group in self._group(items).items()
+            )
+        )
+
+    async def size(self) -> int:
+        """Returns the number of items across all shards."""
+        return sum(await asyncio.gather(*(shard.size() for shard in self._shards)))
+
+    async def write_to_disk(self) -> None:
+        """Writes every shard that changed since it was last written to disk."""
+        await asyncio.gather(*(shard.write_to_disk() for shard in self._shards if shard._dirty))
+
+    def keys(self) -> typing.Iterator[str]:
+        """Iterates over the keys of every shard."""
+        return itertools.chain.from_iterable(shard.keys() for shard in self._shards)
+
+    def values(self) -> typing.Iterator[aiojson.JSONType]:
+        """Iterates over the values of every shard."""
+        return itertools.chain.from_iterable(shard.values() for shard in self._shards)
+
+    def items(self) -> typing.Iterator[typing.Tuple[str, aiojson.JSONType]]:
+        """Iterates over the items of every shard."""
+        return itertools.chain.from_iterable(shard.items() for shard in self._shards)
+
+    def __contains__(self, item: typing.Any) -> bool:
+        return item in self.shard_for(item)
+
+    def close(self) -> None:
+        for shard in self._shards:
+            shard.close()
+
+
 def _recurse_print(obj, indent):
     if isinstance(obj, list):
         buff = [_recurse_print(item, indent) for item in obj]
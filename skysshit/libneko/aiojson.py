@@ -26,14 +26,29 @@
 """
 Wraps the Python JSON module and implements load and dump for async file descriptors
 provided by aiofiles.
+
+Small documents are encoded and decoded right away. Large ones are decoded in an
+executor, and encoded in an executor a chunk at a time with
+:meth:`json.JSONEncoder.iterencode`, each chunk being written out as soon as it is
+ready, so that multi-megabyte documents do not block the event loop. If ``orjson``
+is installed, it is used to decode documents when no custom decoding options are
+given, as it is considerably faster. It is stricter than :mod:`json` though, rejecting
+``NaN``, ``Infinity`` and integers that do not fit in 64 bits, so documents it rejects
+are decoded again with :mod:`json`, giving the same results either way.
 """
-import io
+import asyncio
+import functools
 import json
 import typing
 from json import *
 
 from libneko import funcmods, filesystem
 
+try:
+    import orjson as _fast_backend
+except ImportError:  # pragma: no cover
+    _fast_backend = None
+
 __all__ = json.__all__ + ["aioload", "aiodump", "Json"]
 
 #: Valid JSON types.
@@ -42,16 +57,82 @@ JSONObject = typing.Dict[typing.AnyStr, typing.Any]
 JSONArray = typing.List[typing.Any]
 JSONType = typing.Union[int, float, bool, typing.AnyStr, JSONArray, JSONObject, None]
 
+#: Documents of at least this many characters are decoded in an executor.
+LOAD_EXECUTOR_THRESHOLD = 64 * 1024
+
+#: Objects made up of at least this many values (counting nested ones) are encoded in an
+#: executor.
+DUMP_EXECUTOR_THRESHOLD = 5_000
+
+#: Roughly how many characters are encoded at a time before being written out.
+DUMP_CHUNK_SIZE = 64 * 1024
+
+
+def _decode(data, *args, **kwargs):
+    if _fast_backend is not None and not args and not kwargs:
+        try:
+            return _fast_backend.loads(data)
+        except _fast_backend.JSONDecodeError:
+            # Either invalid, in which case json raises too, or valid but beyond what orjson supports.
+            pass
+    return loads(data, *args, **kwargs)
+
 
 @funcmods.steal_signature_from(load, steal_docstring=True)
 async def aioload(fp: filesystem.AsyncFile, *args, **kwargs) -> JSONType:
     """Loads the given object from an async-compatible file object."""
-    fp = io.StringIO(await fp.read())
-    return loads(fp.getvalue(), *args, **kwargs)
+    data = await fp.read()
+    if len(data) < LOAD_EXECUTOR_THRESHOLD:
+        return _decode(data, *args, **kwargs)
+    return await asyncio.get_event_loop().run_in_executor(
+        None, functools.partial(_decode, data, *args, **kwargs)
+    )
 
 
-@funcmods.steal_signature_from(load, steal_docstring=True)
+def _is_large(obj) -> bool:
+    """Whether the object holds at least DUMP_EXECUTOR_THRESHOLD values; stops counting there."""
+    count, stack = 0, [obj]
+    while stack:
+        item = stack.pop()
+        count += 1
+        if count >= DUMP_EXECUTOR_THRESHOLD:
+            return True
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
+def _next_chunk(chunks) -> str:
+    """Joins together the encoder's next DUMP_CHUNK_SIZE-ish characters, or '' at the end."""
+    buffer, size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= DUMP_CHUNK_SIZE:
+            break
+    return "".join(buffer)
+
+
+@funcmods.steal_signature_from(dump, steal_docstring=True)
 async def aiodump(obj: JSONType, fp: filesystem.AsyncFile, *args, **kwargs) -> None:
-    """Dumps the given object to an async-compatible file object."""
-    buff = io.StringIO(dumps(obj, *args, **kwargs))
-    await fp.write(buff.getvalue())
+    """
+    Dumps the given object to an async-compatible file object.
+
+    Large objects are encoded in an executor while the previous chunk is being written,
+    so the object must not be modified until this completes.
+    """
+    if not _is_large(obj):
+        await fp.write(dumps(obj, *args, **kwargs))
+        return
+
+    cls = kwargs.pop("cls", None) or JSONEncoder
+    chunks = iter(cls(*args, **kwargs).iterencode(obj))
+    loop = asyncio.get_event_loop()
+    # The generator is only ever advanced by one thread at a time, as we wait for each chunk.
+    while True:
+        chunk = await loop.run_in_executor(None, _next_chunk, chunks)
+        if not chunk:
+            break
+        await fp.write(chunk)
@@ -35,7 +35,9 @@ __all__ = ("Bot", "AutoShardedBot", "Context")
 
 import os
 import textwrap
+import time
 import typing
+import urllib.parse
 import warnings
 from concurrent.futures import thread
 
@@ -47,6 +49,8 @@ from libneko import converters
 from libneko import embeds
 from libneko import funcmods
 from libneko import logging
+from libneko import loopmonitor
+from libneko import metrics
 
 _magic_number = os.cpu_count() * 5 - 1
 
@@ -106,6 +110,16 @@ class _BotMixin(logging.Log):
         definitions from ``libneko.commands``. It is then recommended you use
         ``libneko.commands`` instead of ``discord.ext.commands`` where possible!
 
+        Built-in metrics, recorded in :attr:`metrics` (see :mod:`libneko.metrics`):
+        how long each event handler took (``on_message`` included), the latency and
+        outcome of each command, the latency of every Discord HTTP call by host, and
+        the thread pool's queue depth. These can be served locally in the Prometheus
+        text format by passing ``metrics_port``.
+
+        An event loop monitor (see :mod:`libneko.loopmonitor`) that measures how
+        late the event loop is running, and logs any cog or command that blocks it
+        for longer than ``stall_threshold`` seconds, along with where it was stuck.
+
     New warnings:
         If you use the ``@event`` decorator, a DeprecationWarning will be raised.
         The reason for this is that using this decorator only allows one event type
@@ -200,6 +214,22 @@ class _BotMixin(logging.Log):
         shut_up:
             Mutes all custom warnings raised by libneko.clients.* objects, and
             overrides the other flags. Defaults to ``False``.
+        metrics_registry:
+            The :class:`libneko.metrics.Registry` to record metrics in. Defaults to
+            the process-wide :attr:`libneko.metrics.default_registry`.
+        metrics_port:
+            If specified, serves the metrics in the Prometheus text format on
+            ``http://metrics_host:metrics_port/metrics`` once the bot starts.
+            Defaults to ``None`` (not served).
+        metrics_host:
+            The address to serve metrics on. Defaults to ``127.0.0.1``, so that
+            they are only reachable locally.
+        monitor_event_loop:
+            Monitors the event loop for lag and stalls while the bot is running if
+            ``True`` (default).
+        stall_threshold:
+            How many seconds the event loop must be blocked for to be reported as
+            stalled. Defaults to ``0.5``.
 
     """
 
@@ -211,6 +241,11 @@ class _BotMixin(logging.Log):
         ignore_event_decorator_call: bool = False,
         ignore_overwrite_on_message: bool = False,
         shut_up: bool = False,
+        metrics_registry: metrics.Registry = None,
+        metrics_port: int = None,
+        metrics_host: str = "127.0.0.1",
+        monitor_event_loop: bool = True,
+        stall_threshold: float = 0.5,
         **kwargs,
     ):
         self._thread_pool = thread.ThreadPoolExecutor(
@@ -231,17 +266,65 @@ class _BotMixin(logging.Log):
         self._ignore_event_decorator_call = ignore_event_decorator_call or shut_up
         self._ignore_overwrite_on_message = ignore_overwrite_on_message or shut_up
 
+        self.metrics = metrics_registry if metrics_registry is not None else metrics.default_registry
+        self._metrics_port = metrics_port
+        self._metrics_host = metrics_host
+        self._metrics_server = None
+        self._event_seconds = self.metrics.histogram(
+            "discord_event_handler_seconds", "Time taken to handle each event.", ("event",)
+        )
+        self._command_seconds = self.metrics.histogram(
+            "discord_command_seconds", "Time taken to invoke each command.", ("command",)
+        )
+        self._commands_total = self.metrics.counter(
+            "discord_commands_total", "Commands invoked, by command and outcome.", ("command", "outcome")
+        )
+        self._http_seconds = self.metrics.histogram(
+            "http_request_seconds", "HTTP request latency, by host.", ("host",)
+        )
+        self._executor_jobs = self.metrics.counter(
+            "executor_jobs_total", "Jobs delegated to the thread pool."
+        )
+        # Read from the pool itself, as the worker threads are what drain the queue.
+        self.metrics.gauge(
+            "executor_queue_depth", "Jobs waiting for a thread pool worker."
+        ).set_function(self._thread_pool._work_queue.qsize)
+        self.loop_monitor = (
+            loopmonitor.LoopMonitor(threshold=stall_threshold, registry=self.metrics)
+            if monitor_event_loop
+            else None
+        )
+
         super().__init__(*args, **kwargs)
 
+        self._instrument_http()
+
         if not enable_default_help:
             self.remove_command("help")
 
+    def _instrument_http(self):
+        """Wraps the Discord HTTP client's request method to record its latency by host."""
+        request = self.http.request
+        histogram = self._http_seconds
+
+        @funcmods.steal_signature_from(request)
+        async def timed_request(route, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await request(route, **kwargs)
+            finally:
+                host = urllib.parse.urlsplit(route.url).hostname
+                histogram.labels(host).observe(time.perf_counter() - start)
+
+        self.http.request = timed_request
+
     def _run_in_executor(self, func, *args, **kwargs):
         """
         Runs the job in a threadpool, after dispatching the
         ``on_run_in_threadpool(func, args, kwargs)`` event.
         """
         self.dispatch("run_in_threadpool", func, args, kwargs)
+        self._executor_jobs.inc()
         partial = funcmods.partial(func, *args, **kwargs)
         return self.loop.run_in_executor(self._thread_pool, partial)
 
@@ -394,6 +477,12 @@ class _BotMixin(logging.Log):
         methods are called.
         """
         self.dispatch("start")
+        if self._metrics_port is not None and self._metrics_server is None:
+            self._metrics_server = await metrics.serve(
+                self.metrics, self._metrics_host, self._metrics_port
+            )
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
         return await super().start(*args, **kwargs)
 
     @funcmods.steal_docstring_from(_commands.Bot.logout, mode="append")
@@ -415,8 +504,40 @@ class _BotMixin(logging.Log):
         """
         if not self._has_logged_out_triggered:
             self.dispatch("logout")
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+            self._metrics_server = None
+        if self.loop_monitor is not None:
+            self.loop_monitor.stop()
         return await super().close()
 
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        # Every event handler and listener is run through here, so time them all.
+        start = time.perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            self._event_seconds.labels(event_name).observe(time.perf_counter() - start)
+
+    @funcmods.steal_docstring_from(_commands.Bot.invoke, mode="append")
+    @funcmods.steal_signature_from(_commands.Bot.invoke, steal_docstring=False)
+    async def invoke(self, ctx):
+        """
+        Records how long the command took, and whether it succeeded, in :attr:`metrics`.
+        """
+        if ctx.command is None:
+            return await super().invoke(ctx)
+
+        name = ctx.command.qualified_name
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            await super().invoke(ctx)
+            outcome = "failed" if ctx.command_failed else "ok"
+        finally:
+            self._command_seconds.labels(name).observe(time.perf_counter() - start)
+            self._commands_total.labels(name, outcome).inc()
+
     @funcmods.steal_docstring_from(_commands.Bot.add_cog, mode="append")
     @funcmods.steal_signature_from(_commands.Bot.add_cog, steal_docstring=False)
     def add_cog(self, cog):
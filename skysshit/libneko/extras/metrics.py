@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# MIT License
+#
+# Copyright (c) 2018-2019 Flitt3r (a.k.a Koyagami)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in a$
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+An extension that can be loaded to provide owner-only ``metrics`` and ``stalls``
+commands, which show a summary of the bot's :attr:`libneko.clients.Bot.metrics` and
+the most recent event loop stalls.
+
+Author:
+    Espy/Neko404NotFound
+"""
+import time
+
+from libneko import commands
+from libneko import metrics
+from libneko.pag import factory
+
+
+class MetricsCog(commands.Cog):
+    """
+    Shows the metrics recorded by the bot (see :mod:`libneko.metrics`). Bots that are
+    not libneko bots show the process-wide :attr:`libneko.metrics.default_registry`.
+
+    Only the owner of the bot may use this.
+    """
+
+    async def cog_check(self, ctx):
+        return await ctx.bot.is_owner(ctx.author)
+
+    @commands.command(name="metrics", hidden=True)
+    async def show_metrics(self, ctx, *, name_filter: str = ""):
+        """Shows a summary of every metric, or of those whose names contain the given text."""
+        registry = getattr(ctx.bot, "metrics", metrics.default_registry)
+
+        pag = factory.StringNavigatorFactory(
+            prefix="```", suffix="```", max_lines=25, enable_truncation=False
+        )
+        lines = [line for line in registry.summary().split("\n") if name_filter in line]
+        for line in lines or ["No metrics recorded yet."]:
+            pag.add_line(line)
+
+        pag.start(ctx)
+
+    @commands.command(name="stalls", hidden=True)
+    async def show_stalls(self, ctx):
+        """Shows the most recent times something blocked the event loop, and where."""
+        monitor = getattr(ctx.bot, "loop_monitor", None)
+        if monitor is None:
+            return await ctx.send("The event loop is not being monitored.")
+        if not monitor.stalls:
+            return await ctx.send("No stalls recorded.")
+
+        pag = factory.StringNavigatorFactory(
+            prefix="```", suffix="```", max_lines=25, enable_truncation=False
+        )
+        for stall in reversed(monitor.stalls):
+            pag.add_line(f"{time.strftime('%H:%M:%S', time.localtime(stall.started))} {stall}")
+            for frame in stall.stack[-3:]:
+                pag.add_line(f"    {frame.filename}:{frame.lineno} in {frame.name}")
+                pag.add_line(f"        {frame.line}")
+
+        pag.start(ctx)
+
+
+def setup(bot):
+    """Add the cog to the bot directly. Enables this to be loaded as an extension."""
+    bot.add_cog(MetricsCog())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# MIT License
+#
+# Copyright (c) 2018-2019 Flitt3r (a.k.a Koyagami)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in a$
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Event loop health monitoring.
+
+A probe task measures how late the event loop is in waking it up (the scheduling
+lag), and a watchdog thread notices when the loop has not woken the probe for longer
+than a threshold. When that happens, the loop is stuck in some callback that is not
+yielding, such as a blocking HTTP request or file write, so the watchdog captures the
+stack of the loop's thread while it is still stuck, and works out which cog and
+command it is in. Once the loop recovers, the stall is logged, recorded in the
+metrics registry, and kept in :attr:`LoopMonitor.stalls`.
+
+Author:
+    Espy/Neko404NotFound
+"""
+
+__all__ = ("LoopMonitor", "Stall", "attribute")
+
+import asyncio
+import collections
+import sys
+import threading
+import time
+import traceback
+import typing
+
+from discord.ext import commands as _commands
+
+from libneko import logging
+from libneko import metrics
+
+
+class Stall:
+    """
+    A period during which the event loop was blocked.
+
+    Attributes:
+        started: the :func:`time.time` at which the probe last ran before the stall.
+        duration: how long the loop was blocked for, in seconds.
+        stack: the :class:`traceback.StackSummary` of the loop's thread during the stall.
+        cog: the name of the cog the loop was stuck in, if any.
+        command: the qualified name of the command the loop was stuck in, if any.
+    """
+
+    __slots__ = ("started", "duration", "stack", "cog", "command")
+
+    def __init__(self, started, stack, cog, command):
+        self.started = started
+        self.duration = None
+        self.stack = stack
+        self.cog = cog
+        self.command = command
+
+    @property
+    def culprit(self) -> str:
+        """Where the stall happened, as precisely as we know."""
+        if self.command is not None:
+            return f"command {self.command}" + (f" in cog {self.cog}" if self.cog else "")
+        if self.cog is not None:
+            return f"cog {self.cog}"
+        if self.stack:
+            frame = self.stack[-1]
+            return f"{frame.name} ({frame.filename}:{frame.lineno})"
+        return "unknown"
+
+    def __str__(self):
+        duration = f"{self.duration * 1000:.0f}ms" if self.duration is not None else "ongoing"
+        return f"Event loop blocked for {duration} by {self.culprit}"
+
+
+def attribute(frame) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+    """
+    Works out which cog and command the given frame (and its callers) belong to, by
+    looking for a command invocation context or a cog instance in their locals.
+
+    Returns:
+        A tuple of the cog name and command qualified name, either of which may be ``None``.
+    """
+    cog = command = None
+    while frame is not None and (cog is None or command is None):
+        f_locals = frame.f_locals
+        ctx = f_locals.get("ctx")
+        if command is None and isinstance(ctx, _commands.Context) and ctx.command is not None:
+            command = ctx.command.qualified_name
+            if cog is None and ctx.cog is not None:
+                cog = ctx.cog.qualified_name
+        this = f_locals.get("self")
+        if cog is None and isinstance(this, _commands.Cog):
+            cog = this.qualified_name
+        frame = frame.f_back
+    return cog, command
+
+
+class LoopMonitor(logging.Log):
+    """
+    Monitors the health of an event loop. Call :meth:`start` from a coroutine running
+    on the loop to be monitored, and :meth:`stop` to stop monitoring it.
+
+    Parameters:
+        interval:
+            How often the probe runs, in seconds. Defaults to a quarter of a second.
+        threshold:
+            How long the loop must be blocked for, in seconds, to be considered stalled.
+            Defaults to half a second.
+        registry:
+            The :class:`libneko.metrics.Registry` to record the lag and stalls in.
+            Defaults to the process-wide registry.
+        keep:
+            How many of the most recent stalls to keep in :attr:`stalls`.
+
+    Metrics:
+        ``event_loop_lag_seconds``: how late the probe was woken up each time.
+        ``event_loop_stalls_total{cog,command}``: stalls, by culprit.
+        ``event_loop_stall_seconds``: how long each stall lasted.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.25,
+        threshold: float = 0.5,
+        registry: metrics.Registry = metrics.default_registry,
+        keep: int = 20,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: typing.Deque[Stall] = collections.deque(maxlen=keep)
+
+        self._lag = registry.histogram("event_loop_lag_seconds", "Event loop scheduling lag.")
+        self._stalls_total = registry.counter(
+            "event_loop_stalls_total", "Times the event loop was blocked, by culprit.", ("cog", "command")
+        )
+        self._stall_seconds = registry.histogram(
+            "event_loop_stall_seconds", "How long the event loop was blocked for."
+        )
+
+        self._probe_task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._loop_thread_id = None
+        # Written by the probe on the loop's thread, read by the watchdog thread.
+        self._heartbeat = time.monotonic()
+        # Written by the watchdog thread, completed and cleared by the probe.
+        self._stall = None
+
+    @property
+    def running(self) -> bool:
+        return self._probe_task is not None and not self._probe_task.done()
+
+    def start(self):
+        """Starts monitoring the running event loop."""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._probe_task = asyncio.get_event_loop().create_task(self._probe())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="libneko.loopmonitor watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self):
+        """Stops monitoring."""
+        self._stopped.set()
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    async def _probe(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            before = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - before - self.interval)
+            self._heartbeat = time.monotonic()
+            self._lag.observe(lag)
+
+            stall, self._stall = self._stall, None
+            if stall is not None:
+                stall.duration = lag
+                self._record(stall)
+
+    def _watch(self):
+        # Check a few times per threshold, so we catch the loop while it is still stuck.
+        while not self._stopped.wait(self.threshold / 4):
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked < self.threshold or self._stall is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            cog, command = attribute(frame)
+            stack = traceback.extract_stack(frame)
+            self._stall = Stall(time.time() - blocked, stack, cog, command)
+
+    def _record(self, stall: Stall):
+        self.stalls.append(stall)
+        self._stalls_total.labels(stall.cog or "", stall.command or "").inc()
+        self._stall_seconds.observe(stall.duration)
+        self.log.warning("%s:\n%s", stall, "".join(stall.stack.format()))
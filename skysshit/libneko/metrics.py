@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# MIT License
+#
+# Copyright (c) 2018-2019 Flitt3r (a.k.a Koyagami)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in a$
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+A tiny process-wide metrics registry: counters, gauges and HDR-style histograms,
+which can be rendered in the Prometheus text exposition format and served over a
+local HTTP endpoint, or summarised as a plain text table.
+
+This is deliberately dependency free, and is not thread safe: metrics should be
+updated from the event loop. Gauges that need to read state owned by another thread
+should be given a function to call whenever they are collected instead.
+
+Author:
+    Espy/Neko404NotFound
+"""
+
+__all__ = (
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "CacheMetrics",
+    "default_registry",
+    "serve",
+    "trace_config",
+)
+
+import asyncio
+import contextlib
+import math
+import time
+import typing
+
+from libneko import logging
+
+_logger = logging.get_logger("libneko.metrics")
+
+
+class _Metric:
+    """
+    A family of time series sharing a name, documentation and label names. Each
+    distinct combination of label values is a child of the family.
+
+    If the family has no labels, it acts as its own single child; otherwise call
+    :meth:`labels` to get the child to update.
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: typing.Sequence[str] = (), **options):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._options = options
+        self._children = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Gets the child for the given label values, creating it if it does not exist yet."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        values = tuple(str(v) for v in values)
+        try:
+            return self._children[values]
+        except KeyError:
+            child = self._children[values] = self._new_child()
+            return child
+
+    def children(self):
+        """Yields each (label values, child) pair of this family."""
+        if not self.labelnames and not self._children:
+            self.labels()
+        yield from self._children.items()
+
+    def __getattr__(self, item):
+        # Unlabelled families proxy to their only child.
+        if item.startswith("_") or self.labelnames:
+            raise AttributeError(item)
+        return getattr(self.labels(), item)
+
+    def _samples(self, child):
+        """Yields (suffix, extra labels, value) for each sample of the given child."""
+        yield "", (), child.value
+
+    def render(self) -> str:
+        """Renders the family in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for values, child in self.children():
+            for suffix, extra, value in self._samples(child):
+                labels = (*zip(self.labelnames, values), *extra)
+                if labels:
+                    labels = "{" + ",".join(f'{k}="{_escape(v, True)}"' for k, v in labels) + "}"
+                else:
+                    labels = ""
+                lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only go up")
+        self.value += amount
+
+
+class Counter(_Metric):
+    """A value that only ever goes up, such as the number of commands invoked."""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "function")
+
+    def __init__(self, function=None):
+        self._value = 0
+        self.function = function
+
+    @property
+    def value(self):
+        return self.function() if self.function is not None else self._value
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        self._value += amount
+
+    def dec(self, amount=1):
+        self._value -= amount
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down, such as a queue's length.
+
+    Parameters:
+        function:
+            Optional. If given, unlabelled gauges call this to get their value whenever
+            they are collected, rather than holding a value of their own.
+    """
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild(self._options.get("function"))
+
+    def set_function(self, function, *labels):
+        """Makes the given child read its value by calling ``function()`` when collected."""
+        self.labels(*labels).function = function
+
+
+class _HistogramChild:
+    """
+    Records values in HDR-style log-linear buckets: every power of two is split into
+    ``2 ** (precision - 1)`` equally sized sub-buckets, so any recorded value can be
+    recovered with a relative error of at most ``2 ** (1 - precision)``, no matter its
+    magnitude. Only buckets that have been hit take up any memory.
+    """
+
+    __slots__ = ("unit", "precision", "sub_buckets", "half", "buckets", "count", "sum", "min", "max")
+
+    def __init__(self, unit=1e-6, precision=5):
+        # Values are stored as integer multiples of the unit (microseconds by default).
+        self.unit = unit
+        self.precision = precision
+        self.sub_buckets = 1 << precision
+        self.half = self.sub_buckets >> 1
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, units):
+        if units < self.sub_buckets:
+            return units
+        shift = units.bit_length() - self.precision
+        return shift * self.half + (units >> shift)
+
+    def _upper_bound(self, index):
+        """The largest value (in units) that falls into the given bucket."""
+        if index < self.sub_buckets:
+            return index
+        shift = index // self.half - 1
+        return ((index - shift * self.half + 1) << shift) - 1
+
+    def observe(self, value):
+        index = self._index(max(0, int(value / self.unit)))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @contextlib.contextmanager
+    def time(self):
+        """Context manager that observes how many seconds its body took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def percentile(self, p):
+        """The value below which the given fraction (0 to 1) of observations fall."""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(p * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min(max(self._upper_bound(index) * self.unit, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Histogram(_Metric):
+    """
+    A distribution of values, such as how long each command took to run. Exported as
+    a Prometheus summary with the quantiles given (by default the median, 90th, 99th
+    and 99.9th percentile).
+
+    Parameters:
+        unit:
+            Optional. The resolution values are recorded at; defaults to a microsecond.
+        precision:
+            Optional. Number of significant bits kept per value; defaults to 5, which
+            is accurate to within about 6%.
+        quantiles:
+            Optional. The quantiles to export.
+    """
+
+    type_name = "summary"
+
+    def _new_child(self):
+        return _HistogramChild(self._options.get("unit", 1e-6), self._options.get("precision", 5))
+
+    def _samples(self, child):
+        for q in self._options.get("quantiles", (0.5, 0.9, 0.99, 0.999)):
+            yield "", (("quantile", str(q)),), child.percentile(q)
+        yield "_sum", (), child.sum
+        yield "_count", (), child.count
+
+
+class Registry:
+    """
+    A collection of metric families. Asking for a family that already exists returns
+    the existing one, so it is safe for several objects to declare the same metric.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, options):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, labelnames, **options)
+        elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered with a different type or labels")
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), **options) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames, options)
+
+    def gauge(self, name, documentation, labelnames=(), **options) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames, options)
+
+    def histogram(self, name, documentation, labelnames=(), **options) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, options)
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def __contains__(self, name):
+        return name in self._metrics
+
+    def __iter__(self):
+        return iter(self._metrics.values())
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self) + "\n"
+
+    def summary(self) -> str:
+        """A human readable table of every metric, for showing in a chat message."""
+        lines = []
+        for metric in self:
+            for values, child in metric.children():
+                name = metric.name
+                if values:
+                    name += "{" + ",".join(values) + "}"
+                if isinstance(child, _HistogramChild):
+                    if not child.count:
+                        continue
+                    lines.append(
+                        f"{name}: n={child.count} p50={_ms(child.percentile(.5))} "
+                        f"p99={_ms(child.percentile(.99))} max={_ms(child.max)}"
+                    )
+                elif isinstance(child, _CounterChild) and not child.value:
+                    continue
+                else:
+                    lines.append(f"{name}: {_format_value(child.value)}")
+
+        rates = CacheMetrics.hit_rates(self)
+        if rates:
+            lines.append("")
+            lines.extend(f"cache {name}: {rate:.1%} hits of {total}" for name, (rate, total) in rates.items())
+        return "\n".join(lines)
+
+
+default_registry = Registry()
+
+
+class CacheMetrics:
+    """
+    Counts hits and misses of a named cache in the ``cache_lookups_total`` counter,
+    so that its hit rate shows up in the registry's summary.
+    """
+
+    __slots__ = ("_hit", "_miss")
+
+    def __init__(self, name, registry: Registry = default_registry):
+        lookups = registry.counter(
+            "cache_lookups_total", "Cache lookups, by cache and whether they hit.", ("cache", "result")
+        )
+        self._hit = lookups.labels(name, "hit")
+        self._miss = lookups.labels(name, "miss")
+
+    def hit(self):
+        self._hit.value += 1
+
+    def miss(self):
+        self._miss.value += 1
+
+    def __call__(self, hit: bool):
+        """Records a hit if ``hit`` is truthy, otherwise a miss."""
+        if hit:
+            self._hit.value += 1
+        else:
+            self._miss.value += 1
+
+    @staticmethod
+    def hit_rates(registry: Registry):
+        """Maps each cache name to its (hit rate, total lookups)."""
+        if "cache_lookups_total" not in registry:
+            return {}
+        counts = {}
+        for (name, result), child in registry["cache_lookups_total"].children():
+            counts.setdefault(name, {})[result] = child.value
+        rates = {}
+        for name, c in counts.items():
+            total = c.get("hit", 0) + c.get("miss", 0)
+            if total:
+                rates[name] = (c.get("hit", 0) / total, total)
+        return rates
+
+
+async def serve(registry: Registry = default_registry, host: str = "127.0.0.1", port: int = 9100):
+    """
+    Starts a minimal HTTP server that responds to ``GET /metrics`` with the registry
+    rendered in the Prometheus text format. Binds to localhost by default; put a reverse
+    proxy in front of it rather than exposing it publicly.
+
+    Returns:
+        The :class:`asyncio.AbstractServer`; close it to stop serving.
+    """
+
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Skip the headers, we do not care about any of them.
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] in ("GET", "HEAD") and parts[1].split("?")[0] in ("/", "/metrics"):
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.0 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode()
+            )
+            if parts and parts[0] != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except Exception as ex:
+            _logger.warning("Error serving metrics: %s: %s", type(ex).__name__, ex)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    _logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return server
+
+
+def trace_config(registry: Registry = default_registry):
+    """
+    Creates an :class:`aiohttp.TraceConfig` that records the latency of every request
+    made by a session into ``http_request_seconds``, by host. Pass it to a session with
+    ``aiohttp.ClientSession(trace_configs=[metrics.trace_config()])``.
+    """
+    import aiohttp
+
+    histogram = registry.histogram("http_request_seconds", "HTTP request latency, by host.", ("host",))
+
+    async def on_request_start(_session, context, _params):
+        context.metrics_start = time.perf_counter()
+
+    async def on_request_end(_session, context, params):
+        histogram.labels(params.url.host).observe(time.perf_counter() - context.metrics_start)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_end)
+    return config
+
+
+def _escape(string, quotes=False):
+    string = str(string).replace("\\", "\\\\").replace("\n", "\\n")
+    return string.replace('"', '\\"') if quotes else string
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+        return repr(value)
+    return str(value)
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.2f}ms"
@@ -43,5 +43,7 @@ from .factory.embedfactory import *
 from .factory.stringfactory import *
 from .navigator import *
 from .optionpicker import *
+from .pagesource import *
 from .paginator import *
 from .reactionbuttons import *
+from .reactionrouter import *
@@ -47,7 +47,7 @@ __all__ = (
     "embed_generator",
 )
 
-from typing import Union, Sequence, List
+from typing import Union, Sequence
 
 import discord
 from discord.ext import commands
@@ -55,6 +55,7 @@ from discord.ext import commands
 from libneko import embeds
 from libneko.pag.factory.basefactory import BaseFactory
 from ..navigator import FakeContext, EmbedNavigator
+from ..pagesource import SequencePageSource
 from ..paginator import Paginator
 from ..reactionbuttons import Button, default_buttons
 
@@ -224,19 +225,18 @@ class EmbedNavigatorFactory(BaseFactory, Paginator):
             force_truncation=force_truncation,
         )
 
-    def _transform_pages(self) -> List[discord.Embed]:
-        """Converts string pages to embed pages."""
-        # We need to pre-emptily get this.
+    def _build_page(self, page: str, page_index: int) -> discord.Embed:
+        """Converts a string page to an embed page."""
+        try:
+            return self.factory.build_page(self, page, page_index)
+        except Exception as ex:
+            raise ValueError(
+                f"{type(ex).__name__} raised while producing page {page_index}."
+            ) from ex
 
-        embed_pages = []
-
-        for i, page in enumerate(self.pages):
-            try:
-                embed_pages.append(self.factory.build_page(self, page, i))
-            except Exception as ex:
-                raise ValueError(f"{type(ex).__name__} raised while producing page {i}.") from ex
-
-        return embed_pages
+    def _page_source(self) -> SequencePageSource:
+        """Produces embed pages from the string pages only as they are displayed."""
+        return SequencePageSource(self.pages, self._build_page)
 
     def build(
         self,
@@ -265,7 +265,7 @@ class EmbedNavigatorFactory(BaseFactory, Paginator):
 
         n = EmbedNavigator(
             ctx,
-            self._transform_pages(),
+            self._page_source(),
             buttons=buttons,
             timeout=timeout,
             initial_page=initial_page,
@@ -42,12 +42,13 @@ import sys
 from abc import abstractmethod
 from typing import Generic, Sequence, TypeVar, Union, Optional, TYPE_CHECKING, Iterator
 
-import async_timeout
 import discord
 from discord.ext import commands
 
 from libneko import logging
 from . import abc
+from .pagesource import PageSource
+from .reactionrouter import ReactionRouter
 
 # Stops looped lookups failing.
 if TYPE_CHECKING:
@@ -59,6 +60,9 @@ ChannelT = Union[discord.TextChannel, discord.DMChannel]
 
 _logger = logging.get_logger("libneko.pag.navigator")
 
+# Put in the event queue when the navigator has been idle for too long.
+_TIMED_OUT = object()
+
 
 class _Flag:
     """Settable/unsettable flag."""
@@ -80,6 +84,65 @@ class _Flag:
         return self.value
 
 
+class _ReactionCache:
+    """
+    The reactions on a message, as last reported by the gateway or by our own
+    requests, so that we never have to ask the API who reacted with what.
+    """
+
+    __slots__ = ("users",)
+
+    def __init__(self):
+        #: Maps each emoji to the users reacting with it, by ID, in the order the
+        #: emojis first appeared (which is the order Discord displays them in).
+        self.users = collections.OrderedDict()
+
+    def add(self, emoji, user):
+        """Records a reaction."""
+        self.users.setdefault(emoji, {})[user.id] = user
+
+    def remove(self, emoji, user):
+        """Records a reaction being removed."""
+        users = self.users.get(emoji)
+        if users is not None:
+            users.pop(user.id, None)
+            if not users:
+                del self.users[emoji]
+
+    def clear(self):
+        """Records every reaction being removed."""
+        self.users.clear()
+
+    def plan(self, expected, me):
+        """
+        Works out the fewest requests to make to leave only our own reactions for the
+        expected emojis, in that order.
+
+        Returns:
+            A tuple of whether to clear all reactions first, the emojis to react with
+            before removing anything (these keep a reaction where it already is), the
+            ``(emoji, user)`` pairs to remove, and the emojis to react with after that.
+        """
+        fill, removals, position = [], [], 0
+
+        for emoji, users in self.users.items():
+            if position < len(expected) and emoji == expected[position]:
+                # Already in the right place, we just want it to be ours alone.
+                position += 1
+                if me.id not in users:
+                    fill.append(emoji)
+                removals += [(emoji, user) for user_id, user in users.items() if user_id != me.id]
+            else:
+                # Either should not be here, or is out of order.
+                removals += [(emoji, user) for user in users.values()]
+
+        additions = expected[position:]
+
+        if self.users and 1 + len(expected) < len(fill) + len(removals) + len(additions):
+            return True, [], [], list(expected)
+        return False, fill, removals, additions
+
+
 class CancelAction(enum.IntFlag):
     """
     Represents a cleanup action to perform on the navigator terminating.
@@ -185,7 +248,8 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
             the command context to invoke in response to. If you are using this in
             an event listener, you can generate a ``FakeContext`` to go in here.
         pages:
-            A sequence of elements to display.
+            A sequence of elements to display, or a ``PageSource`` to produce them on
+            demand.
         buttons:
             A sequence of ``Button`` objects.
 
@@ -207,7 +271,7 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
         bot:
             The bot that is sending this paginator. Can be anything derived from discord.Client.
         pages:
-            The sequence of pages to display from.
+            The sequence of pages to display from, or the ``PageSource`` producing them.
         buttons:
             The ordered mapping of emoji to button for reactions to display.
         timeout:
@@ -239,7 +303,7 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
     def __init__(
         self,
         ctx: Union[commands.Context, FakeContext, tuple],
-        pages: Sequence[PageT],
+        pages: Union[Sequence[PageT], PageSource[PageT]],
         buttons: Sequence["Button"] = None,
         *,
         timeout: float = 300,
@@ -273,6 +337,10 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
             # Flag set internally if anything is altered. Saves bandwidth for
             # otherwise pointless operations.
             self._should_refresh = _Flag(False)
+            # Routes events for our messages to us while we are running.
+            self._router: Optional[ReactionRouter] = None
+            # Reactions on the root message.
+            self._reactions = _ReactionCache()
 
             #: Owner of the navigator.
             self.owner = ctx.author
@@ -325,6 +393,9 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
         return self.is_finished.wait()
 
     def __len__(self):
+        if isinstance(self.pages, PageSource) and not self.pages.is_complete:
+            # Allow moving onto the next page, even though it has not been produced yet.
+            return len(self.pages) + 1
         return len(self.pages)
 
     def __repr__(self):
@@ -336,6 +407,8 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
 
     def memory_usage(self) -> int:
         """Gets the rough number of bytes being used to store the pages in memory."""
+        if isinstance(self.pages, PageSource):
+            return self.pages.memory_usage()
         return sum(sys.getsizeof(p, 0) for p in self.pages)
 
     @property
@@ -360,6 +433,7 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
 
         if add_to_list:
             self._messages.append(m)
+            self._track(m)
 
         return m
 
@@ -369,7 +443,15 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
         if not self._messages:
             self._messages = [message]
         else:
+            if self._messages[0].id != message.id:
+                self._reactions.clear()
             self._messages[0] = message
+        self._track(message)
+
+    def _track(self, message):
+        """Has the router send us events for the given message while we are running."""
+        if self._router is not None:
+            self._router.track(message.id, self)
 
     @property
     def additional_messages(self) -> Iterator[discord.Message]:
@@ -383,9 +465,35 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
 
     @property
     def current_page(self) -> PageT:
-        """Gets the current page that should be being displayed."""
+        """
+        Gets the current page that should be being displayed.
+
+        If the pages come from a ``PageSource``, this is None unless the page has
+        already been rendered. Use ``fetch_current_page`` instead.
+        """
+        if isinstance(self.pages, PageSource):
+            return self.pages.cached(self.page_index)
         return self.pages[self.page_index]
 
+    async def fetch_current_page(self) -> PageT:
+        """|coro|
+
+        Gets the current page that should be being displayed, producing it if the
+        pages come from a ``PageSource``.
+
+        If the source turns out to end before the current page, we move to the last page.
+        """
+        if not isinstance(self.pages, PageSource):
+            return self.current_page
+
+        try:
+            return await self.pages.get_page(self.page_index)
+        except IndexError:
+            if not len(self.pages):
+                raise CancelIteration(CancelAction.REMOVE_ALL_SENT_MESSAGES) from None
+            self._page_index = len(self.pages) - 1
+            return await self.pages.get_page(self._page_index)
+
     @property
     def page_index(self):
         """Gets/sets the page index (0-based)."""
@@ -435,6 +543,9 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
         Sends a reaction addition event.
         """
 
+        if self._messages and reaction.message.id == self.root_message.id:
+            self._reactions.add(reaction.emoji, user)
+
         if self.is_ready.is_set() and self._messages:
             if reaction.message.id != self.root_message.id:
                 return
@@ -453,6 +564,58 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
             if not_me and valid_button and is_in_whitelist:
                 await self._event_queue.put((reaction, user))
 
+    async def _on_reaction_remove(self, reaction, user):
+        """|coro|
+
+        Records a reaction being removed from the root message.
+        """
+        if self._messages and reaction.message.id == self.root_message.id:
+            self._reactions.remove(reaction.emoji, user)
+
+    async def _on_reaction_clear(self, message, _reactions):
+        """|coro|
+
+        Records every reaction being removed from the root message.
+        """
+        if self._messages and message.id == self.root_message.id:
+            self._reactions.clear()
+
+    async def _reconcile_reactions(self, root):
+        """|coro|
+
+        Makes the reactions on the root message match the buttons that should show,
+        using the reactions we know about from the gateway rather than asking the API.
+
+        Requests are made one at a time: the HTTP client waits on each route's rate
+        limit bucket, so firing them all at once gains nothing.
+        """
+        me = self.bot.user
+        buttons = list(self.buttons.values())
+        shows = await asyncio.gather(*(b.should_show() for b in buttons))
+        expected = [b.emoji for b, show in zip(buttons, shows) if show]
+
+        should_clear, fill, removals, additions = self._reactions.plan(expected, me)
+
+        if should_clear:
+            await root.clear_reactions()
+            self._reactions.clear()
+
+        for emoji in fill:
+            await root.add_reaction(emoji)
+            self._reactions.add(emoji, me)
+
+        for emoji, user in removals:
+            try:
+                await root.remove_reaction(emoji, user)
+            except discord.NotFound:
+                # Already gone.
+                pass
+            self._reactions.remove(emoji, user)
+
+        for emoji in additions:
+            await root.add_reaction(emoji)
+            self._reactions.add(emoji, me)
+
     # @print_result
     async def _on_message_delete(self, message):
         """|coro|
@@ -493,6 +656,8 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
 
     def format_page_number(self) -> str:
         """Formats the page number."""
+        if isinstance(self.pages, PageSource) and not self.pages.is_complete:
+            return f"[{self.page_number}/{len(self.pages)}+]\n"
         return f"[{self.page_number}/{len(self)}]\n"
 
     def start(self):
@@ -544,14 +709,19 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
 
         Runs the main logic loop for the navigator.
         """
-        if not self.pages or not all(self.pages):
+        if isinstance(self.pages, PageSource):
+            try:
+                await self.pages.get_page(self.page_index)
+            except IndexError:
+                raise ValueError("There are no pages.") from None
+        elif not self.pages or not all(self.pages):
             raise ValueError("Empty pages exist.")
 
         if self.is_ready.is_set():
             raise RuntimeError("Already running this navigator.")
 
-        self.bot.listen("on_message_delete")(self._on_message_delete)
-        self.bot.listen("on_reaction_add")(self._on_reaction_add)
+        self._router = ReactionRouter.for_bot(self.bot)
+        idle_timer = None
 
         try:
 
@@ -577,44 +747,13 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
                     except IndexError:
                         root = await produce_page()
 
-                    current_reacts = root.reactions
-                    expected_reacts = [
-                        b.emoji for b in self.buttons.values() if await b.should_show()
-                    ]
-
-                    for react in current_reacts:
-                        # If the current react doesn't match the one at the list head,
-                        # then we assume it should not be here, so we remove it. If we
-                        # have got to the end of our targets list, we assume everything
-                        # else is garbage, and thus we delete it.
-                        if not expected_reacts or react.emoji != expected_reacts[0]:
-                            async for user in react.users():
-                                self.create_task(root.remove_reaction(react, user))
-
-                        # If there are still targets left to check and the current
-                        # reaction is the next target, remove all reacts that are not by
-                        # me.
-                        elif react.emoji == expected_reacts[0]:
-                            expected_reacts.pop(0)
-                            async for user in react.users():
-                                # Ignore our own react. We want to keep that.
-                                if user != self.bot.user:
-                                    self.create_task(root.remove_reaction(react, user))
-
+                    await self._reconcile_reactions(root)
                 except discord.Forbidden:
                     # If we can't update them, just continue.
                     await self._permission_error()
-                else:
-                    # If we did not validate all targets by now, we know they are
-                    # missing and should be added
-                    if expected_reacts:
-                        try:
-                            for r in expected_reacts:
-                                await self.root_message.add_reaction(r)
-                        except discord.Forbidden:
-                            await self._permission_error()
-                        except discord.NotFound:
-                            raise CancelIteration(CancelAction.REMOVE_NON_ROOT_MESSAGES)
+                except discord.NotFound:
+                    raise CancelIteration(CancelAction.REMOVE_NON_ROOT_MESSAGES)
+
                 # Get next event, or wait.
                 # This is essentially a polling pipe between the event captures
                 # and the handlers. I could have used wait_for, but that encouraged
@@ -622,9 +761,20 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
                 # easy to understand.
                 # This is required to enable us to intercept signals sent via
                 # exceptions.
-                with async_timeout.timeout(self.timeout):
+                deadline = object()
+                idle_timer = self._router.timers.schedule(
+                    self.timeout, lambda d=deadline: self._event_queue.put_nowait((_TIMED_OUT, d))
+                )
+                while True:
                     reaction, user = await self._event_queue.get()
-                    await self._handle_reaction(reaction, user)
+                    if reaction is not _TIMED_OUT:
+                        break
+                    elif user is deadline:
+                        raise asyncio.TimeoutError
+                    # Otherwise, it is from a timer that fired just as an event arrived.
+                idle_timer.cancel()
+
+                await self._handle_reaction(reaction, user)
 
                 if self._should_refresh:
                     self.create_task(self._edit_page())
@@ -675,16 +825,11 @@ class BaseNavigator(abc.PagABC, Generic[PageT]):
             self.is_ready.clear()
             self.is_finished.set()
 
-            # Remove the listeners.
-            try:
-                self.bot.remove_listener(self._on_message_delete)
-            except Exception:
-                _logger.exception("Exception on removing listener on_message_delete", exc_info=True)
-
-            try:
-                self.bot.remove_listener(self._on_reaction_add)
-            except Exception:
-                _logger.exception("Exception on removing listener on_reaction_add", exc_info=True)
+            # Stop receiving events.
+            if idle_timer is not None:
+                idle_timer.cancel()
+            self._router.untrack_all(self)
+            self._router = None
 
     async def _permission_error(self):
         try:
@@ -726,7 +871,8 @@ class StringNavigator(BaseNavigator[str]):
             the command context to invoke in response to. If you are using this in
             an event listener, you can generate a ``FakeContext`` to go in here.
         pages:
-            A sequence of elements to display.
+            A sequence of elements to display, or a ``PageSource`` to produce them on
+            demand.
         buttons:
             A sequence of ``Button`` objects.
 
@@ -748,7 +894,7 @@ class StringNavigator(BaseNavigator[str]):
         bot:
             The bot that is sending this paginator. Can be anything derived from discord.Client.
         pages:
-            The sequence of pages to display from.
+            The sequence of pages to display from, or the ``PageSource`` producing them.
         buttons:
             The ordered mapping of emoji to button for reactions to display.
         timeout:
@@ -779,8 +925,8 @@ class StringNavigator(BaseNavigator[str]):
         Edits the displayed page on Discord. This is the opportunity to add a page number
         to the content if there is room.
         """
+        content = await self.fetch_current_page()
         page_header = self.format_page_number()
-        content = self.current_page
 
         if len(content) + len(page_header) <= 2000:
             content = page_header + content
@@ -807,7 +953,8 @@ class EmbedNavigator(BaseNavigator[discord.Embed]):
             the command context to invoke in response to. If you are using this in
             an event listener, you can generate a ``FakeContext`` to go in here.
         pages:
-            A sequence of elements to display.
+            A sequence of elements to display, or a ``PageSource`` to produce them on
+            demand.
         buttons:
             A sequence of ``Button`` objects.
 
@@ -829,7 +976,7 @@ class EmbedNavigator(BaseNavigator[discord.Embed]):
         bot:
             The bot that is sending this paginator. Can be anything derived from discord.Client.
         pages:
-            The sequence of pages to display from.
+            The sequence of pages to display from, or the ``PageSource`` producing them.
         buttons:
             The ordered mapping of emoji to button for reactions to display.
         timeout:
@@ -866,7 +1013,7 @@ class EmbedNavigator(BaseNavigator[discord.Embed]):
 
         Edits the displayed page on Discord.
         """
+        content = await self.fetch_current_page()
         page_header = self.format_page_number()
-        content = self.current_page
 
         await self.root_message.edit(content=page_header, embed=content)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# MIT License
+#
+# Copyright (c) 2018-2019 Flitt3r (a.k.a Koyagami)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in a$
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Page sources produce the pages for a navigator on demand, rather than requiring
+every page to exist before the navigator starts.
+
+Only the page being displayed is rendered, along with a small window of pages
+either side of it that get rendered in the background so that turning the page
+is quick. Rendered pages are kept in a small LRU cache.
+
+Pass a page source to a navigator in place of the sequence of pages::
+
+    >>> async def search_results():
+    ...     async for result in some_api.search(query):
+    ...         yield result.text
+
+    >>> source = AsyncIteratorPageSource(
+    ...     search_results(), render=lambda text, i: discord.Embed(description=text)
+    ... )
+
+    >>> EmbedNavigator(ctx, source).start()
+"""
+
+__all__ = ("PageSource", "SequencePageSource", "AsyncIteratorPageSource")
+
+import asyncio
+import collections
+import sys
+from abc import ABC, abstractmethod
+from typing import (
+    Any,
+    AsyncIterable,
+    Callable,
+    Generic,
+    Iterable,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
+
+from libneko import funcmods
+from libneko import logging
+
+PageT = TypeVar("PageT")
+
+#: Takes the raw page and the 0-based page index, and returns the page to display.
+#: May be a coroutine function.
+RenderT = Callable[[Any, int], PageT]
+
+_logger = logging.get_logger("libneko.pag.pagesource")
+
+
+class PageSource(ABC, Generic[PageT]):
+    """
+    Base for an object that produces pages on demand.
+
+    Implementations provide raw pages by index, which are passed through the
+    ``render`` callable (if one is given) to produce the page to display.
+
+    Args:
+        render:
+            Optional function or coroutine function taking the raw page and the
+            0-based page index, and returning the page to display. If unspecified,
+            raw pages are displayed as they are.
+
+    Keyword Args:
+        prefetch:
+            How many pages after (and before) the last requested page to render in
+            the background. Defaults to 2.
+        cache_size:
+            How many rendered pages to keep. Defaults to 16. This must hold at least
+            the page being displayed and the prefetched pages either side of it.
+    """
+
+    def __init__(self, render: RenderT = None, *, prefetch: int = 2, cache_size: int = 16):
+        if prefetch < 0:
+            raise ValueError("Cannot prefetch a negative number of pages.")
+        if cache_size < 2 * prefetch + 1:
+            raise ValueError("The cache is too small to hold the prefetched pages.")
+
+        self.render = funcmods.ensure_coroutine_function(render) if render else None
+        self.prefetch = prefetch
+        self.cache_size = cache_size
+        # Rendered pages, least recently used first.
+        self._rendered = collections.OrderedDict()
+        # Futures for pages being rendered right now.
+        self._rendering = {}
+
+    @property
+    @abstractmethod
+    def known_length(self) -> int:
+        """The number of pages that are known to exist so far."""
+        ...
+
+    @property
+    @abstractmethod
+    def is_complete(self) -> bool:
+        """True if :attr:`known_length` is the total number of pages."""
+        ...
+
+    @abstractmethod
+    async def get_raw_page(self, index: int) -> Any:
+        """|coro|
+
+        Gets the raw page at the given 0-based index, producing it if it has not been
+        produced yet.
+
+        Raises:
+            IndexError: if there is no such page.
+        """
+        ...
+
+    def __len__(self):
+        return self.known_length
+
+    def cached(self, index: int) -> Optional[PageT]:
+        """Gets the rendered page at the given index if it is cached, or None otherwise."""
+        return self._rendered.get(index)
+
+    def memory_usage(self) -> int:
+        """Gets the rough number of bytes being used to store the rendered pages."""
+        return sum(sys.getsizeof(p, 0) for p in self._rendered.values())
+
+    async def get_page(self, index: int) -> PageT:
+        """|coro|
+
+        Gets the rendered page at the given 0-based index, and starts rendering the pages
+        around it in the background.
+
+        Raises:
+            IndexError: if there is no such page.
+        """
+        if index < 0:
+            raise IndexError("Page sources do not support negative indexes.")
+
+        try:
+            page = self._rendered[index]
+        except KeyError:
+            # Don't cancel anyone else waiting on this page if we get cancelled.
+            page = await asyncio.shield(self._load(index))
+        else:
+            self._rendered.move_to_end(index)
+
+        for i in range(max(0, index - self.prefetch), index + self.prefetch + 1):
+            if self.is_complete and i >= self.known_length:
+                break
+            if i not in self._rendered and i not in self._rendering:
+                self._load(i).add_done_callback(self._on_prefetched)
+
+        return page
+
+    def _load(self, index: int) -> asyncio.Future:
+        """Returns a future for rendering the given page, starting one if needed."""
+        try:
+            return self._rendering[index]
+        except KeyError:
+            future = asyncio.ensure_future(self._render(index))
+            self._rendering[index] = future
+            future.add_done_callback(lambda _: self._rendering.pop(index, None))
+            return future
+
+    async def _render(self, index: int) -> PageT:
+        page = await self.get_raw_page(index)
+        if self.render is not None:
+            page = await self.render(page, index)
+
+        self._rendered[index] = page
+        while len(self._rendered) > self.cache_size:
+            self._rendered.popitem(last=False)
+        return page
+
+    @staticmethod
+    def _on_prefetched(future):
+        if future.cancelled():
+            return
+
+        ex = future.exception()
+        if ex is not None and not isinstance(ex, IndexError):
+            # It will get raised again if the page is actually requested.
+            _logger.warning("Failed to prefetch a page: %s: %s", type(ex).__name__, ex)
+
+
+class SequencePageSource(PageSource[PageT]):
+    """
+    Renders pages on demand from a sequence of raw pages.
+
+    This is useful where the raw pages are cheap (such as the string output of a
+    :class:`libneko.pag.Paginator`), but turning them into something to display
+    (such as embeds) is not.
+
+    Args:
+        pages:
+            The sequence of raw pages.
+        render:
+            See :class:`PageSource`.
+
+    Keyword Args:
+        prefetch:
+            See :class:`PageSource`.
+        cache_size:
+            See :class:`PageSource`.
+    """
+
+    def __init__(self, pages: Sequence[Any], render: RenderT = None, **kwargs):
+        super().__init__(render, **kwargs)
+        #: The raw pages.
+        self.pages = pages
+
+    @property
+    def known_length(self) -> int:
+        return len(self.pages)
+
+    @property
+    def is_complete(self) -> bool:
+        return True
+
+    async def get_raw_page(self, index: int) -> Any:
+        return self.pages[index]
+
+
+class AsyncIteratorPageSource(PageSource[PageT]):
+    """
+    Pulls raw pages from an iterable or asynchronous iterable as they are needed.
+
+    This allows paging through data that is still being generated or fetched, or
+    that has no end. Nothing is pulled from the iterable until a page is requested,
+    and then only as far as the furthest page requested (plus any prefetched pages).
+
+    Raw pages are kept once they have been pulled so that navigation can go back to
+    them, so the raw pages should be cheap to keep: do expensive work in ``render``.
+
+    Args:
+        iterable:
+            An iterable or async iterable of raw pages.
+        render:
+            See :class:`PageSource`.
+
+    Keyword Args:
+        prefetch:
+            See :class:`PageSource`.
+        cache_size:
+            See :class:`PageSource`.
+    """
+
+    def __init__(
+        self, iterable: Union[Iterable[Any], AsyncIterable[Any]], render: RenderT = None, **kwargs
+    ):
+        super().__init__(render, **kwargs)
+
+        if hasattr(iterable, "__aiter__"):
+            self._iterator = iterable.__aiter__()
+        else:
+            self._iterator = iter(iterable)
+
+        self._raw_pages = []
+        self._exhausted = False
+        self._lock = None
+
+    @property
+    def known_length(self) -> int:
+        return len(self._raw_pages)
+
+    @property
+    def is_complete(self) -> bool:
+        return self._exhausted
+
+    async def get_raw_page(self, index: int) -> Any:
+        if index >= len(self._raw_pages) and not self._exhausted:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+
+            # Only one caller pulls from the iterator at a time.
+            async with self._lock:
+                while index >= len(self._raw_pages) and not self._exhausted:
+                    await self._pull()
+
+        return self._raw_pages[index]
+
+    async def _pull(self):
+        """Pulls the next raw page from the iterator."""
+        try:
+            if hasattr(self._iterator, "__anext__"):
+                page = await self._iterator.__anext__()
+            else:
+                page = next(self._iterator)
+        except (StopIteration, StopAsyncIteration):
+            self._exhausted = True
+        else:
+            self._raw_pages.append(page)
@@ -27,10 +27,9 @@
 __all__ = ("Substitution", "Paginator")
 
 import collections
+import re
 from typing import List, Sequence, Callable
 
-from libneko import properties
-
 # Marks the intent for a page break.
 _PAGE_BREAK = object()
 
@@ -55,23 +54,14 @@ def _generate(i):
         pass
 
 
-def _explode_on_any(string) -> List[str]:
-    # Ensure each occurrence is only once, but cast to list as that is faster to traverse.
-    # Python has faster locals access than globals.
-    boundary_chars = [*{" ", "\t", "\r", "\n", ", ", "; ", ". ", "-", "! ", "? ", ") ", "] ", "} "}]
-
-    # Linked list makes thousands of allocs less expensive, as it is less likely
-    # to require a large block be realloced.
-    bits = []
+# Each part ends just after a boundary character. The punctuation boundaries (", ", "; ",
+# ". ", etc) all end in a space, so splitting after whitespace and hyphens covers them too.
+_EXPLODE_PATTERN = re.compile(r"[^ \t\r\n-]*[ \t\r\n-]|[^ \t\r\n-]+")
 
-    for c in string:
-        if not bits or any(bits[-1].endswith(c) for c in boundary_chars):
-            # Start a new buffer.
-            bits.append("")
-        # Append (gonna be godawful slow)
-        bits[-1] += c
 
-    return list(bits)
+def _explode_on_any(string) -> List[str]:
+    """Splits the string after every space, tab, CR, LF or hyphen, in linear time."""
+    return _EXPLODE_PATTERN.findall(string)
 
 
 Substitution = Callable[[str], str]
@@ -102,22 +92,19 @@ class Paginator:
 
     This operates by caching any chunks to produce from first in a deque. On
     request of either the true object length, or the object pages, we generate
-    the chunk of pages formatted according to the configuration. This is stored
-    as a cached property for the lifetime of this object, or until the chunk
-    queue is altered again.
+    the chunk of pages formatted according to the configuration.
+
+    Pagination is incremental: the paginator remembers how far through the chunks
+    it got, along with the running character and line counts of the page it is
+    filling, so chunks added to the back afterwards are just paginated onto the
+    end of the existing pages. Pagination takes time linear in the input size.
 
     This also supports appending to the front, which is rather snazzy, I would
-    say.
+    say. Doing so (or reversing the chunks) means starting over from scratch, though.
 
     Note:
-        This has a high runtime complexity....
-
-        Just be aware. If you are paginating a large chunk of text, more than
-        say 15 pages, you may want to outsource this to an executor. Preferably
-        a process pool for faster parallelism.
-
-        I may rewrite this algorithm in C in the future if I can get enough self
-        loathing and hatred to attempt it.
+        If you are paginating a very large chunk of text, you may still want to
+        outsource this to an executor with :meth:`generate_pages_noblock`.
 
     Arguments:
         max_chars:
@@ -169,7 +156,7 @@ you do not do this, it will not be taken into account.
 
     __slots__ = (
         "chunks",
-        properties.SLOTTED_PREFIX + "pages",
+        "_state",
         "max_chars",
         "max_lines",
         "prefix",
@@ -225,6 +212,9 @@ you do not do this, it will not be taken into account.
         #: Whether to force truncation on chunks too large to fit onto one page.
         self.force_truncation = force_truncation
 
+        #: How far through the chunks pagination has got. None to start over.
+        self._state = None
+
     def add(self, *objects: object, to_back: bool = True) -> "Paginator":
         """
         Add an atomic string to the chunks list.
@@ -242,6 +232,7 @@ you do not do this, it will not be taken into account.
         else:
             for obj in reversed(objects):
                 self.chunks.appendleft(obj)
+            self._state = None
 
         return self
 
@@ -273,7 +264,11 @@ you do not do this, it will not be taken into account.
 
         Returns this paginator object so that the call can be chained.
         """
-        to_back and self.chunks.append(_PAGE_BREAK) or self.chunks.appendleft(_PAGE_BREAK)
+        if to_back:
+            self.chunks.append(_PAGE_BREAK)
+        else:
+            self.chunks.appendleft(_PAGE_BREAK)
+            self._state = None
         return self
 
     def add_block(self, block, *, to_back: bool = True) -> "Paginator":
@@ -319,170 +314,35 @@ you do not do this, it will not be taken into account.
         """
         return self._enable_truncation
 
-    @properties.cached_property(properties.ClassType.SLOTS)
+    @property
     def pages(self) -> List[str]:
         """
-        Generates the pages and returns them. This is a potentially computationally
-        expensive operation, and will be cached until the paginator is modified again.
+        Generates the pages and returns them. Only chunks added since the last call
+        are paginated, so calling this repeatedly while adding to the back is cheap.
         """
-        # Here be dragons.
-
         if not self.chunks:
             return []
 
-        # Our max length is not actually the max length, as we may have a prefix
-        # and suffix, also. We need to get their lengths first and offset.
-
-        # Call me a bad programmer, but this -2 stops stuff erroring and I cannot
-        # be bothered right now to work out why.
-        real_length = self.max_chars - len(self.prefix) - len(self.suffix) - 2
-
-        if real_length <= 0:
-            raise ValueError("With prefixes, you cannot fit any characters onto this page size.")
-
-        # Don't expand the generator expressions. This saves memory by
-        # not pre-allocating the space.
-        chunks = (c is _LINE_BREAK and self.line_break or c for c in self.chunks)
-
-        # Explode all non-critical parts based on the space characters we can escape,
-        # using a new lit
-        new_chunks = []
-        should_truncate = self._enable_truncation
-        for chunk in chunks:
-            if chunk not in SENTINELS:
-                # Execute substitutions here.
-                for substitution in [str, *self.substitutions]:
-                    chunk = substitution(chunk)
-
-            if chunk in (_ENABLE_TRUNCATION, _DISABLE_TRUNCATION):
-                should_truncate = chunk is _ENABLE_TRUNCATION
-                # We need these again in a moment.
-                new_chunks.append(chunk)
-            elif chunk is _PAGE_BREAK:
-                new_chunks.append(chunk)
-            elif should_truncate:
-                new_chunks += _explode_on_any(chunk)
-            else:
-                # Keep the chunked parts as they already are.
-                new_chunks.append(chunk)
-
-        chunks = new_chunks
-        del new_chunks
-
-        # Paginate
-        pages = []
-
-        def page_break():
-            """Start a new page."""
-            # Remove trailing whitespace
-            if pages:
-                pages[-1] = str(pages[-1]).rstrip()
-            pages.append("")
-
-        def split_force(initial_quota, string):
-            """
-            Splits a string forcefully on max length. This only really should
-            occur as a last resort. Initial quota is used to fill up any
-            previous space. Since we are splitting mid-word anyway, we may as
-            well compact it.
-
-            Returns an iterator.
-            """
-            assert initial_quota >= 0
-
-            if initial_quota:
-                yield string[:initial_quota]
-
-            for i in range(initial_quota, len(string), real_length):
-                yield string[i : i + real_length]
-
-        should_truncate = self._enable_truncation
-
-        while chunks:
-            chunk = chunks.pop(0)
-            if chunk in (_ENABLE_TRUNCATION, _DISABLE_TRUNCATION):
-                # Don't add these
-                should_truncate = chunk is _ENABLE_TRUNCATION
-            else:
-
-                if not pages:
-                    page_break()
-
-                if chunk is _PAGE_BREAK:
-                    if str(pages[-1]).strip():
-                        # If the current chunk is a break, and the previous was not a break...
-                        page_break()
-
-                else:
-                    # + 1 to include the first line that does not start with a newline.
-                    chunk_nl_count = chunk.count(self.line_break) + 1
-                    chunk_char_count = len(chunk)
-
-                    current_nl_count = pages[-1].count(self.line_break)
-
-                    current_char_count = len(pages[-1])
-
-                    char_quota = real_length - current_char_count
-
-                    if chunk_char_count > real_length:
-                        if self.force_truncation:
-                            # Add the parts to the existing chunk list in the current position.
-                            # They can be added on the next iteration. Additionally, we should
-                            # pop the current chunk to prevent adding it an infinite number
-                            # of times.
-                            reversed_parts = [*split_force(char_quota, chunk)]
-                            for part in reversed(reversed_parts):
-                                chunks.insert(0, part)
-
-                            # Next pass should fix this
-                            continue
-
-                        else:
-                            raise ValueError(
-                                "A chunk is too large to fit into the char limit of "
-                                f"{real_length} (not including prefix+suffix) "
-                                f"(chunk was {chunk_char_count} in size; "
-                                f'{chunk[:60] + "..."!r})'
-                            )
-
-                    if self.max_lines and chunk_nl_count > self.max_lines:
-                        # We can't solve this one.
-                        raise ValueError(
-                            "A chunk has too many lines to fit into the line limit of "
-                            f"{self.max_lines} (chunk was {chunk_nl_count} lines long; "
-                            f'{chunk[:60] + "..."!r})'
-                        )
-
-                    if current_char_count + chunk_char_count > real_length:
-                        page_break()
-
-                    if self.max_lines and current_nl_count + chunk_nl_count > self.max_lines:
-                        page_break()
-
-                    if not pages[-1] and chunk == self.line_break:
-                        continue
-                    else:
-                        pages[-1] += chunk
-
-        del chunks
-
-        actual_pages = []
-        for page in pages:
-            if not page.strip():
-                # Skip empty pages.
-                continue
-
-            # No point starting a page with blank lines.
-            if page.startswith(self.line_break) and should_truncate:
-                page = page[len(self.line_break) :]
-
-            actual_page = f"{self.prefix}\n{page}\n{self.suffix}"
-
-            ln = len(actual_page)
-            assert ln <= self.max_chars, f"Bad paginator logic! {ln} > {self.max_chars}"
-            actual_pages.append(actual_page)
-        del pages
-        return actual_pages
+        state = self._state
+        if state is None or state.consumed > len(self.chunks):
+            state = self._state = _PaginationState(self)
+        elif state.consumed == len(self.chunks) and state.pages is not None:
+            # Nothing has been added since last time.
+            return state.pages
+
+        # Feed any chunks that were added since we last got here.
+        chunks = self.chunks
+        try:
+            for i in range(state.consumed, len(chunks)):
+                state.feed(chunks[i])
+        except BaseException:
+            # Pages are half-built, so start over next time (and fail the same way).
+            self._state = None
+            raise
+        state.consumed = len(chunks)
+
+        state.pages = state.render()
+        return state.pages
 
     # Magic methods.
     def __len__(self):
@@ -517,6 +377,7 @@ you do not do this, it will not be taken into account.
     def __invert__(self):
         """Reverses the chunk ordering in-place."""
         self.chunks.reverse()
+        self._state = None
 
     def __reversed__(self):
         """Creates a reversed view of the chunks internally."""
@@ -546,3 +407,215 @@ you do not do this, it will not be taken into account.
             return self.pages
 
         return await loop.run_in_executor(executor, call)
+
+
+class _PaginationState:
+    """
+    The progress of a :class:`Paginator` through its chunks: the raw pages finished so
+    far, and the page currently being filled, kept as a list of parts along with its
+    running character and line counts so that nothing is ever rescanned.
+    """
+
+    __slots__ = (
+        "paginator",
+        "real_length",
+        "consumed",
+        "should_truncate",
+        "started",
+        "finished",
+        "current",
+        "current_chars",
+        "current_lines",
+        "current_has_text",
+        "rendered",
+        "rendered_count",
+        "rendered_truncate",
+        "pages",
+    )
+
+    def __init__(self, paginator: Paginator):
+        # Our max length is not actually the max length, as we may have a prefix
+        # and suffix, also. We need to get their lengths first and offset.
+
+        # Call me a bad programmer, but this -2 stops stuff erroring and I cannot
+        # be bothered right now to work out why.
+        self.real_length = paginator.max_chars - len(paginator.prefix) - len(paginator.suffix) - 2
+
+        if self.real_length <= 0:
+            raise ValueError("With prefixes, you cannot fit any characters onto this page size.")
+
+        self.paginator = paginator
+        #: Number of chunks fed in so far.
+        self.consumed = 0
+        self.should_truncate = paginator.performing_truncation
+        #: Whether the first page has been started yet.
+        self.started = False
+        #: Raw text of each page before the current one.
+        self.finished = []
+        self.current = []
+        self.current_chars = 0
+        self.current_lines = 0
+        self.current_has_text = False
+        #: The formatted pages out of the first ``rendered_count`` finished pages, as
+        #: formatted for the truncation mode in ``rendered_truncate``.
+        self.rendered = []
+        self.rendered_count = 0
+        self.rendered_truncate = None
+        #: The result of the last render, or None if there is none.
+        self.pages = None
+
+    def page_break(self):
+        """Start a new page."""
+        if self.started:
+            # Remove trailing whitespace
+            self.finished.append("".join(self.current).rstrip())
+        self.started = True
+        self.current = []
+        self.current_chars = 0
+        self.current_lines = 0
+        self.current_has_text = False
+
+    def split_force(self, initial_quota, string):
+        """
+        Splits a string forcefully on max length. This only really should
+        occur as a last resort. Initial quota is used to fill up any
+        previous space. Since we are splitting mid-word anyway, we may as
+        well compact it.
+
+        Returns an iterator.
+        """
+        assert initial_quota >= 0
+
+        if initial_quota:
+            yield string[:initial_quota]
+
+        for i in range(initial_quota, len(string), self.real_length):
+            yield string[i : i + self.real_length]
+
+    def feed(self, chunk):
+        """Paginates the next chunk from the paginator."""
+        paginator = self.paginator
+
+        if chunk is _LINE_BREAK:
+            chunk = paginator.line_break
+
+        if chunk not in SENTINELS:
+            # Execute substitutions here.
+            for substitution in [str, *paginator.substitutions]:
+                chunk = substitution(chunk)
+
+        if chunk in (_ENABLE_TRUNCATION, _DISABLE_TRUNCATION):
+            # Don't add these
+            self.should_truncate = chunk is _ENABLE_TRUNCATION
+            return
+
+        if not self.started:
+            self.page_break()
+
+        if chunk is _PAGE_BREAK:
+            if self.current_has_text:
+                # If the current chunk is a break, and the previous was not a break...
+                self.page_break()
+        elif self.should_truncate:
+            # Explode all non-critical parts based on the space characters we can escape.
+            for part in _explode_on_any(chunk):
+                self.add(part)
+        else:
+            # Keep the chunked parts as they already are.
+            self.add(chunk)
+
+    def add(self, chunk):
+        """Adds a string to the current page, starting new pages as needed."""
+        paginator = self.paginator
+        real_length = self.real_length
+        line_break = paginator.line_break
+        todo = collections.deque((chunk,))
+
+        while todo:
+            chunk = todo.popleft()
+
+            # + 1 to include the first line that does not start with a newline.
+            chunk_nl_count = chunk.count(line_break) + 1
+            chunk_char_count = len(chunk)
+
+            current_nl_count = self.current_lines
+            current_char_count = self.current_chars
+
+            char_quota = real_length - current_char_count
+
+            if chunk_char_count > real_length:
+                if paginator.force_truncation:
+                    # Add the parts to the front of the work queue in their current
+                    # position. They can be added on the next iterations.
+                    todo.extendleft(reversed([*self.split_force(char_quota, chunk)]))
+
+                    # Next pass should fix this
+                    continue
+
+                else:
+                    raise ValueError(
+                        "A chunk is too large to fit into the char limit of "
+                        f"{real_length} (not including prefix+suffix) "
+                        f"(chunk was {chunk_char_count} in size; "
+                        f'{chunk[:60] + "..."!r})'
+                    )
+
+            if paginator.max_lines and chunk_nl_count > paginator.max_lines:
+                # We can't solve this one.
+                raise ValueError(
+                    "A chunk has too many lines to fit into the line limit of "
+                    f"{paginator.max_lines} (chunk was {chunk_nl_count} lines long; "
+                    f'{chunk[:60] + "..."!r})'
+                )
+
+            if current_char_count + chunk_char_count > real_length:
+                self.page_break()
+
+            if paginator.max_lines and current_nl_count + chunk_nl_count > paginator.max_lines:
+                self.page_break()
+
+            if not self.current_chars and chunk == line_break:
+                continue
+
+            self.current.append(chunk)
+            self.current_chars += chunk_char_count
+            self.current_lines += chunk_nl_count - 1
+            self.current_has_text = self.current_has_text or bool(chunk.strip())
+
+    def format(self, page):
+        """Formats a raw page, or returns None if it is empty and should be skipped."""
+        paginator = self.paginator
+
+        if not page.strip():
+            return None
+
+        # No point starting a page with blank lines.
+        if page.startswith(paginator.line_break) and self.should_truncate:
+            page = page[len(paginator.line_break) :]
+
+        actual_page = f"{paginator.prefix}\n{page}\n{paginator.suffix}"
+
+        ln = len(actual_page)
+        assert ln <= paginator.max_chars, f"Bad paginator logic! {ln} > {paginator.max_chars}"
+        return actual_page
+
+    def render(self) -> List[str]:
+        """Formats the pages, reusing any formatted by a previous call where possible."""
+        if self.rendered_truncate is not self.should_truncate:
+            # The truncation mode at the end decides how every page is formatted.
+            self.rendered = []
+            self.rendered_count = 0
+            self.rendered_truncate = self.should_truncate
+
+        for page in self.finished[self.rendered_count :]:
+            page = self.format(page)
+            if page is not None:
+                self.rendered.append(page)
+        self.rendered_count = len(self.finished)
+
+        pages = list(self.rendered)
+        if self.started:
+            page = self.format("".join(self.current))
+            if page is not None:
+                pages.append(page)
+        return pages
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# MIT License
+#
+# Copyright (c) 2018-2019 Flitt3r (a.k.a Koyagami)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in a$
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Routes reaction and message deletion events to the navigators they concern.
+
+Rather than every running navigator listening to every reaction the bot can see
+and discarding those not on its own messages, a single router is registered per
+bot. It keeps a mapping of message IDs to the navigator that sent each message,
+so each event is delivered straight to the one navigator interested in it, if any.
+
+The router also holds a hashed timer wheel that navigators use for their idle
+timeouts, so that hundreds of idle navigators cost one periodic tick rather than
+hundreds of individual timers.
+"""
+
+__all__ = ("TimerWheel", "ReactionRouter")
+
+import asyncio
+import math
+import weakref
+from typing import Callable, Dict, Set
+
+from libneko import logging
+
+_logger = logging.get_logger("libneko.pag.reactionrouter")
+
+
+class _Timer:
+    """A callback scheduled on a :class:`TimerWheel`."""
+
+    __slots__ = ("wheel", "callback", "rounds", "slot")
+
+    def __init__(self, wheel: "TimerWheel", callback: Callable[[], None], rounds: int, slot: int):
+        self.wheel = wheel
+        self.callback = callback
+        # The number of times the wheel must pass this slot before we fire.
+        self.rounds = rounds
+        self.slot = slot
+
+    def cancel(self):
+        """Cancels the timer. Does nothing if it already fired or was cancelled."""
+        self.wheel._discard(self)
+
+
+class TimerWheel:
+    """
+    A hashed timer wheel. Scheduling and cancelling a timer takes constant time, and
+    however many timers there are, only one callback runs on the event loop per tick.
+
+    Timers fire on the first tick at or after they are due, so they may fire up to
+    one ``resolution`` late. The wheel only ticks while there are timers scheduled.
+
+    Args:
+        loop:
+            The event loop to run on.
+
+    Keyword Args:
+        resolution:
+            Seconds per tick. Defaults to 1.
+        slots:
+            Number of slots in the wheel. Timers further than this many ticks away go
+            round the wheel more than once. Defaults to 512.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, *, resolution: float = 1, slots: int = 512):
+        if resolution <= 0:
+            raise ValueError("Resolution must be positive.")
+        if slots <= 0:
+            raise ValueError("Slots must be positive.")
+
+        self.loop = loop
+        self.resolution = resolution
+        self._slots = [set() for _ in range(slots)]
+        self._cursor = 0
+        self._count = 0
+        self._next_tick_at = None
+        self._tick_handle = None
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> _Timer:
+        """
+        Calls the given function after the given number of seconds.
+
+        Returns:
+            The timer, which can be cancelled by calling its ``cancel`` method.
+        """
+        if self._tick_handle is None:
+            self._next_tick_at = self.loop.time() + self.resolution
+            self._tick_handle = self.loop.call_at(self._next_tick_at, self._tick)
+
+        # Ticks are counted from the next tick, which is up to one tick away.
+        remaining = delay - (self._next_tick_at - self.loop.time())
+        ticks = max(1, math.ceil(remaining / self.resolution) + 1)
+        n = len(self._slots)
+
+        timer = _Timer(self, callback, (ticks - 1) // n, (self._cursor + ticks) % n)
+        self._slots[timer.slot].add(timer)
+        self._count += 1
+        return timer
+
+    def _discard(self, timer: _Timer):
+        try:
+            self._slots[timer.slot].remove(timer)
+        except KeyError:
+            pass
+        else:
+            self._count -= 1
+
+    def _tick(self):
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        slot = self._slots[self._cursor]
+
+        due = [timer for timer in slot if not timer.rounds]
+        for timer in slot:
+            timer.rounds -= 1
+        slot.difference_update(due)
+        self._count -= len(due)
+
+        for timer in due:
+            try:
+                timer.callback()
+            except Exception:
+                _logger.exception("Timer callback %r raised", timer.callback)
+
+        if self._count:
+            self._next_tick_at += self.resolution
+            self._tick_handle = self.loop.call_at(self._next_tick_at, self._tick)
+        else:
+            self._tick_handle = None
+
+    def close(self):
+        """Cancels every timer and stops ticking."""
+        for slot in self._slots:
+            slot.clear()
+        self._count = 0
+        if self._tick_handle is not None:
+            self._tick_handle.cancel()
+            self._tick_handle = None
+
+
+class ReactionRouter:
+    """
+    Delivers ``on_reaction_add``, ``on_reaction_remove``, ``on_reaction_clear`` and
+    ``on_message_delete`` events to the navigator that owns the message, in constant
+    time regardless of how many navigators are running.
+
+    Use :meth:`for_bot` to get the router for a bot rather than making one directly.
+    Navigators register each message they send with :meth:`track`, and forget about
+    them all with :meth:`untrack_all` when they finish.
+
+    Attributes:
+        timers:
+            The :class:`TimerWheel` for navigator idle timeouts.
+    """
+
+    _routers = weakref.WeakKeyDictionary()
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.timers = TimerWheel(bot.loop)
+        self._navigators: Dict[int, object] = {}
+        self._messages: Dict[object, Set[int]] = {}
+
+        bot.add_listener(self.on_reaction_add, "on_reaction_add")
+        bot.add_listener(self.on_reaction_remove, "on_reaction_remove")
+        bot.add_listener(self.on_reaction_clear, "on_reaction_clear")
+        bot.add_listener(self.on_message_delete, "on_message_delete")
+
+    @classmethod
+    def for_bot(cls, bot) -> "ReactionRouter":
+        """Gets the router for the given bot, registering one on first use."""
+        try:
+            return cls._routers[bot]
+        except KeyError:
+            router = cls._routers[bot] = cls(bot)
+            return router
+
+    def __len__(self):
+        """The number of navigators with tracked messages."""
+        return len(self._messages)
+
+    def track(self, message_id: int, navigator) -> None:
+        """Routes events for the given message ID to the given navigator."""
+        self._navigators[message_id] = navigator
+        self._messages.setdefault(navigator, set()).add(message_id)
+
+    def untrack(self, message_id: int) -> None:
+        """Stops routing events for the given message ID."""
+        navigator = self._navigators.pop(message_id, None)
+        if navigator is not None:
+            ids = self._messages[navigator]
+            ids.discard(message_id)
+            if not ids:
+                del self._messages[navigator]
+
+    def untrack_all(self, navigator) -> None:
+        """Stops routing events for any message to the given navigator."""
+        for message_id in self._messages.pop(navigator, ()):
+            self._navigators.pop(message_id, None)
+
+    async def on_reaction_add(self, reaction, user):
+        """|coro|
+
+        Passes the reaction on to the navigator owning the message, if there is one.
+        """
+        navigator = self._navigators.get(reaction.message.id)
+        if navigator is not None:
+            # noinspection PyProtectedMember
+            await navigator._on_reaction_add(reaction, user)
+
+    async def on_reaction_remove(self, reaction, user):
+        """|coro|
+
+        Passes the reaction removal on to the navigator owning the message, if there is one.
+        """
+        navigator = self._navigators.get(reaction.message.id)
+        if navigator is not None:
+            # noinspection PyProtectedMember
+            await navigator._on_reaction_remove(reaction, user)
+
+    async def on_reaction_clear(self, message, reactions):
+        """|coro|
+
+        Tells the navigator owning the message, if there is one, that its reactions were
+        cleared.
+        """
+        navigator = self._navigators.get(message.id)
+        if navigator is not None:
+            # noinspection PyProtectedMember
+            await navigator._on_reaction_clear(message, reactions)
+
+    async def on_message_delete(self, message):
+        """|coro|
+
+        Informs the navigator owning the message, if there is one, that it was deleted.
+        """
+        navigator = self._navigators.get(message.id)
+        if navigator is not None:
+            self.untrack(message.id)
+            # noinspection PyProtectedMember
+            await navigator._on_message_delete(message)
@@ -0,0 +1,464 @@
+import os
+import pickle
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from lru import LRU
+
+from libneko.metrics import CacheMetrics
+from .journal import Journal
+
+###############################################################
+#                           Database                          #
+###############################################################
+
+# Alternative to the Journal backend: Macros, Events and variables stored in a single SQLite database.
+# Values are still pickled, but each lives in its own row next to a few indexed columns (name, author, channel),
+# so we only ever load what we need, and can query by those columns without unpickling everything.
+
+# Which backend Macros, Events and variables are persisted with: 'sqlite' or 'journal'.
+# Only the sqlite backend loads values lazily, the journal keeps everything in memory.
+BACKEND = 'sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS macros (
+    kind TEXT NOT NULL, name TEXT NOT NULL, author_id INTEGER, visible INTEGER NOT NULL, description TEXT, data BLOB NOT NULL,
+    PRIMARY KEY (kind, name)
+);
+CREATE INDEX IF NOT EXISTS macros_by_author ON macros (kind, author_id);
+CREATE INDEX IF NOT EXISTS macros_by_visible ON macros (kind, visible, name);
+
+CREATE TABLE IF NOT EXISTS events (
+    kind TEXT NOT NULL, name TEXT NOT NULL, data BLOB NOT NULL,
+    PRIMARY KEY (kind, name)
+);
+CREATE TABLE IF NOT EXISTS event_channels (
+    kind TEXT NOT NULL, name TEXT NOT NULL, channel_id INTEGER NOT NULL,
+    PRIMARY KEY (kind, name, channel_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS event_channels_by_channel ON event_channels (channel_id);
+
+CREATE TABLE IF NOT EXISTS variables (
+    kind TEXT NOT NULL, name TEXT NOT NULL, data BLOB NOT NULL, set_at REAL,
+    PRIMARY KEY (kind, name)
+);
+
+CREATE TABLE IF NOT EXISTS migrations (source TEXT PRIMARY KEY);
+'''
+
+class Database:
+    '''
+    A single SQLite connection, which is only ever touched by its own dedicated thread.
+    Reads can either block on that thread (call) or be awaited (run), writes are queued up without waiting (submit).
+    Since the thread handles everything in order, reads always see the writes submitted before them.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipes-db')
+        self.call(self.connect)
+
+    def connect(self):
+        self.connection = sqlite3.connect(self.path)
+        # Write-ahead logging: readers don't block the writer and commits are a single sequential append.
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        # Columns added since the table was first created; their values are filled in by the table classes on load.
+        columns = [ row[1] for row in self.connection.execute('PRAGMA table_info(macros)') ]
+        if 'description' not in columns:
+            self.connection.execute('ALTER TABLE macros ADD COLUMN description TEXT')
+        columns = [ row[1] for row in self.connection.execute('PRAGMA table_info(variables)') ]
+        if 'set_at' not in columns:
+            self.connection.execute('ALTER TABLE variables ADD COLUMN set_at REAL')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS variables_by_time ON variables (set_at)')
+
+    def call(self, func, *args):
+        '''Run func(*args) on the database thread and wait for the result.'''
+        return self.executor.submit(func, *args).result()
+
+    async def run(self, func, *args):
+        '''Run func(*args) on the database thread without blocking the event loop.'''
+        return await asyncio.get_event_loop().run_in_executor(self.executor, func, *args)
+
+    def submit(self, func, *args):
+        '''Queue func(*args) up on the database thread, without waiting for it.'''
+        self.executor.submit(func, *args).add_done_callback(self.report)
+
+    def report(self, future):
+        if future.exception() is not None:
+            print('Database error in "{}": {}: {}'.format(self.path, future.exception().__class__.__name__, future.exception()))
+
+    def query(self, sql, params=()):
+        '''Run a query on the database thread, returns all resulting rows.'''
+        return self.call(self._query, sql, params)
+
+    async def query_async(self, sql, params=()):
+        return await self.run(self._query, sql, params)
+
+    def _query(self, sql, params):
+        return self.connection.execute(sql, params).fetchall()
+
+    def execute(self, *statements):
+        '''Queue up one or more (sql, params) statements to be executed in a single transaction.'''
+        self.submit(self._execute, statements)
+
+    def _execute(self, statements):
+        with self.connection:
+            for sql, params in statements:
+                self.connection.execute(sql, params)
+
+    def close(self):
+        self.call(self.connection.close)
+        self.executor.shutdown()
+
+# The filename of the database, in the same directory as the pickles it replaces.
+FILENAME = 'pipes.db'
+def DIR(filename=''):
+    return os.path.join(os.path.dirname(__file__), 'macros', filename)
+
+_databases = {}
+
+def connect(path):
+    '''Get the Database for the given path, opening it if it isn't already.'''
+    if path not in _databases:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _databases[path] = Database(path)
+    return _databases[path]
+
+
+###############################################################
+#                            Tables                           #
+###############################################################
+
+class Table(MutableMapping):
+    '''
+    Dict-like view of the rows of one kind (e.g. 'pipe' or 'source' macros) in one of the database's tables.
+    Only the names are loaded up front; values are unpickled on demand and kept in a bounded working set,
+    so that modifying a value in place and calling save() works like it does for a dict.
+
+    The working set consists of:
+      • An LRU cache of up to cache_size values, cold values are evicted from it.
+      • Up to pin_size pinned values: values that were recently used pin_hits times are pinned, and only leave once they're
+        the least recently used pinned value and another value gets pinned, or they're unpinned.
+    '''
+    table = None
+    # Additional indexed columns, and a function extracting them from a value.
+    columns = ()
+    def extract(self, value): return ()
+
+    def __init__(self, db, kind='', cache_size=200, pin_size=50, pin_hits=5, legacy_path=None, convert=None):
+        self.db = db
+        self.kind = kind
+        # The pickle/Journal to migrate from on load, and an optional function to convert each legacy value.
+        self.legacy_path = legacy_path
+        self.convert = convert
+        # The set of all names, so we can answer "in" and len() without hitting the database.
+        self.index = set()
+        self.cache = LRU(cache_size)
+        # How often each recently used name was used, itself an LRU so it stays bounded too.
+        self.hits = LRU(4 * cache_size)
+        # Pinned values, least recently used first.
+        self.pinned = OrderedDict()
+        self.pin_size = pin_size
+        self.pin_hits = pin_hits
+        self.metrics = CacheMetrics('{} {}'.format(kind, self.table).strip())
+        columns = ('kind', 'name', *self.columns, 'data')
+        self.upsert_sql = 'INSERT OR REPLACE INTO {} ({}) VALUES ({})'.format(self.table, ', '.join(columns), ', '.join('?' * len(columns)))
+
+    def migrate(self, path, convert=None):
+        '''Copy everything from the pickle/Journal at the given path into the table, if that hasn't been done before.'''
+        source = '{}:{}'.format(self.table, os.path.basename(path))
+        if self.db.query('SELECT 1 FROM migrations WHERE source=?', (source,)): return 0
+        journal = Journal(path)
+        data = {}
+        if os.path.exists(path) or journal.journal_generations():
+            data = journal.load()
+            journal.close()
+        if convert is not None:
+            data = {key: convert(data[key]) for key in data}
+        statements = [ stmt for key in data for stmt in self.write_statements(key, data[key]) ]
+        statements.append(('INSERT INTO migrations (source) VALUES (?)', (source,)))
+        self.db.call(self.db._execute, statements)
+        return len(data)
+
+    def write_statements(self, key, value):
+        '''The (sql, params) statements for writing a value.'''
+        return [(self.upsert_sql, (self.kind, key, *self.extract(value), pickle.dumps(value)))]
+
+    def delete_statements(self, key):
+        return [('DELETE FROM {} WHERE kind=? AND name=?'.format(self.table), (self.kind, key))]
+
+    def load(self):
+        if self.legacy_path is not None:
+            count = self.migrate(self.legacy_path, self.convert)
+            if count: print('{} items migrated from "{}" to "{}"!'.format(count, self.legacy_path, self.db.path))
+        self.index = set(row[0] for row in self.db.query('SELECT name FROM {} WHERE kind=?'.format(self.table), (self.kind,)))
+        return self
+
+    def reset(self):
+        # Unlike a broken pickle, a failed migration doesn't mean our own data is bad, so leave it be.
+        self.forget()
+        self.index = set(row[0] for row in self.db.query('SELECT name FROM {} WHERE kind=?'.format(self.table), (self.kind,)))
+        return self
+
+    def forget(self, key=None):
+        '''Drop the given value (or all values) from the working set.'''
+        if key is None:
+            self.pinned.clear(); self.cache.clear(); self.hits.clear()
+            return
+        self.pinned.pop(key, None)
+        if key in self.hits: del self.hits[key]
+        if key in self.cache: del self.cache[key]
+
+    def unpin(self, key):
+        '''Move a pinned value back into the cache, from where it can be evicted like any other.'''
+        if key not in self.pinned: return
+        self.cache[key] = self.pinned.pop(key)
+        self.hits[key] = 0
+
+    def working(self, key):
+        '''The value if it's in the working set, counting it as used; otherwise None.'''
+        if key in self.pinned:
+            self.pinned.move_to_end(key)
+            return self.pinned[key]
+        if key in self.cache:
+            return self.used(key, self.cache[key])
+        return None
+
+    def __getitem__(self, key):
+        if key not in self.index: raise KeyError(key)
+        value = self.working(key)
+        if value is not None:
+            self.metrics.hit()
+            return value
+
+        # Blocks until the database thread gets to it: use fetch() instead from the event loop.
+        self.metrics.miss()
+        rows = self.db.query('SELECT data FROM {} WHERE kind=? AND name=?'.format(self.table), (self.kind, key))
+        return self.used(key, self.unpickle(key, rows))
+
+    async def fetch(self, key):
+        '''Same as self[key], except that loading a value from the database doesn't block the event loop.'''
+        if key not in self.index: raise KeyError(key)
+        value = self.working(key)
+        if value is not None:
+            self.metrics.hit()
+            return value
+
+        self.metrics.miss()
+        rows = await self.db.query_async('SELECT data FROM {} WHERE kind=? AND name=?'.format(self.table), (self.kind, key))
+        # It may have been loaded, changed or deleted while we were waiting, in which case the rows are out of date.
+        if key not in self.index: raise KeyError(key)
+        value = self.working(key)
+        if value is not None: return value
+        return self.used(key, self.unpickle(key, rows))
+
+    async def peek(self, key):
+        '''
+        Get a value without counting it as a use, and without adding it to the working set if it has to be loaded,
+        for looking through many values once without pushing out the ones that are actually used.
+        '''
+        if key not in self.index: raise KeyError(key)
+        if key in self.pinned: return self.pinned[key]
+        if key in self.cache: return self.cache[key]
+        rows = await self.db.query_async('SELECT data FROM {} WHERE kind=? AND name=?'.format(self.table), (self.kind, key))
+        if not rows: raise KeyError(key)
+        # Prefer whatever was loaded or stored while we were waiting.
+        return self.loaded(key, rows[0][0])
+
+    def unpickle(self, key, rows):
+        '''Load a value from its row into the cache.'''
+        if not rows: raise KeyError(key)
+        value = self.cache[key] = pickle.loads(rows[0][0])
+        return value
+
+    def used(self, key, value):
+        '''Count a use of a cached value, pinning it if it's been used often enough.'''
+        hits = self.hits[key] = self.hits.get(key, 0) + 1
+        if hits >= self.pin_hits and self.pin_size:
+            del self.cache[key]
+            self.pinned[key] = value
+            # Make room by demoting the pinned value that's gone unused the longest.
+            if len(self.pinned) > self.pin_size:
+                self.unpin(next(iter(self.pinned)))
+        return value
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __setitem__(self, key, value):
+        if key in self.pinned: self.pinned[key] = value
+        else: self.cache[key] = value
+        self.index.add(key)
+        self.db.execute(*self.write_statements(key, value))
+
+    def __delitem__(self, key):
+        if key not in self.index: raise KeyError(key)
+        self.index.remove(key)
+        self.forget(key)
+        self.db.execute(*self.delete_statements(key))
+
+    def save(self, key, value=None):
+        '''
+        Write the current state of a value that was modified in place.
+        Pass the value itself if it came from values() or in_channel(), which return fresh copies of values that aren't loaded.
+        '''
+        if value is None:
+            value = self[key]
+        # Keep the modified value, so it's what the next lookup returns rather than the old one from the database.
+        elif key in self.pinned: self.pinned[key] = value
+        else: self.cache[key] = value
+        self.db.execute(*self.write_statements(key, value))
+
+    def write(self):
+        '''Every change is written as it happens, nothing to do here.'''
+        pass
+
+    def names(self, where='', params=()):
+        '''The names of all values matching the given condition on the indexed columns, in order.'''
+        sql = 'SELECT name FROM {} WHERE kind=?{} ORDER BY name'.format(self.table, ' AND ' + where if where else '')
+        return [ row[0] for row in self.db.query(sql, (self.kind, *params)) ]
+
+    def loaded(self, name, data):
+        # Use loaded values where possible, so in-place modifications stick; don't cache the rest to keep memory bounded.
+        if name in self.pinned: return self.pinned[name]
+        if name in self.cache: return self.cache[name]
+        return pickle.loads(data)
+
+    def rows_to_values(self, rows):
+        return [ self.loaded(name, data) for name, data in rows ]
+
+    def values(self):
+        return self.rows_to_values(self.db.query('SELECT name, data FROM {} WHERE kind=? ORDER BY name'.format(self.table), (self.kind,)))
+
+    def __iter__(self):
+        return iter(sorted(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+
+class MacroTable(Table):
+    table = 'macros'
+    columns = ('author_id', 'visible', 'description')
+    def extract(self, macro): return (macro.authorId, int(macro.visible), macro.desc)
+
+    def load(self):
+        super().load()
+        self.fill_descriptions()
+        return self
+
+    def fill_descriptions(self):
+        '''Fill in the description column of a table created before it existed, once.'''
+        source = '{}:description:{}'.format(self.table, self.kind)
+        if self.db.query('SELECT 1 FROM migrations WHERE source=?', (source,)): return
+        rows = self.db.query('SELECT name, data FROM {} WHERE kind=?'.format(self.table), (self.kind,))
+        statements = [ ('UPDATE {} SET description=? WHERE kind=? AND name=?'.format(self.table), (pickle.loads(data).desc, self.kind, name)) for name, data in rows ]
+        statements.append(('INSERT INTO migrations (source) VALUES (?)', (source,)))
+        self.db.call(self.db._execute, statements)
+
+    async def descriptions(self):
+        '''Maps the name of every macro to its description, without loading any of them.'''
+        return dict(await self.db.query_async('SELECT name, description FROM {} WHERE kind=?'.format(self.table), (self.kind,)))
+
+    def visible(self, visible=True):
+        return self.names('visible=?', (int(visible),))
+
+    def by_author(self, author_id):
+        return self.names('author_id=?', (author_id,))
+
+
+class EventTable(Table):
+    '''
+    Since every message looks up the events enabled in its channel, the names of those are kept in memory per channel,
+    and the events themselves are kept in the working set like any other value.
+    '''
+    table = 'events'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Channel ID -> names of the events enabled in it.
+        self.channels = {}
+
+    def load(self):
+        super().load()
+        self.load_channels()
+        return self
+
+    def reset(self):
+        super().reset()
+        self.load_channels()
+        return self
+
+    def load_channels(self):
+        self.channels = {}
+        for name, channel in self.db.query('SELECT name, channel_id FROM event_channels WHERE kind=?', (self.kind,)):
+            self.channels.setdefault(channel, set()).add(name)
+
+    def index_channels(self, key, event=None):
+        '''Update which channels the given event is listed under, or unlist it if it's None.'''
+        for channel in [ c for c, names in self.channels.items() if key in names ]:
+            self.channels[channel].discard(key)
+            if not self.channels[channel]: del self.channels[channel]
+        if event is not None:
+            for channel in event.channels:
+                self.channels.setdefault(channel, set()).add(key)
+
+    def __setitem__(self, key, event):
+        super().__setitem__(key, event)
+        self.index_channels(key, event)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.index_channels(key)
+
+    def save(self, key, event=None):
+        super().save(key, event)
+        self.index_channels(key, self[key] if event is None else event)
+
+    def write_statements(self, key, event):
+        return [
+            *super().write_statements(key, event),
+            ('DELETE FROM event_channels WHERE kind=? AND name=?', (self.kind, key)),
+            *(('INSERT INTO event_channels (kind, name, channel_id) VALUES (?, ?, ?)', (self.kind, key, channel)) for channel in set(event.channels)),
+        ]
+
+    def delete_statements(self, key):
+        return [ *super().delete_statements(key), ('DELETE FROM event_channels WHERE kind=? AND name=?', (self.kind, key)) ]
+
+    async def in_channel(self, channel_id):
+        '''All events enabled in the given channel, in order of name.'''
+        names = sorted(self.channels.get(channel_id, ()))
+        if not names: return []
+
+        events = {}; cold = []
+        for name in names:
+            event = self.working(name)
+            if event is not None:
+                events[name] = event
+                self.metrics.hit()
+            else:
+                cold.append(name)
+                self.metrics.miss()
+
+        if cold:
+            # Load all of the missing ones in one go.
+            rows = await self.db.query_async(
+                'SELECT name, data FROM {} WHERE kind=? AND name IN ({})'.format(self.table, ', '.join('?' * len(cold))), (self.kind, *cold))
+            for name, data in rows:
+                # Use whatever was loaded or stored in the meantime, so it's the same object everywhere.
+                event = self.working(name)
+                if event is not None: events[name] = event
+                elif name in self.index: events[name] = self.cache[name] = pickle.loads(data)
+        return [ events[name] for name in names if name in events ]
+
+
+def open_store(table_class, DIR, filename, kind='', convert=None, **options):
+    '''The store for the given pickle file in the configured BACKEND: either a Journal or a Table that migrates from it.'''
+    if BACKEND == 'sqlite':
+        return table_class(connect(DIR(FILENAME)), kind, legacy_path=DIR(filename), convert=convert, **options)
+    return Journal(DIR(filename))
@@ -1,8 +1,8 @@
 import re
 import os
-import pickle
 from discord import Embed
 from utils.texttools import block_format
+from . import database
 
 # Save events to the same directory as macros... because they're essentially macros.
 def DIR(filename=''):
@@ -66,13 +66,17 @@ class Events:
         self.events = {}
         self.DIR = DIR
         self.filename = filename
+        if not os.path.exists(DIR()): os.mkdir(DIR())
+        self.store = database.open_store(database.EventTable, DIR, filename)
+        # Whether self.events is a database.EventTable, which can look up events by channel
+        self.table = database.BACKEND == 'sqlite'
         try:
-            if not os.path.exists(DIR()): os.mkdir(DIR())
-            self.events = pickle.load(open(DIR(filename), 'rb+'))
+            self.events = self.store.load()
             print('{} events loaded from "{}"!'.format(len(self.events), filename))
         except Exception as e:
             print(e)
             print('Failed to load events from "{}"!'.format(DIR(filename)))
+            self.events = self.store.reset()
 
     command_pattern = re.compile(r'\s*(NEW|EDIT) EVENT (\w[\w.]+) ON MESSAGE (.*?)\s*::\s*(.*)'.replace(' ', '\s+'), re.I | re.S )
     #                                ^^^^^^^^         ^^^^^^^^              ^^^          ^^
@@ -96,9 +100,9 @@ class Events:
         try:
             if mode == 'EDIT':
                 self.events[name].update(script, pattern)
+                self.save(name)
             else:
-                self.events[name] = OnMessage(name, channel, script, pattern)
-            self.write()
+                self[name] = OnMessage(name, channel, script, pattern)
 
         except Exception as e:
             await channel.send('Failed to {} event:\n\t{}: {}'.format( 'register' if mode=='NEW' else 'update', e.__class__.__name__, e))
@@ -109,8 +113,17 @@ class Events:
             return True
 
     def write(self):
-        '''Write the list of events to a pickle file.'''
-        pickle.dump(self.events, open(self.DIR(self.filename), 'wb+'))
+        '''Write the entire list of events to a new snapshot.'''
+        self.store.write()
+
+    def save(self, name, event=None):
+        '''Save the changes made to a single event.'''
+        self.store.save(name, event)
+
+    async def in_channel(self, channel_id):
+        '''All events enabled in the given channel.'''
+        if self.table: return await self.events.in_channel(channel_id)
+        return [e for e in self.events.values() if channel_id in e.channels]
 
     def __contains__(self, name):
         return name in self.events
@@ -125,13 +138,11 @@ class Events:
         return self.events[name]
 
     def __setitem__(self, name, val):
-        self.events[name] = val
-        self.write()
+        self.store[name] = val
         return val
 
     def __delitem__(self, name):
-        del self.events[name]
-        self.write()
+        del self.store[name]
 
     def __bool__(self):
         return len(self.events) > 0
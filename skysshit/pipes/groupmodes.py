@@ -185,6 +185,43 @@ import math
 class GroupModeError(ValueError):
     pass
 
+class GroupView:
+    '''
+    A lightweight view on a group of values: A range of indices into the shared list of values.
+    The group only becomes an actual list of values once a pipe needs it, so grouping costs next to nothing.
+    Indices at or past `end` (padding, or values thrown away by strictness) read as empty strings.
+    '''
+    __slots__ = ('values', 'indices', 'end')
+
+    def __init__(self, values, indices, end=None):
+        self.values = values
+        self.indices = indices
+        self.end = len(values) if end is None else min(end, len(values))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        i = self.indices[i]
+        return self.values[i] if i < self.end else ''
+
+    def __iter__(self):
+        values, end = self.values, self.end
+        return (values[i] if i < end else '' for i in self.indices)
+
+    def materialize(self):
+        '''Turn the view into a list of values, reusing the list of values itself if the view covers all of it.'''
+        r = self.indices
+        if r.start == 0 and r.step == 1 and r.stop == self.end == len(self.values):
+            return self.values
+        if not r or r[-1] < self.end:
+            return self.values[r.start: r.stop: r.step]
+        return list(self)
+
+def materialize(vals):
+    '''Turn a group as produced by a group mode into a list of values.'''
+    return vals.materialize() if type(vals) is GroupView else vals
+
 class GroupMode:
     def __init__(self, multiply, strictness):
         self.multiply = multiply
@@ -224,10 +261,8 @@ class Row(GroupMode):
             ## Strict: Throw away the last group
             elif self.strictness == 1:
                 length = count*size
-                values = values[:length]
             ## Padding: The last group is padded out with (size-rest) empty strings.
             elif self.padding:
-                values += [''] * (size - rest)
                 count += 1
                 length = count*size
                 rest = 0
@@ -248,7 +283,7 @@ class Row(GroupMode):
 
         ## Slice our input into groups of the desired size, and assign them to successive pipes.
         for i in range(0, length, size):
-            vals = values[i: i+size]
+            vals = GroupView(values, range(i, min(i+size, length)))
             if self.multiply:
                 for pipe in pipes: out.append((vals, pipe))
             else:
@@ -279,11 +314,9 @@ class Divide(GroupMode):
             ## Strict: Throw away the tail end to make the length fit
             elif self.strictness == 1:
                 length = size*count
-                values = values[:length]
                 rest = 0
             ## Padding: The last group is padded out.
             elif self.padding:
-                values += [''] * (count - rest)
                 size += 1
                 length = size*count
                 rest = 0
@@ -310,7 +343,7 @@ class Divide(GroupMode):
             # The min(rest, i) and min(rest, i+1) ensure that the first (rest) slices get 1 extra value.
             left =    i   * size + min(rest, i)
             right = (i+1) * size + min(rest, i+1)
-            vals = values[left:right]
+            vals = GroupView(values, range(left, right))
 
             if self.multiply:
                 for pipe in pipes: out.append((vals, pipe))
@@ -333,6 +366,7 @@ class Modulo(GroupMode):
         count = self.modulo     # The number of groups we want to split it into (GIVEN)
         size = length //count   # The minimal size of each group
         rest = length % count   # The number of leftover items if we were to split into groups of minimal size
+        end = length            # The number of actual values, the rest is padding
 
         ## Deal with the fact that we can't split the values into equal sizes.
         if rest:
@@ -342,11 +376,10 @@ class Modulo(GroupMode):
             ## Strict: Throw away the tail end to make the length fit
             elif self.strictness == 1:
                 length = size*count
-                values = values[:length]
                 rest = 0
             ## Padding: The last (count-rest) groups are padded out with one empty string.
             if self.padding:
-                values += [''] * (count - rest)
+                end = length
                 size += 1
                 length = size*count
                 rest = 0
@@ -363,7 +396,7 @@ class Modulo(GroupMode):
         out = []
         for i in range(0, count):
             ## Slice into groups of items whose indices are x+i where x is a multiple of (count)
-            vals = [values[x+i] for x in range(0, length, count) if x+i < length]
+            vals = GroupView(values, range(i, length, count), end)
 
             if self.multiply:
                 for pipe in pipes: out.append((vals, pipe))
@@ -386,6 +419,7 @@ class Column(GroupMode):
         size = self.size        # The size of each group (GIVEN)
         count= length //size    # The minimal number of groups we have to split it into
         rest = length % size    # The number of leftover items if we were to split into the minimal number of groups
+        end = length            # The number of actual values, the rest is padding
 
         ## Deal with the fact that we can't split the values into equal sizes.
         if rest:
@@ -395,11 +429,10 @@ class Column(GroupMode):
             ## Strict: Throw away the tail end to make the length fit
             elif self.strictness == 1:
                 length = size*count
-                values = values[:length]
                 rest = 0
             ## Padding: Pad out the tail so the last (size-rest) groups contain one empty string.
             if self.padding:
-                values += [''] * (size - rest)
+                end = length
                 count += 1
                 length = size*count
                 rest = 0
@@ -416,7 +449,7 @@ class Column(GroupMode):
         out = []
         for i in range(0, count):
             ## Slice into groups of items whose indices are x+i where x is a multiple of (count)
-            vals = [values[x+i] for x in range(0, length, count) if x+i < length]
+            vals = GroupView(values, range(i, length, count), end)
 
             if self.multiply:
                 for pipe in pipes: out.append((vals, pipe))
@@ -471,19 +504,24 @@ class Interval(GroupMode):
         ## Special case: If we're targeting a negative range, simply target the empty range [lval:lval]
         if rval < lval: rval = lval
 
+        ## Clip the indices to the values that are actually there (the strictness check below uses the unclipped ones)
+        start = min(lval, length)
+        stop = min(rval, length)
+        vals = GroupView(values, range(start, stop))
+
         if not self.multiply:
             # TODO: emit a warning about the possible other pipes we're throwing away here
-            pairs = ( (values[lval: rval], pipes[0]), )
+            pairs = ( (vals, pipes[0]), )
         else:
             ## Multiply: Apply our chosen interval to each of the given pipes
-            pairs = ( (values[lval: rval], pipe) for pipe in pipes )
+            pairs = ( (vals, pipe) for pipe in pipes )
 
         ## Non-strict: Apply NOP to the values outside of the selected range.
         if not self.strictness:
             return [
-                (values[0: lval], NOP),
+                (GroupView(values, range(0, start)), NOP),
                 *pairs,
-                (values[rval: length], NOP),
+                (GroupView(values, range(stop, length)), NOP),
             ]
         else:
             ## Very strict: Get angry when our range does not exactly cover the list of values?
@@ -545,8 +583,88 @@ class Conditional(GroupMode):
 
     def __init__(self, multiply, strictness, conditions):
         super().__init__(multiply, strictness)
-        # TODO: Parse these more smartly ahead of time
         self.conditions = [self.Condition(c.strip()) for c in conditions.split('|')]
+        self.compile()
+
+    # Regexes that use backreferences can't be safely merged with other regexes, since merging changes their group numbers
+    backref = re.compile(r'\\\d|\(\?P=')
+    # Neither can regexes with global inline flags like (?i): Older Pythons only warn about those not being at the start,
+    # and then apply them to the entire merged pattern, i.e. to every other case as well.
+    inline_flags = re.compile(r'\(\?[aiLmsux]+\)')
+
+    def compile(self):
+        '''
+        Compile the conditions into a decision structure, so each group doesn't have to check every condition one by one:
+        Literal equality cases on the same index become a single dict lookup, and regex cases on the same index are
+        merged into one pattern with a named group per case, which tells us all the cases that match in a single pass.
+        Everything else is checked one by one.
+        '''
+        self.literals = {}  # index → {literal: [case numbers]}
+        regexes = {}        # index → [(case number, condition)]
+        self.others = []    # [(case number, condition)]
+
+        for n, condition in enumerate(self.conditions):
+            if condition.type == 2 and not condition.inverse:
+                self.literals.setdefault(condition.left, {}).setdefault(condition.right, []).append(n)
+            elif condition.type == 3 and not condition.inverse and not re.search(self.backref, condition.re_str) \
+                    and not re.search(self.inline_flags, condition.re_str):
+                regexes.setdefault(condition.left, []).append((n, condition))
+            else:
+                self.others.append((n, condition))
+
+        self.patterns = []  # [(index, pattern, [case numbers])]
+        for index, cases in regexes.items():
+            if len(cases) == 1:
+                self.others.extend(cases)
+                continue
+            # Each case becomes an optional lookahead that searches for its regex from the start of the string,
+            # and captures a named group if it succeeds.
+            pattern = ''.join('(?:(?=(?P<c{}>(?s:.*?)(?:{})))|)'.format(n, c.re_str) for n, c in cases)
+            try:
+                self.patterns.append( (index, re.compile(pattern), [n for n, _ in cases]) )
+            except re.error:
+                # The regexes don't play nice together (e.g. one has named groups): Check them one by one.
+                self.others.extend(cases)
+
+        self.others.sort(key=lambda x: x[0])
+
+    def matching_cases(self, values, first):
+        '''Returns the (sorted) numbers of the cases whose conditions succeed, or only the first one if `first` is True.'''
+        matched = []
+        failed = [] # Cases whose condition refers to an index that is out of range
+
+        for index, table in self.literals.items():
+            try:
+                matched.extend(table.get(values[index], ()))
+            except IndexError:
+                failed.extend(n for cases in table.values() for n in cases)
+
+        for index, pattern, cases in self.patterns:
+            try:
+                match = re.match(pattern, values[index])
+            except IndexError:
+                failed.extend(cases)
+                continue
+            matched.extend(n for n in cases if match.group('c%d' % n) is not None)
+
+        best = min(matched, default=None)
+        for n, condition in self.others:
+            # No need to check any cases that come after one we already know succeeds
+            if first and best is not None and n > best: break
+            try:
+                if condition.check(values):
+                    matched.append(n)
+                    if best is None or n < best: best = n
+            except GroupModeError:
+                failed.append(n)
+
+        ## Only complain about an index out of range if we'd have gotten to checking that condition
+        if failed and (not first or best is None or min(failed) < best):
+            raise GroupModeError('Index out of range in condition ({})'.format(self.conditions[min(failed)]))
+
+        if first: return [best] if best is not None else []
+        matched.sort()
+        return matched
 
     def __str__(self):
         return '{} CONDITIONAL {{ {} }}'.format(super().__str__(), ' | '.join(str(c) for c in self.conditions))
@@ -570,8 +688,8 @@ class Conditional(GroupMode):
         # c is the number of conditions, p is the number of pipes to sort it in (either c or c+1)
 
         if not self.multiply:
-            for condition, pipe in zip(self.conditions, pipes):
-                if condition.check(values): return [(values, pipe)]
+            cases = self.matching_cases(values, True)
+            if cases: return [(values, pipes[cases[0]])]
             if overflow_pipe_given:
                 return [(values, pipes[-1])]
             elif not self.strictness:
@@ -585,7 +703,7 @@ class Conditional(GroupMode):
                 raise GroupModeError('Very strict condition error: Default case was reached!')
 
         else: ## Multiply
-            pairs = [ (values, pipe) for (condition, pipe) in zip(self.conditions, pipes) if condition.check(values) ]
+            pairs = [ (values, pipes[n]) for n in self.matching_cases(values, False) ]
             if overflow_pipe_given: pairs.append( (values, pipes[-1]) )
             return pairs
 
@@ -707,4 +825,14 @@ if __name__ == '__main__':
     print( mode )
     print( mode.apply( ['bar', 'xyz'] , ['one', 'two'] ) )
     print( mode.apply( ['bar', 'bar'] , ['one', 'two'] ) )
-    print( mode.apply( ['bar', 'xyz'] , ['one'] ) )
\ No newline at end of file
+    print( mode.apply( ['bar', 'xyz'] , ['one'] ) )
+    ### Benchmark: Grouping a large flow into views, versus materializing every group like the group modes used to.
+    import timeit
+    print()
+    print('BENCHMARK (10000 values, 20 runs):')
+    values = [str(i) for i in range(10000)]
+    for flag in ['/1', '(1)', '(10)', '*(10)', '/100', '%100', '\\100', '#10..-10']:
+        _, mode = parse(flag, lambda x:x)
+        views = timeit.timeit(lambda: mode.apply(values, ['one', 'two']), number=20)
+        lists = timeit.timeit(lambda: [materialize(vals) for vals, _ in mode.apply(values, ['one', 'two'])], number=20)
+        print('{:>10}: views {:.2f}ms, lists {:.2f}ms'.format(flag, views*1000, lists*1000))
@@ -0,0 +1,221 @@
+import os
+import glob
+import pickle
+import asyncio
+import time
+
+###############################################################
+#                           Journal                           #
+###############################################################
+
+# Persisting a dict by re-pickling the entire thing on every change gets slow as it grows, and corrupts it if we crash mid-write.
+# Instead, a Journal keeps two kinds of files:
+#   • The snapshot (e.g. "pipe_macros.p"), a pickle of the entire dict as it was at some point, tagged with a generation number.
+#   • Journals (e.g. "pipe_macros.p.3.journal"), append-only logs of upserts and deletes made since the snapshot of generation 3.
+# Changes are only ever appended to the newest journal, so each write costs O(record) instead of O(store).
+# Once a journal grows as big as the dict itself, it's compacted: A new journal is started, and a new snapshot is written to a
+# temporary file in the background, which atomically replaces the old snapshot once it's complete.
+# On startup, we load the snapshot and replay every journal of the same or a newer generation on top of it.
+# A record that was only half written when we crashed is cut off the end of its journal.
+
+class Journal:
+    '''Dict-like persistent store for picklable values, backed by a snapshot and an append-only journal of changes.'''
+    def __init__(self, path, fsync_interval=1, min_compact=1000):
+        self.path = path
+        # Journals are only fsync'd once every this many seconds, batching together every change made in between.
+        self.fsync_interval = fsync_interval
+        # The minimum number of records in a journal before it's compacted into a new snapshot.
+        self.min_compact = min_compact
+
+        self.data = {}
+        self.generation = 0
+        self.records = 0
+        self.file = None
+        self.synced_at = 0
+        self.sync_handle = None
+        self.compacting = None
+
+    def journal_path(self, generation):
+        return '{}.{}.journal'.format(self.path, generation)
+
+    def journal_generations(self):
+        '''The generations of all journals currently on disk, in order.'''
+        gens = []
+        for path in glob.glob(glob.escape(self.path) + '.*.journal'):
+            try: gens.append(int(path[len(self.path)+1: -len('.journal')]))
+            except ValueError: pass
+        return sorted(gens)
+
+    def load(self):
+        '''Load the snapshot and replay the journals on top of it, returns the resulting dict.'''
+        self.data = {}
+        self.generation = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as file:
+                snapshot = pickle.load(file)
+            # Legacy snapshots are simply the pickled dict, without a generation.
+            if isinstance(snapshot, tuple):
+                self.generation, self.data = snapshot
+            else:
+                self.data = snapshot
+
+        self.records = 0
+        for gen in self.journal_generations():
+            if gen < self.generation:
+                # Left over from a compaction that completed, but didn't get to clean up after itself.
+                os.remove(self.journal_path(gen))
+                continue
+            self.records += self.replay(self.journal_path(gen))
+            self.generation = gen
+
+        self.file = open(self.journal_path(self.generation), 'ab')
+        return self.data
+
+    def reset(self):
+        '''Start over with an empty dict, backing up the snapshot if it exists (e.g. because it failed to load).'''
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + '.corrupt')
+        self.data = {}
+        self.generation = max(self.journal_generations(), default=0)
+        self.file = open(self.journal_path(self.generation), 'ab')
+        # Write an empty snapshot right away, so the old journals don't get replayed on top of nothing next time.
+        self.compact()
+        return self.data
+
+    def replay(self, path):
+        '''Apply all the records in a journal to the data, returns the number of records.'''
+        count = 0
+        torn = False
+        with open(path, 'rb') as file:
+            # The end of the last record that was read in full.
+            good = 0
+            while True:
+                try:
+                    op, key, *value = pickle.load(file)
+                except EOFError:
+                    # Also raised by a record cut off partway, so check whether anything's left over.
+                    torn = file.tell() > good or file.read(1) != b''
+                    break
+                except Exception:
+                    torn = True
+                    break
+                if op == 'set':
+                    self.data[key] = value[0]
+                else:
+                    self.data.pop(key, None)
+                count += 1
+                good = file.tell()
+        if torn:
+            # A torn record at the end of the journal: The write it belonged to never completed.
+            # Cut it off, or every record appended after it would be unreadable next time.
+            print('Discarding incomplete record at the end of "{}".'.format(path))
+            os.truncate(path, good)
+        return count
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.append(('set', key, value))
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.append(('del', key))
+
+    def save(self, key, value=None):
+        '''Journal the current state of a value that was modified in place.'''
+        if value is not None: self.data[key] = value
+        self.append(('set', key, self.data[key]))
+
+    def append(self, record):
+        self.file.write(pickle.dumps(record))
+        self.file.flush()
+        self.records += 1
+        self.sync()
+        if self.records >= max(self.min_compact, len(self.data)) and not self.is_compacting():
+            self.compact()
+
+    def sync(self):
+        '''Make sure the journal hits the disk, at most once every fsync_interval seconds.'''
+        now = time.monotonic()
+        if now - self.synced_at >= self.fsync_interval:
+            os.fsync(self.file.fileno())
+            self.synced_at = now
+            return
+        if self.sync_handle is not None: return
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None and loop.is_running():
+            # Sync whatever else gets written in the meantime as well, once the interval is up.
+            self.sync_handle = loop.call_later(self.fsync_interval - (now - self.synced_at), self.delayed_sync)
+        else:
+            os.fsync(self.file.fileno())
+            self.synced_at = now
+
+    def delayed_sync(self):
+        self.sync_handle = None
+        if self.file.closed: return
+        os.fsync(self.file.fileno())
+        self.synced_at = time.monotonic()
+
+    def is_compacting(self):
+        '''Whether a snapshot is still being written in the background, in which case we shouldn't start another one.'''
+        return self.compacting is not None and not self.compacting.done()
+
+    def compact(self):
+        '''Start a new journal and write a new snapshot, in the background if possible.'''
+        # Finish off the current journal and start the next generation's.
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.generation += 1
+        self.records = 0
+        self.file = open(self.journal_path(self.generation), 'ab')
+
+        # Pickle the data right now, so the snapshot is consistent with where the new journal starts.
+        snapshot = pickle.dumps((self.generation, self.data))
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None and loop.is_running():
+            self.compacting = loop.run_in_executor(None, self.write_snapshot, self.generation, snapshot)
+            self.compacting.add_done_callback(self.compacted)
+        else:
+            self.write_snapshot(self.generation, snapshot)
+
+    def compacted(self, future):
+        '''Report a snapshot that failed to write in the background, since nothing else waits for it.'''
+        if future.cancelled() or future.exception() is None: return
+        e = future.exception()
+        # The old snapshot and every journal since are still there, so nothing is lost: They'll be replayed on load,
+        # and compacted again once the current journal grows big enough.
+        print('Failed to write snapshot "{}": {}: {}'.format(self.path, e.__class__.__name__, e))
+
+    def write_snapshot(self, generation, snapshot):
+        tmp = '{}.{}.tmp'.format(self.path, generation)
+        try:
+            with open(tmp, 'wb') as file:
+                file.write(snapshot)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp, self.path)
+        except Exception:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        # The journals from before this snapshot are now obsolete.
+        for gen in self.journal_generations():
+            if gen < generation:
+                os.remove(self.journal_path(gen))
+
+    def write(self):
+        '''Immediately compact everything into a new snapshot.'''
+        if not self.is_compacting():
+            self.compact()
+
+    def close(self):
+        if self.sync_handle is not None:
+            self.sync_handle.cancel()
+            self.sync_handle = None
+        if self.file is not None and not self.file.closed:
+            os.fsync(self.file.fileno())
+            self.file.close()
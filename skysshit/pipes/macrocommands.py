@@ -5,6 +5,7 @@ from discord.ext import commands
 from .pipes import pipes
 from .sources import sources
 from .macros import Macro, MacroSig, pipe_macros, source_macros
+from .macrograph import macro_graph
 import utils.texttools as texttools
 
 typedict = {
@@ -26,6 +27,13 @@ class MacroCommands(commands.Cog):
     async def permission_complain(self, channel):
         await channel.send('You are not authorised to modify that macro. Try defining a new one instead.')
 
+    async def check_cycle(self, channel, macros, name, code):
+        '''Complains and returns True if the macro would end up using itself.'''
+        cycle = await macro_graph.find_cycle(macros.kind, name, code)
+        if cycle is None: return False
+        await channel.send('That would make the {} macro `{}` use itself: {}'.format(macros.kind, name, ' → '.join(n for _, n in cycle)))
+        return True
+
     @commands.command(aliases=['def'])
     async def define(self, ctx, what, name):
         await self._define(ctx.message, what, name, re.split('\s+', message.content, 3)[3])
@@ -42,6 +50,8 @@ class MacroCommands(commands.Cog):
             await channel.send('A {0} called "{1}" already exists, try `>redefine {0}` instead.'.format(what, name))
             return
 
+        if await self.check_cycle(channel, macros, name, code): return
+
         author = message.author
         macros[name] = Macro(name, code, author.name, author.id, str(author.avatar_url), visible=visible)
         await channel.send('Defined a new {} macro called `{}` as {}'.format(what, name, texttools.block_format(code)))
@@ -64,8 +74,10 @@ class MacroCommands(commands.Cog):
         if not macros[name].authorised(message.author):
             await self.permission_complain(channel); return
 
+        if await self.check_cycle(channel, macros, name, code): return
+
         macros[name].code = code
-        macros.write()
+        macros.save(name)
         await channel.send('Redefined {} `{}` as {}'.format(what, name, texttools.block_format(code)))
 
     @commands.command(aliases=['desc'])
@@ -87,7 +99,7 @@ class MacroCommands(commands.Cog):
             await self.permission_complain(channel); return
 
         macros[name].desc = desc
-        macros.write()
+        macros.save(name)
         await channel.send('Described {} `{}` as `{}`'.format(what, name, desc))
 
     @commands.command(aliases=['unhide'])
@@ -105,7 +117,7 @@ class MacroCommands(commands.Cog):
             await self.permission_complain(ctx); return
 
         macros[name].visible ^= True
-        macros.write()
+        macros.save(name)
         await ctx.send('{} {} `{}`'.format('Unhid' if macros[name].visible else 'Hid', what, name))
 
     @commands.command(aliases=['del'])
@@ -142,7 +154,7 @@ class MacroCommands(commands.Cog):
 
         sig = MacroSig(signame, sigdefault, sigdesc)
         macros[name].signature[signame] = sig
-        macros.write()
+        macros.save(name)
         await ctx.send('Added argument ({}) to {} {}'.format(sig, what, name))
 
     @commands.command(aliases=['delete_sig', 'del_sig', 'del_arg'])
@@ -160,7 +172,7 @@ class MacroCommands(commands.Cog):
             await self.permission_complain(ctx); return
 
         del macros[name].signature[signame]
-        macros.write()
+        macros.save(name)
         await ctx.send('Removed signature "{}" from {} {}'.format(signame, what, name))
 
 
@@ -178,7 +190,7 @@ class MacroCommands(commands.Cog):
                 filtered_macros = macros.hidden()
             elif name == 'mine' or name == 'my':
                 what2 = 'your ' + what
-                filtered_macros = [m for m in macros if macros[m].authorId == ctx.author.id]
+                filtered_macros = macros.by_author(ctx.author.id)
             else:
                 what2 = what
                 filtered_macros = macros.visible()
@@ -192,11 +204,12 @@ class MacroCommands(commands.Cog):
             infos.append('Use >{what}s for a list of native {what}s.\n'.format(what=what))
 
             colW = len(max(filtered_macros, key=len)) + 2
+            descriptions = await macros.descriptions()
             for name in filtered_macros:
-                macro = macros[name]
+                desc = descriptions.get(name)
                 info = name + ' ' * (colW-len(name))
-                if macro.desc is not None:
-                    info += macro.desc.split('\n')[0]
+                if desc is not None:
+                    info += desc.split('\n')[0]
                 infos.append(info)
 
             text = texttools.block_format('\n'.join(infos))
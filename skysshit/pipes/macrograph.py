@@ -0,0 +1,180 @@
+import re
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .pipes import pipes
+from .sources import sources
+from .spouts import spouts
+from .macros import pipe_macros, source_macros
+
+###############################################################
+#                          MacroGraph                         #
+###############################################################
+
+# Macros can use other macros, which can use other macros, etc.
+# The MacroGraph keeps track of which macros use which, so that:
+#   • When a macro changes, the compiled plans of every macro that (indirectly) uses it can be thrown out.
+#   • Defining a macro that would end up using itself can be refused.
+# Additionally, it limits how deeply macros can be nested, and how many can be expanded, while running a single script.
+
+class MacroError(ValueError):
+    '''Special error for when a script uses too many macros.'''
+    pass
+
+# How deeply nested the macro currently being expanded is.
+_depth = ContextVar('macro_depth', default=0)
+# How many more macros the current script may expand, as a single-item list so it's shared between tasks.
+_budget = ContextVar('macro_budget', default=None)
+
+
+class MacroGraph:
+    '''The dependencies between macros, nodes are (kind, name) tuples, with kind either 'pipe' or 'source'.'''
+    # How deeply macros may be nested.
+    MAX_DEPTH = 12
+    # How many macros a single script may expand in total.
+    MAX_EXPANSIONS = 250
+
+    def __init__(self):
+        # node -> (the code its dependencies were found in, set of nodes it depends on)
+        # Only macros that were actually looked at are in here, so we don't have to load every macro to build the graph.
+        self.edges = {}
+        # node -> set of nodes known to depend on it
+        self.dependents = defaultdict(set)
+
+    @staticmethod
+    def macros(kind):
+        return pipe_macros if kind == 'pipe' else source_macros
+
+    ## Finding dependencies
+
+    source_regex = re.compile(r'{\s*\d*\s*([_a-zA-Z][^\s}]*)')
+
+    @staticmethod
+    def source_names(string):
+        '''The names of the non-native sources a string might use.'''
+        for name in re.findall(MacroGraph.source_regex, string):
+            name = name.lower()
+            # The same fuzzy plural matching as SourceProcessor.evaluate_parsed_source
+            for name in ([name+'s', name] if name[-1] != 's' else [name[:-1], name]):
+                if name in sources: break
+                yield ('source', name)
+
+    @staticmethod
+    def parse_dependencies(kind, code):
+        '''The set of macros the given macro code uses (or would use, if they existed).'''
+        # Imported here because the processor itself imports the MacroGraph.
+        from .processor import Pipeline, PipelineProcessor
+
+        deps = set()
+        if kind == 'source':
+            source, code = PipelineProcessor.split(code)
+            deps.update(MacroGraph.source_names(source))
+
+        def visit(pipeline):
+            for _, parsedPipes in pipeline.parsed_segments:
+                for pipe in parsedPipes:
+                    if type(pipe) is Pipeline:
+                        visit(pipe)
+                        continue
+                    if pipe.name not in pipes and pipe.name not in spouts and pipe.name not in ['', 'nop', 'print']:
+                        deps.add(('pipe', pipe.name))
+                    deps.update(MacroGraph.source_names(pipe.argstr))
+        visit(Pipeline(code))
+        return deps
+
+    async def dependencies(self, node):
+        '''The set of nodes the given node depends on, looked up and remembered if necessary.'''
+        kind, name = node
+        macros = self.macros(kind)
+        if name not in macros:
+            return set()
+        # Peek, so that searching the graph doesn't drag every macro it passes through into the working set.
+        try:
+            macro = await macros.peek(name)
+        except KeyError:
+            return set()
+        return self.dependencies_in(node, macro.code)
+
+    def dependencies_in(self, node, code):
+        '''The set of nodes the given node depends on if it has the given code, parsed and remembered if necessary.'''
+        if node in self.edges and self.edges[node][0] == code:
+            return self.edges[node][1]
+        deps = self.parse_dependencies(node[0], code)
+        self.set_edges(node, code, deps)
+        return deps
+
+    def set_edges(self, node, code, deps):
+        self.forget(node)
+        self.edges[node] = (code, deps)
+        for dep in deps:
+            self.dependents[dep].add(node)
+
+    def forget(self, node):
+        if node in self.edges:
+            for dep in self.edges.pop(node)[1]:
+                self.dependents[dep].discard(node)
+
+    ## Cycles
+
+    async def find_cycle(self, kind, name, code):
+        '''
+        If the given macro were defined as the given code, would it end up using itself?
+        Returns the path from the macro back to itself if so, None otherwise.
+        '''
+        node = (kind, name)
+        # Depth first search from each of its proposed dependencies, looking for the node itself.
+        stack = [ (dep, [node, dep]) for dep in self.parse_dependencies(kind, code) ]
+        seen = set()
+        while stack:
+            current, path = stack.pop()
+            if current == node:
+                return path
+            if current in seen: continue
+            seen.add(current)
+            stack.extend( (dep, path + [dep]) for dep in await self.dependencies(current) )
+        return None
+
+    ## Invalidation
+
+    def changed(self, kind, name):
+        '''Called when a macro is created, changed or deleted: Discard its plan and the plans of all macros that (indirectly) use it.'''
+        node = (kind, name)
+        stack = [node]
+        seen = set()
+        while stack:
+            current = stack.pop()
+            if current in seen: continue
+            seen.add(current)
+            self.macros(current[0]).plans.discard(current[1])
+            stack.extend(self.dependents.get(current, ()))
+        self.forget(node)
+
+    ## Limits
+
+    @staticmethod
+    def new_script():
+        '''Start counting macro expansions for a new script.'''
+        _budget.set([MacroGraph.MAX_EXPANSIONS])
+
+    @staticmethod
+    @contextmanager
+    def expand(kind, name):
+        '''Context for expanding a macro, raises MacroError if that exceeds the depth or the script's budget.'''
+        depth = _depth.get() + 1
+        if depth > MacroGraph.MAX_DEPTH:
+            raise MacroError('Macros nested too deeply (over {} levels) at {} macro "{}".'.format(MacroGraph.MAX_DEPTH, kind, name))
+        budget = _budget.get()
+        if budget is not None:
+            if budget[0] <= 0:
+                raise MacroError('Script uses too many macros (over {}).'.format(MacroGraph.MAX_EXPANSIONS))
+            budget[0] -= 1
+        token = _depth.set(depth)
+        try:
+            yield
+        finally:
+            _depth.reset(token)
+
+macro_graph = MacroGraph()
+pipe_macros.listeners.append(macro_graph.changed)
+source_macros.listeners.append(macro_graph.changed)
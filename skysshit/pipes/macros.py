@@ -1,12 +1,13 @@
 import os
-import pickle
 import re
-from lru import LRU
+from collections import OrderedDict
 
 from shutil import copyfile
 from discord import Embed
 import utils.texttools as texttools
 import permissions
+from libneko.metrics import CacheMetrics
+from . import database
 
 def DIR(filename=''):
     return os.path.join(os.path.dirname(__file__), 'macros', filename)
@@ -28,6 +29,28 @@ class MacroSig:
         return out
 
 
+class MacroTemplate:
+    '''
+    A macro's code split up once into literal text and $holes$, so that applying arguments is a single join,
+    instead of a replace over the entire code for every argument.
+    '''
+    hole_regex = re.compile(r'\$(\w+)\$')
+
+    def __init__(self, code):
+        self.code = code
+        # [text, hole, text, hole, ..., text]
+        self.parts = re.split(MacroTemplate.hole_regex, code)
+        self.holes = list(dict.fromkeys(self.parts[1::2]))
+
+    def fill(self, args):
+        '''The code with its holes filled in by the given args, holes without a matching arg are left as they are.'''
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            parts[i] = args[name] if name in args else '$' + name + '$'
+        return ''.join(parts)
+
+
 class Macro:
     def __init__(self, name, code, authorName, authorId, authorAvatarURL, desc=None, visible=True, command=False):
         self.version = 3
@@ -66,7 +89,8 @@ class Macro:
     # Regex partially identical to the one in signature.py
     arg_finder = re.compile(r'\b(\w+)=("[^"]*"|\'[^\']*\'|\S+)\s*')
 
-    def apply_args(self, argstr):
+    def parse_args(self, argstr):
+        '''Turn an argument string into a dict of argument values, including defaults.'''
         # TODO: required args?
         # Load the defaults
         args = {s: self.signature[s].default for s in self.signature}
@@ -76,31 +100,103 @@ class Macro:
             for name, value in re.findall(Macro.arg_finder, argstr):
                 if value[0] == value[-1] and value[0] in ['"', "'"]: value = value[1:-1]
                 args[name] = value
+        return args
 
-        code = self.code
-        for arg in args:
-            code = code.replace('$' + arg + '$', args[arg])
-        return code
+    def template(self):
+        '''The macro's code compiled into a MacroTemplate, recompiled only if the code changed.'''
+        template = getattr(self, '_template', None)
+        if template is None or template.code != self.code:
+            template = self._template = MacroTemplate(self.code)
+        return template
+
+    def apply_args(self, argstr):
+        return self.template().fill(self.parse_args(argstr))
+
+    def __getstate__(self):
+        # Don't pickle the compiled template
+        state = self.__dict__.copy()
+        state.pop('_template', None)
+        return state
 
     def authorised(self, user):
         '''Test whether or not the given user is authorised to modify this macro.'''
         return permissions.has(user.id, permissions.owner) or user.id == self.authorId
 
 
+class PlanCache:
+    '''
+    Per-macro cache of compiled plans, evicting the least recently used macros' plans once the total size of the cache exceeds max_size.
+    A plan is anything with a `code` attribute (the code it was compiled from) and a `size()` method.
+    '''
+    def __init__(self, max_size, name='plans'):
+        self.max_size = max_size
+        self.plans = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+        self.metrics = CacheMetrics(name)
+
+    def get(self, name, code):
+        '''The plan for the given macro, or None if there is none or if it was compiled from different code.'''
+        plan = self.plans.get(name)
+        if plan is None:
+            self.metrics.miss()
+            return None
+        if plan.code != code:
+            self.discard(name)
+            self.metrics.miss()
+            return None
+        self.plans.move_to_end(name)
+        self.metrics.hit()
+        return plan
+
+    def put(self, name, plan):
+        self.discard(name)
+        self.plans[name] = plan
+        self.resize(name)
+        return plan
+
+    def resize(self, name):
+        '''Update the size of a plan (which may grow as it's used), and evict other plans if necessary.'''
+        size = self.plans[name].size()
+        self.size += size - self.sizes.get(name, 0)
+        self.sizes[name] = size
+        while self.size > self.max_size and len(self.plans) > 1:
+            oldest = next(iter(self.plans))
+            if oldest == name: self.plans.move_to_end(name); continue
+            self.discard(oldest)
+
+    def discard(self, name):
+        if name in self.plans:
+            del self.plans[name]
+            self.size -= self.sizes.pop(name)
+
+    def __len__(self):
+        return len(self.plans)
+
+
 class Macros:
-    def __init__(self, DIR, filename):
+    def __init__(self, DIR, filename, kind, **options):
         self.macros = {}
         self.DIR = DIR
         self.filename = filename
-        self.pipeline_cache = LRU(20)
+        self.kind = kind
+        # Compiled plans (see processor.MacroPlan), by macro name
+        self.plans = PlanCache(200000, kind + ' macro plans')
+        # Functions called as f(kind, name) whenever a macro is created, changed or deleted.
+        self.listeners = []
+        if not os.path.exists(DIR()): os.mkdir(DIR())
+        # options: the working set's cache_size, pin_size and pin_hits (see database.Table)
+        self.store = database.open_store(database.MacroTable, DIR, filename, kind, convert=Macro.v2_to_v3, **options)
+        # Whether self.macros is a database.MacroTable, which can answer queries without loading every macro
+        self.table = database.BACKEND == 'sqlite'
         try:
-            if not os.path.exists(DIR()): os.mkdir(DIR())
-            self.macros = pickle.load(open(DIR(filename), 'rb+'))
-            self.convert_v2_to_v3()
+            self.macros = self.store.load()
+            if not self.table: self.convert_v2_to_v3()
             print('{} macros loaded from "{}"!'.format(len(self.macros), filename))
         except Exception as e:
             print(e)
             print('Failed to load macros from "{}"!'.format(DIR(filename)))
+            self.macros = self.store.reset()
 
     def convert_v2_to_v3(self):
         FROM_VERSION = 2
@@ -120,14 +216,35 @@ class Macros:
             print('Failed to convert macros from "{}"!'.format(self.filename))
 
     def visible(self):
+        if self.table: return self.macros.visible(True)
         return [i for i in self.macros if self.macros[i].visible]
 
     def hidden(self):
+        if self.table: return self.macros.visible(False)
         return [i for i in self.macros if not self.macros[i].visible]
 
+    def by_author(self, author_id):
+        if self.table: return self.macros.by_author(author_id)
+        return [i for i in self.macros if self.macros[i].authorId == author_id]
+
+    async def descriptions(self):
+        '''Maps each macro's name to its description, without loading every macro into the cache.'''
+        if self.table: return await self.macros.descriptions()
+        return {i: self.macros[i].desc for i in self.macros}
+
     def write(self):
-        '''Write the list of macros to a pickle file.'''
-        pickle.dump(self.macros, open(self.DIR(self.filename), 'wb+'))
+        '''Write the entire list of macros to a new snapshot.'''
+        self.store.write()
+
+    def save(self, name, macro=None):
+        '''Save the changes made to a single macro.'''
+        self.store.save(name, macro)
+        self.changed(name)
+
+    def changed(self, name):
+        self.plans.discard(name)
+        for listener in self.listeners:
+            listener(self.kind, name)
 
     def __contains__(self, name):
         return name in self.macros
@@ -138,16 +255,26 @@ class Macros:
     def __getitem__(self, name):
         return self.macros[name]
 
+    async def peek(self, name):
+        '''Same as fetch(name), except that it doesn't count as a use or add the macro to the working set.'''
+        if self.table: return await self.macros.peek(name)
+        return self.macros[name]
+
+    async def fetch(self, name):
+        '''Same as self[name], without blocking the event loop while a macro is loaded from the database.'''
+        if self.table: return await self.macros.fetch(name)
+        return self.macros[name]
+
     def __setitem__(self, name, val):
         if type(val).__name__ != 'Macro':
             raise ValueError('Macros should only contain items of class Macro!')
-        self.macros[name] = val
-        self.write()
+        self.store[name] = val
+        self.changed(name)
         return val
 
     def __delitem__(self, name):
-        del self.macros[name]
-        self.write()
+        del self.store[name]
+        self.changed(name)
 
     def __bool__(self):
         return len(self.macros) > 0
@@ -156,5 +283,5 @@ class Macros:
         return len(self.macros)
 
 
-pipe_macros = Macros(DIR, 'pipe_macros.p')
-source_macros = Macros(DIR, 'source_macros.p')
\ No newline at end of file
+pipe_macros = Macros(DIR, 'pipe_macros.p', 'pipe', cache_size=200, pin_size=50)
+source_macros = Macros(DIR, 'source_macros.p', 'source', cache_size=100, pin_size=25)
\ No newline at end of file
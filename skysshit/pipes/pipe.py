@@ -11,6 +11,8 @@ class Pipe:
         self.category = category
         # remove _pipe or _source or _spout from the function's name
         self.name = function.__name__.rsplit('_', 1)[0].lower()
+        # The per-item function if the function was decorated with as_map (or word_map), else None
+        self.item_function = getattr(function, 'item_function', None)
         self.doc = function.__doc__
         self.small_doc = None
         if self.doc is not None:
@@ -21,6 +23,17 @@ class Pipe:
         _, args = parse_args(self.signature, argstr)
         return self.function(values, **args)
 
+    @property
+    def is_per_item(self):
+        '''Whether the pipe treats each of its inputs independently of the others.'''
+        return self.item_function is not None
+
+    def item_caller(self, argstr):
+        '''Parses the arguments once and returns a function applying the pipe to a single item.'''
+        _, args = parse_args(self.signature, argstr)
+        function = self.item_function
+        return lambda item: function(item, **args)
+
     def as_command(self, text):
         text, args = parse_args(self.signature, text, greedy=False)
         return self.function([text], **args)
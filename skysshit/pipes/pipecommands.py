@@ -10,6 +10,7 @@ from .spouts import spouts
 from .macros import pipe_macros, source_macros
 from .processor import PipelineProcessor, SourceProcessor
 from .events import events
+from . import profiler
 from mycommands import MyCommands
 import utils.texttools as texttools
 import utils.util as util
@@ -165,6 +166,14 @@ class PipeCommands(MyCommands):
             text = texttools.block_format('\n'.join(infos))
             await ctx.send(text)
 
+    @commands.command(aliases=['pipes_stats'])
+    @commands.is_owner()
+    async def pipe_stats(self, ctx, n: int=20):
+        '''Timing statistics for the pipes, sources, macros and spouts that took up the most time since startup.'''
+        if not profiler.histograms:
+            await ctx.send('No statistics collected yet.'); return
+        await ctx.send(texttools.block_format(profiler.stats_table(n)))
+
     ## EVENTS
     ### PUT IN OWN FILE STUPID
 
@@ -205,6 +214,7 @@ class PipeCommands(MyCommands):
         if ctx.channel.id in event.channels:
             await ctx.send('Event is already enabled in this channel.'); return
         event.channels.append(ctx.channel.id)
+        events.save(name, event)
         await ctx.send('Enabled event "{}" in {}'.format(event.name, ctx.channel.mention))
 
     @commands.command()
@@ -215,6 +225,7 @@ class PipeCommands(MyCommands):
             for event in events.values():
                 if ctx.channel.id in event.channels:
                     event.channels.remove(ctx.channel.id)
+                    events.save(event.name, event)
             await ctx.send('Disabled all events for {}'.format(ctx.channel.mention))
             return
 
@@ -224,6 +235,7 @@ class PipeCommands(MyCommands):
         if ctx.channel.id not in event.channels:
             await ctx.send('Event is already disabled in this channel.'); return
         event.channels.remove(ctx.channel.id)
+        events.save(name, event)
         await ctx.send('Disabled event "{}" in {}'.format(event.name, ctx.channel.mention))
 
     @commands.command(aliases=['del_event'])
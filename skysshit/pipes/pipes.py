@@ -6,6 +6,7 @@ import math
 import textwrap
 import re
 from functools import wraps, lru_cache
+from collections import Counter
 
 from datamuse import datamuse
 datamuse_api = datamuse.Datamuse()
@@ -33,6 +34,8 @@ def as_map(func):
     @wraps(func)
     def _as_map(input, *args, **kwargs):
         return [func(i, *args, **kwargs) for i in input]
+    # Remember the per-item function, so the pipeline can stream values through it one at a time
+    _as_map.item_function = func
     return _as_map
 
 _word_splitter = re.compile(r'([\w\'-]+)') # groups together words made out of letters or ' or -
@@ -136,20 +139,70 @@ def sample_pipe(input, amount):
     return random.sample(input, min(len(input), amount))
 
 
-@make_pipe({ 'count' : Sig(bool, False, 'Whether each unique item should be followed by a count of how many there were of it.') })
+def _with_counts(pairs):
+    '''Flattens (value, count) pairs into a list where each value is followed by its count.'''
+    return [x for value, count in pairs for x in (value, str(count))]
+
+
+@make_pipe({ 'count' : Sig(util.parse_bool, False, 'Whether each unique item should be followed by a count of how many there were of it.') })
 def unique_pipe(input, count):
     '''Returns the first unique occurence of each value.'''
-    if not count: return [*{*input}]
-
-    values = []
-    counts = []
-    for value in input:
-        try:
-            counts[values.index(value)] += 1
-        except:
-            values.append(value)
-            counts.append(1)
-    return [x for tup in zip(values, (str(c) for c in counts)) for x in tup]
+    if not count: return list(dict.fromkeys(input))
+    # Counter keeps the values in order of first occurence.
+    return _with_counts(Counter(input).items())
+
+
+@make_pipe({
+    'with': Sig(str, None, 'The values to intersect with, separated by the separator.'),
+    'sep' : Sig(str, ',', 'The separator between the values.'),
+})
+def intersect_pipe(input, sep, **argc):
+    '''Returns the first occurence of each value that is also one of the given values.'''
+    other = set(argc['with'].split(sep)) # because "with" is a keyword
+    return [value for value in dict.fromkeys(input) if value in other]
+
+
+@make_pipe({
+    'with': Sig(str, None, 'The values to remove, separated by the separator.'),
+    'sep' : Sig(str, ',', 'The separator between the values.'),
+})
+def difference_pipe(input, sep, **argc):
+    '''Returns the first occurence of each value that is not one of the given values.'''
+    other = set(argc['with'].split(sep)) # because "with" is a keyword
+    return [value for value in dict.fromkeys(input) if value not in other]
+
+
+_count_keys = {
+    'value':  None,
+    'lower':  str.lower,
+    'length': lambda x: str(len(x)),
+    'first':  lambda x: x[:1],
+}
+
+@make_pipe({ 'by': Sig(str, 'value', 'What to count by: value/lower/length/first', options=list(_count_keys)) })
+def count_by_pipe(input, by):
+    '''
+    Counts how many values there are of each kind, producing each kind followed by its count, in order of first occurence.
+
+    value: Counts identical values
+    lower: Counts values that are identical ignoring case, as their lowercase form
+    length: Counts values of the same length
+    first: Counts values starting with the same character
+    '''
+    key = _count_keys[by.lower()]
+    return _with_counts(Counter(input if key is None else map(key, input)).items())
+
+
+@make_pipe({
+    'n'    : Sig(int, 1, 'The number of values to produce.', lambda x: x>=0),
+    'count': Sig(util.parse_bool, False, 'Whether each item should be followed by a count of how many there were of it.'),
+})
+def top_pipe(input, n, count):
+    '''Returns the N most frequent values, from most to least frequent. Ties are broken by first occurence.'''
+    # Counter keeps the values in order of first occurence, and most_common(n) is stable so this breaks ties for us.
+    pairs = Counter(input).most_common(n)
+    if count: return _with_counts(pairs)
+    return [value for value, _ in pairs]
 
 
 @make_pipe({})
@@ -4,15 +4,20 @@ import re
 import random
 import asyncio
 import time
+import logging
 
 from lru import LRU
 
+from libneko import metrics
+
 from .pipes import pipes
 from .sources import sources, SourceResources
 from .spouts import spouts
 from .macros import pipe_macros, source_macros
 from .events import events
 from .macrocommands import parse_macro_command
+from .macrograph import macro_graph, MacroGraph
+from . import profiler
 import pipes.groupmodes as groupmodes
 from utils.choicetree import ChoiceTree
 
@@ -30,51 +35,107 @@ class PipelineError(ValueError):
 
 
 class ErrorLog:
-    '''Class for logging warnings & error messages from a pipeline's execution.'''
+    '''
+    Class for collecting warnings & error messages from a pipeline's execution.
+    Errors are stored as (code, context, args) records and counted by key; they are only turned into text when displayed.
+    '''
+    # The message templates, by error code. Code None is used for messages that are given as a single pre-formatted string.
+    MESSAGES = {
+        None: '{}',
+        'pipe': 'Failed to process pipe "{}" with args "{}":\n\t{}: {}',
+        'pipe items': 'Failed to process pipe "{}" with args "{}" for some items, the first with:\n\t{}: {}',
+        'spout': 'Failed to process spout "{}" with args "{}":\n\t{}: {}',
+        'source': 'Failed to evaluate source "{}" with args "{}":\n\t{}: {}',
+        'unknown pipe': 'Unknown pipe "{}".',
+        'unknown source': 'Unknown source "{}".',
+    }
+
+    # Embed descriptions are limited to 2048 characters, leave some room for the note on how many errors were left out.
+    EMBED_CHARS = 1900
+
+    # New errors are sent to the logger at most once every this many seconds, across all error logs.
+    LOG_INTERVAL = 5
+    logger = logging.getLogger('pipes')
+    _logged_at = 0
+    _suppressed = 0
+
     def __init__(self):
-        self.errors = []
+        self.records = {}
         self.terminal = False
         self.time = datetime.now().strftime('%z %c')
 
-    class ErrorMessage:
-        def __init__(self, message, count=1):
+    class Record:
+        __slots__ = ('code', 'context', 'args', 'count')
+
+        def __init__(self, code, context, args, count=1):
+            self.code = code
+            self.context = context
+            self.args = args
             self.count = count
-            self.message = message
+
+        def message(self):
+            return ''.join('**in {}:** '.format(c) for c in self.context) + ErrorLog.MESSAGES[self.code].format(*self.args)
+
         def __str__(self):
-            return ('**(%d)** ' % self.count if self.count > 1 else '') + self.message
+            return ('**(%d)** ' % self.count if self.count > 1 else '') + self.message()
 
     def __call__(self, message, terminal=False):
-        if self.errors and self.errors[-1].message == message:
-            self.errors[-1].count += 1
-        else:
-            print('Error logged: ' + message)
-            self.errors.append(ErrorLog.ErrorMessage(message))
+        self.record(None, message, terminal=terminal)
+
+    def record(self, code, *args, terminal=False):
+        '''Log an error by its code and the arguments to fill into its message.'''
+        self._add(code, (), args, 1)
         self.terminal |= terminal
 
+    def _add(self, code, context, args, count):
+        key = (code, context, args)
+        record = self.records.get(key)
+        if record is not None:
+            record.count += count
+        else:
+            record = self.records[key] = ErrorLog.Record(code, context, args, count)
+            self._log(record)
+
+    def _log(self, record):
+        '''Send a newly seen error to the logger, unless another error was sent too recently.'''
+        now = time.monotonic()
+        if now - ErrorLog._logged_at < ErrorLog.LOG_INTERVAL:
+            ErrorLog._suppressed += 1
+            return
+        if ErrorLog._suppressed:
+            ErrorLog.logger.warning('Error logged: %s (%d more errors suppressed)', record.message(), ErrorLog._suppressed)
+        else:
+            ErrorLog.logger.warning('Error logged: %s', record.message())
+        ErrorLog._logged_at = now
+        ErrorLog._suppressed = 0
+
     def extend(self, other, context=None):
         '''extend another error log, prepending the given 'context' for each error.'''
         self.terminal |= other.terminal
-        for e in other.errors:
-            if context is not None: message = '**in {}:** {}'.format(context, e.message)
-            else: message = e.message
-            if self.errors and self.errors[-1].message == message:
-                self.errors[-1].count += e.count
-            else:
-                self.errors.append(ErrorLog.ErrorMessage(message, e.count))
+        for r in other.records.values():
+            self._add(r.code, (context, *r.context) if context is not None else r.context, r.args, r.count)
 
     def steal(self, other, *args, **kwargs):
         self.extend(other, *args, **kwargs)
         other.clear()
 
     def clear(self):
-        self.errors = []
+        self.records = {}
         self.terminal = False
 
-    def __bool__(self): return len(self.errors) > 0
-    def __len__(self): return len(self.errors)
+    def __bool__(self): return len(self.records) > 0
+    def __len__(self): return len(self.records)
 
     def embed(self):
-        desc = '\n'.join(str(m) for m in self.errors) if self.errors else 'No warnings!'
+        lines = []; chars = 0
+        for r in self.records.values():
+            line = str(r)
+            chars += len(line) + 1
+            if chars > ErrorLog.EMBED_CHARS:
+                lines.append('...and {} more.'.format(len(self.records) - len(lines)))
+                break
+            lines.append(line)
+        desc = '\n'.join(lines) if lines else 'No warnings!'
         if self.terminal:
             embed = discord.Embed(title="Error log", description=desc, color=0xff3366 if self.terminal else 0xff88)
         else:
@@ -89,6 +150,12 @@ class ParsedPipe:
         self.argstr = argstr
 
 
+class FusedSegment:
+    '''A run of consecutive per-item pipes under the default group mode, applied to each item in a single pass.'''
+    def __init__(self, parsedPipes):
+        self.parsedPipes = parsedPipes
+
+
 class SourceProcessor:
     def __init__(self, message):
         # This is a class so I don't have to juggle the message (context) and error log around
@@ -117,31 +184,33 @@ class SourceProcessor:
             if name in sources:
                 ###### This is the SINGLE spot where a source is called during execution of pipelines
                 try:
-                    return await sources[name](self.message, args, n=n)
+                    with profiler.stage('source', name) as stage:
+                        values = await sources[name](self.message, args, n=n)
+                        if stage: stage.done(values)
+                    return values
                 except Exception as e:
-                    self.errors('Failed to evaluate source "{}" with args "{}":\n\t{}: {}'.format(name, args, e.__class__.__name__, e))
+                    self.errors.record('source', name, args, e.__class__.__name__, str(e))
                     return None
 
             elif name in source_macros:
-                code = source_macros[name].apply_args(args)
+                macro, plan = await MacroPlan.get(source_macros, name, split_source=True)
                 # Dressed-down version of PipelineProcessor.execute_script:
-                source, pipeline = PipelineProcessor.split(code)
-                ## STEP 1
-                source_processor = SourceProcessor(self.message)
-                values = await source_processor.evaluate(source)
-                errors = source_processor.errors
-                ## STEP 2
-                # TODO: REUSE: Pull these bits of parsing up or summat
-                pipeline = Pipeline(pipeline)
-                ## STEP 3
-                values, _, pl_errors, _ = await pipeline.apply(values, self.message)
+                source, pipeline, bindings = plan.instantiate(macro.parse_args(args))
+                with MacroGraph.expand('source', name), profiler.stage('source macro', name, histogram=False) as stage:
+                    ## STEP 1
+                    source_processor = SourceProcessor(self.message)
+                    values = await source_processor.evaluate(source)
+                    errors = source_processor.errors
+                    ## STEP 2
+                    values, _, pl_errors, _ = await pipeline.apply(values, self.message, bindings)
+                    if stage: stage.done(values)
                 errors.extend(pl_errors)
                 # TODO: Ability to reuse a script N amount of times easily?
                 # Right now we just ignore the N argument....
                 self.errors.extend(errors, name)
                 return values
 
-        self.errors('Unknown source "{}".'.format(name))
+        self.errors.record('unknown source', name)
         return None
 
     async def evaluate_pure_source(self, source):
@@ -197,6 +266,9 @@ class SourceProcessor:
 
 
 class Pipeline:
+    # Whether consecutive per-item pipes stream values through one at a time, instead of each processing the entire flow at once.
+    stream = True
+
     def __init__(self, string):
         self.parser_errors = ErrorLog()
 
@@ -210,6 +282,9 @@ class Pipeline:
             parallel = self.parse_segment(segment)
             self.parsed_segments.append( (groupMode, parallel) )
 
+        ### Fuse runs of segments that can be streamed item by item, instead of applying each to the entire flow at once.
+        self.segments = self.fuse_segments(self.parsed_segments) if Pipeline.stream else self.parsed_segments
+
         ### That's as far as I'm willing to parse/pre-compile a pipeline before execution right now, but there is absolutely room for improvement.
 
         # NOTE: The only errors that are logged in this entire function are in groupmodes.parse,
@@ -377,14 +452,88 @@ class Pipeline:
 
         return parsedPipes
 
-    def check_values(self, values, message):
+    def is_streamable(self, groupMode, parsedPipes):
+        '''
+        Whether a segment can be applied lazily to a stream of values, one item at a time.
+        This is the case for a single per-item (as_map or word_map) pipe under the default /1 group mode,
+        which doesn't pull any items into its arguments.
+        '''
+        if type(groupMode) is not groupmodes.Divide or groupMode.count != 1 or groupMode.multiply or groupMode.strictness:
+            return False
+        pipe = parsedPipes[0]
+        if type(pipe) is not ParsedPipe or pipe.name not in pipes or not pipes[pipe.name].is_per_item:
+            return False
+        return re.search(self.arg_item_regex, pipe.argstr) is None and re.search(self.empty_arg_item_regex, pipe.argstr) is None
+
+    def fuse_segments(self, parsed_segments):
+        '''Replaces each run of consecutive streamable segments with a single FusedSegment.'''
+        segments = []
+        for groupMode, parsedPipes in parsed_segments:
+            if not self.is_streamable(groupMode, parsedPipes):
+                segments.append( (groupMode, parsedPipes) )
+            elif segments and type(segments[-1]) is FusedSegment:
+                segments[-1].parsedPipes.append(parsedPipes[0])
+            else:
+                segments.append(FusedSegment([parsedPipes[0]]))
+        return segments
+
+    # TODO: this could stand to be smarter/more oriented to the type of operation you're trying to do, or something, maybe...?
+    # meditate on this...
+    MAXCHARS = 10000
+
+    def char_limit(self, message):
+        '''The maximum number of characters the user may have in a single flow, None for no limit.'''
+        if permissions.has(message.author.id, permissions.owner): return None
+        return Pipeline.MAXCHARS
+
+    def check_values(self, values, limit):
         '''Raises an error if the user is asking too much of the bot.'''
-        # TODO: this could stand to be smarter/more oriented to the type of operation you're trying to do, or something, maybe...?
-        # meditate on this...
-        MAXCHARS = 10000
+        if limit is None: return
         chars = sum(len(i) for i in values)
-        if chars > MAXCHARS and not permissions.has(message.author.id, permissions.owner):
-            raise PipelineError('Attempted to process a flow of {} total characters at once, try staying under {}.'.format(chars, MAXCHARS))
+        if chars > limit:
+            raise PipelineError('Attempted to process a flow of {} total characters at once, try staying under {}.'.format(chars, limit))
+
+    def item_function(self, name, args, errors):
+        '''Parses the arguments for a per-item pipe once, returns a function applying it to a single item (or None if that fails).'''
+        try:
+            return pipes[name].item_caller(args)
+        except Exception as e:
+            errors.record('pipe', name, args, e.__class__.__name__, str(e))
+            return None
+
+    def stream_pipes(self, values, stages, errors, limit):
+        '''
+        Lazily feeds a stream of values through a chain of per-item pipes, one item at a time, keeping a running total
+        of characters for each stage instead of recounting the entire flow afterwards.
+        Unlike applying a pipe to the entire flow at once, a failure only leaves the item that caused it unaffected.
+        Each stage's failures are counted in a single error, which shows the first one.
+        The time spent in each stage is added up across all items, and added to its histogram once the stream ends.
+        '''
+        counts = [0] * len(stages)
+        failures = [None] * len(stages)
+        times = [0.0] * len(stages)
+        clock = time.perf_counter
+        try:
+            for value in values:
+                last = clock()
+                for i, (name, args, function) in enumerate(stages):
+                    if function is not None:
+                        try:
+                            value = function(value)
+                        except Exception as e:
+                            if failures[i] is None: failures[i] = (e.__class__.__name__, str(e))
+                            errors.record('pipe items', name, args, *failures[i])
+                    if limit is not None:
+                        counts[i] += len(value)
+                        if counts[i] > limit:
+                            raise PipelineError('Attempted to process a flow of over {} total characters at once, try staying under {}.'.format(limit, limit))
+                    now = clock()
+                    times[i] += now - last
+                    last = now
+                yield value
+        finally:
+            for (name, _, function), seconds in zip(stages, times):
+                if function is not None: profiler.histograms['pipe', name].add(seconds)
 
     arg_item_regex = re.compile(r'{(-?\d+)(!?)}')
     empty_arg_item_regex = re.compile(r'{(!?)}')
@@ -426,6 +575,10 @@ class Pipeline:
         # Perform the substitution
         argstr = re.sub(self.arg_item_regex, func, argstr)
 
+        # No items were referenced: Leave the items alone
+        if not to_be_ignored and not to_be_removed:
+            return argstr, [], items
+
         # If "conflicting" instances occur (i.e. both {0} and {0!}) give precedence to the {0!}
         # Since the ! is an intentional indicator of what they want to happen; Do not remove the item
         to_be = [ (i, True) for i in to_be_removed.difference(to_be_ignored) ] + [ (i, False) for i in to_be_ignored ]
@@ -441,8 +594,11 @@ class Pipeline:
 
         return argstr, ignored, filtered
 
-    async def apply(self, values, message):
-        '''Apply the pipeline to the set of values.'''
+    async def apply(self, values, message, bindings=None):
+        '''
+        Apply the pipeline to the set of values.
+        bindings are the argument values for a pipeline compiled from a macro, see MacroPlan.
+        '''
         ## This is the big method where everything happens.
 
         errors = ErrorLog()
@@ -452,15 +608,40 @@ class Pipeline:
         SPOUT_CALLBACKS = []
         source_processor = SourceProcessor(message)
 
-        self.check_values(values, message)
+        limit = self.char_limit(message)
+        self.check_values(values, limit)
 
         ### This loop iterates over the pipeline's pipes as they are applied in sequence. (first > second > third)
-        for groupMode, parsedPipes in self.parsed_segments:
+        for segment in self.segments:
+
+            ## CASE: A run of per-item pipes under the default group mode: Chain them lazily onto the stream of values.
+            if type(segment) is FusedSegment:
+                stages = []
+                for pipe in segment.parsedPipes:
+                    args = await source_processor.evaluate_composite_source(MacroPlan.bind(pipe.argstr, bindings))
+                    errors.steal(source_processor.errors, context='args for "{}"'.format(pipe.name))
+                    stages.append( (pipe.name, args, self.item_function(pipe.name, args, errors)) )
+                if profiler.active():
+                    # Streaming would spread the work out over whichever stage consumes it, so run them eagerly instead.
+                    if type(values) is not list: values = list(values)
+                    with profiler.stage('pipes', ' > '.join(name for name, _, _ in stages), values, histogram=False) as stage:
+                        values = list(self.stream_pipes(values, stages, errors, limit))
+                        stage.done(values)
+                else:
+                    values = self.stream_pipes(values, stages, errors, limit)
+                continue
+
+            groupMode, parsedPipes = segment
+
+            ## Any other segment is a barrier: It needs the entire flow at once, so materialize the stream.
+            if type(values) is not list:
+                values = list(values)
+
             newValues = []
             newPrintValues = []
 
             # The group mode turns the [values], [pipes] into a list of ([values], pipe) pairs
-            # For more information: Check out groupmodes.py
+            # Where [values] is usually a lightweight view on the values, for more information: Check out groupmodes.py
             ### This loop essentially iterates over the pipes as they are applied in parallel. ( [first|second|third] )
             for vals, pipe in groupMode.apply(values, parsedPipes):
 
@@ -469,10 +650,13 @@ class Pipeline:
                     newValues.extend(vals)
                     continue
 
+                ## The group is only turned into an actual list of values now that a pipe needs it.
+                vals = groupmodes.materialize(vals)
+
                 ## CASE: The pipe is actually an inline pipeline
                 if type(pipe) is Pipeline:
                     pipeline = pipe
-                    values, pl_printValues, pl_errors, pl_SPOUT_CALLBACKS = await pipeline.apply(vals, message)
+                    values, pl_printValues, pl_errors, pl_SPOUT_CALLBACKS = await pipeline.apply(vals, message, bindings)
                     newValues.extend(values)
                     errors.extend(pl_errors, 'braces')
                     # TODO: consider the life long quandry of what exactly the fuck to do with the spout/print state of the inline pipeline.
@@ -481,7 +665,7 @@ class Pipeline:
 
                 ## CASE: The pipe is a regular pipe, given as a name and string of arguments.
                 name = pipe.name
-                args = pipe.argstr
+                args = MacroPlan.bind(pipe.argstr, bindings)
 
                 # Put items in the arg string if necessary
                 args, ignored_vals, vals = self.items_into_args(args, vals)
@@ -503,9 +687,12 @@ class Pipeline:
 
                 elif name in pipes:
                     try:
-                        newValues.extend(pipes[name](vals, args))
+                        with profiler.stage('pipe', name, vals) as stage:
+                            output = pipes[name](vals, args)
+                            if stage: stage.done(output)
+                        newValues.extend(output)
                     except Exception as e:
-                        errors('Failed to process pipe "{}" with args "{}":\n\t{}: {}'.format(name, args, e.__class__.__name__, e))
+                        errors.record('pipe', name, args, e.__class__.__name__, str(e))
                         newValues.extend(vals)
 
                 elif name in spouts:
@@ -513,36 +700,135 @@ class Pipeline:
                     try:
                         SPOUT_CALLBACKS.append(spouts[name](vals, args))
                     except Exception as e:
-                        errors('Failed to process spout "{}" with args "{}":\n\t{}: {}'.format(name, args, e.__class__.__name__, e))
+                        errors.record('spout', name, args, e.__class__.__name__, str(e))
 
                 elif name in pipe_macros:
-                    code = pipe_macros[name].apply_args(args)
-                    ## Load the cached pipeline if we already parsed this code once before
-                    if code in pipe_macros.pipeline_cache:
-                        macro = pipe_macros.pipeline_cache[code]
-                    else:
-                        macro = Pipeline(code)
-                        pipe_macros.pipeline_cache[code] = macro
-
-                    newvals, macro_printValues, macro_errors, macro_SPOUT_CALLBACKS = await macro.apply(vals, message)
+                    macro, plan = await MacroPlan.get(pipe_macros, name)
+                    _, macro_pipeline, macro_bindings = plan.instantiate(macro.parse_args(args))
+
+                    with MacroGraph.expand('pipe', name), profiler.stage('macro', name, vals, histogram=False) as stage:
+                        newvals, macro_printValues, macro_errors, macro_SPOUT_CALLBACKS = await macro_pipeline.apply(vals, message, macro_bindings)
+                        if stage: stage.done(newvals)
                     newValues.extend(newvals)
                     errors.extend(macro_errors, name)
                     #TODO: what to do here?
                     SPOUT_CALLBACKS += macro_SPOUT_CALLBACKS
 
                 else:
-                    errors('Unknown pipe "{}".'.format(name))
+                    errors.record('unknown pipe', name)
                     newValues.extend(vals)
 
             values = newValues
             if len(newPrintValues):
                 printValues.append(newPrintValues)
 
-            self.check_values(values, message)
+            self.check_values(values, limit)
+
+        ## Materialize whatever is left of the stream.
+        if type(values) is not list:
+            values = list(values)
 
         return values, printValues, errors, SPOUT_CALLBACKS
 
 
+class MacroPlan:
+    '''
+    A macro's code compiled once, for all possible argument values.
+
+    The code is parsed with a marker in each of its $holes$. If every marker ends up inside some pipe's arguments,
+    that one Pipeline is reused for any arguments, which are bound to it as it's applied (see Pipeline.apply).
+    Otherwise, or if an argument's value might change how the code parses, the code is filled in as text instead,
+    and the Pipelines parsed from those texts are cached as well.
+    '''
+    MARK = '\ue000'
+    END = '\ue001'
+    mark_regex = re.compile('\ue000(\\d+)\ue001')
+    # Argument values that could mean something different when pasted into the code as text than when bound to the Pipeline.
+    unsafe_regex = re.compile(r'[>|\[\]\\(){}"µ§\ue000\ue001]|-$|^\s|\s$')
+    # How many Pipelines parsed from filled in texts to keep.
+    TEXTS = 8
+
+    def __init__(self, macro, split_source=False):
+        self.code = macro.code
+        self.template = macro.template()
+        self.split_source = split_source
+        self.texts = LRU(MacroPlan.TEXTS)
+        self.source = None
+        self.pipeline = None
+
+        if MacroPlan.MARK in self.code or MacroPlan.END in self.code:
+            return
+        marked = self.template.fill({hole: MacroPlan.MARK + str(i) + MacroPlan.END for i, hole in enumerate(self.template.holes)})
+        source, pipeline = PipelineProcessor.split(marked) if split_source else (None, marked)
+        pipeline = Pipeline(pipeline)
+        if MacroPlan.only_in_args(pipeline):
+            self.source = source
+            self.pipeline = pipeline
+
+    @staticmethod
+    async def get(macros, name, split_source=False):
+        '''Returns the named macro and its plan, compiling the plan if it isn't cached.'''
+        macro = await macros.fetch(name)
+        plan = macros.plans.get(name, macro.code)
+        if plan is None:
+            plan = macros.plans.put(name, MacroPlan(macro, split_source))
+            # Make sure the graph knows what this macro depends on, so its plan is discarded if any of those change.
+            macro_graph.dependencies_in((macros.kind, name), macro.code)
+        return macro, plan
+
+    @staticmethod
+    def contains_mark(obj):
+        '''Whether the marker occurs anywhere in a (group mode) object's attributes.'''
+        if isinstance(obj, str): return MacroPlan.MARK in obj
+        if isinstance(obj, re.Pattern): return MacroPlan.MARK in obj.pattern
+        if isinstance(obj, dict): return any(MacroPlan.contains_mark(k) or MacroPlan.contains_mark(v) for k, v in obj.items())
+        if isinstance(obj, (list, tuple, set)): return any(MacroPlan.contains_mark(o) for o in obj)
+        if hasattr(obj, '__dict__'): return MacroPlan.contains_mark(vars(obj))
+        return False
+
+    @staticmethod
+    def only_in_args(pipeline):
+        '''Whether all markers in the pipeline are in pipes' arguments, i.e. not in any names or group modes.'''
+        for groupMode, parsedPipes in pipeline.parsed_segments:
+            if MacroPlan.contains_mark(groupMode):
+                return False
+            for pipe in parsedPipes:
+                if type(pipe) is Pipeline:
+                    if not MacroPlan.only_in_args(pipe): return False
+                elif MacroPlan.MARK in pipe.name:
+                    return False
+        return True
+
+    @staticmethod
+    def bind(string, bindings):
+        '''Replace the markers in a string with their bound values.'''
+        if bindings is None or MacroPlan.MARK not in string:
+            return string
+        return re.sub(MacroPlan.mark_regex, lambda m: bindings[int(m.group(1))], string)
+
+    def instantiate(self, args):
+        '''
+        Returns (source, pipeline, bindings) for the given arguments.
+        source is None unless split_source, bindings is None if the arguments were filled into the code as text.
+        '''
+        if self.pipeline is not None:
+            bindings = [ args[hole] if hole in args else '$' + hole + '$' for hole in self.template.holes ]
+            if all( value is not None and not MacroPlan.unsafe_regex.search(value) for value in bindings ):
+                return MacroPlan.bind(self.source, bindings) if self.split_source else None, self.pipeline, bindings
+
+        code = self.template.fill(args)
+        source, code = PipelineProcessor.split(code) if self.split_source else (None, code)
+        if code in self.texts:
+            pipeline = self.texts[code]
+        else:
+            pipeline = self.texts[code] = Pipeline(code)
+        return source, pipeline, None
+
+    def size(self):
+        '''Rough upper bound on how much space the plan takes up, in characters of code.'''
+        return len(self.code) * (1 + MacroPlan.TEXTS)
+
+
 class PipelineProcessor:
     def __init__(self, bot, prefix):
         self.bot = bot
@@ -550,12 +836,22 @@ class PipelineProcessor:
         # LRU cache holding up to 40 items... probably don't need any more
         self.script_cache = LRU(40)
         SourceResources.bot = bot
+        # Record into the bot's metrics registry if it's a libneko bot, the process-wide one otherwise.
+        registry = getattr(bot, 'metrics', metrics.default_registry)
+        self.script_cache_metrics = metrics.CacheMetrics('scripts', registry)
+        self.script_seconds = registry.histogram('pipes_script_seconds', 'Time taken to execute each script.', ('script',))
+        # Dispatched by libneko bots when they log out or close; other bots rely on the atexit hook.
+        bot.add_listener(self.on_logout, 'on_logout')
+
+    async def on_logout(self):
+        '''Write the variable changes that haven't been written yet.'''
+        SourceResources.variables.close()
 
     async def on_message(self, message):
         '''Check if an incoming message triggers any custom Events.'''
-        for event in events.values():
+        for event in await events.in_channel(message.channel.id):
             if event.test(message):
-                await self.execute_script(event.script, message)
+                await self.execute_script(event.script, message, name='event ' + event.name)
 
     async def print(self, dest, output):
         ''' Nicely print the output in rows and columns and even with little arrows.'''
@@ -619,11 +915,16 @@ class PipelineProcessor:
             p = c
         return script.strip(), ''
 
-    async def execute_script(self, script, message):
+    async def execute_script(self, script, message, profile=False, name='script'):
+        '''Execute a script, name is what its execution time is recorded under in the process-wide metrics.'''
         errors = ErrorLog()
+        MacroGraph.new_script()
+        if profile: profile = profiler.start()
+        start = time.perf_counter()
 
         ### STEP 0: PRE-PROCESSING
         ## Check if we have executed this exact script recently
+        self.script_cache_metrics(script in self.script_cache)
         if script in self.script_cache:
             # Fetch the previous pre-processing results from cache
             source, pipeline = self.script_cache[script]
@@ -646,7 +947,7 @@ class PipelineProcessor:
             ### STEP 3: (MUMBLING INCOHERENTLY)
 
             ## Put the thing there
-            SourceResources.previous_pipeline_output = values
+            SourceResources.previous_pipeline_output[message.channel.id] = values
 
             ## Print the output!
             # TODO: ~~SPOUT CALLBACK HAPPENS HERE~~
@@ -656,7 +957,13 @@ class PipelineProcessor:
                 await self.print(message.channel, printValues)
 
             for callback, args, values in SPOUT_CALLBACKS:
-                await callback(self.bot, message, values, **args)
+                with profiler.stage('spout', callback.__name__.replace('_spout', ''), values):
+                    await callback(self.bot, message, values, **args)
+
+            ## Print the profile!
+            if profile:
+                profile.finish()
+                await message.channel.send(embed=profile.embed())
 
             ## Print error output!
             if errors:
@@ -668,6 +975,10 @@ class PipelineProcessor:
             await message.channel.send(embed=errors.embed())
             raise e
 
+        finally:
+            if profile: profiler.stop()
+            self.script_seconds.labels(name).observe(time.perf_counter() - start)
+
     async def process_script(self, message):
         '''This is the starting point for all script execution.'''
         text = message.content
@@ -684,6 +995,10 @@ class PipelineProcessor:
         if re.match(r'\s*(NEW|EDIT|DESC)\s+(hidden)?(pipe|source).*::', script, re.I):
             await parse_macro_command(script, message)
 
+        ##### PROFILED SCRIPT EXECUTION: >> !profile <script>
+        elif script.lstrip().startswith('!profile'):
+            await self.execute_script(script.lstrip()[len('!profile'):], message, profile=True)
+
         ##### EVENT DEFINITION:
         elif await events.parse_command(script, message.channel):
             pass
@@ -0,0 +1,152 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from discord import Embed
+import utils.texttools as texttools
+
+###############################################################
+#                           Profiler                          #
+###############################################################
+
+# Running a script as ">>!profile script" records how long each of its pipes, sources, macros and spouts took,
+# and how many values (and characters) went in and came out of each, and shows the result as a table.
+# Regardless of profiling, the time each one takes is also added to a process-wide Histogram for its name.
+
+class Histogram:
+    '''Histogram of durations, in buckets of powers of two microseconds.'''
+    BUCKETS = 32
+
+    def __init__(self):
+        self.buckets = [0] * Histogram.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length(), Histogram.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        '''Upper bound (in seconds) of the bucket containing the p-th percentile.'''
+        target = p * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min((1 << i) / 1e6, self.max)
+        return 0.0
+
+# (kind, name) → Histogram
+histograms = defaultdict(Histogram)
+
+
+class Stage:
+    '''A single measured thing that happened during a profiled script's execution.'''
+    __slots__ = ('kind', 'name', 'depth', 'time', 'count_in', 'chars_in', 'count_out', 'chars_out')
+    def __init__(self, kind, name, depth, values):
+        self.kind = kind
+        self.name = name
+        self.depth = depth
+        self.time = 0.0
+        self.count_in, self.chars_in = Profile.measure(values)
+        self.count_out = self.chars_out = None
+
+    def done(self, values):
+        self.count_out, self.chars_out = Profile.measure(values)
+
+
+class Profile:
+    '''The Stages recorded during a single profiled script's execution, in the order they started.'''
+    def __init__(self):
+        self.stages = []
+        self.start = time.perf_counter()
+        self.total = None
+
+    @staticmethod
+    def measure(values):
+        if values is None or not hasattr(values, '__len__'): return None, None
+        return len(values), sum(len(v) for v in values)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+    def embed(self):
+        total = self.total or (time.perf_counter() - self.start)
+        width = max((2*s.depth + len(s.kind) + len(s.name) + 1 for s in self.stages), default=5)
+        width = min(width, 32)
+        rows = ['{:<{}} {:>8} {:>5}  {}'.format('stage', width, 'ms', '%', 'items (chars)')]
+        for s in self.stages:
+            label = ('  ' * s.depth + s.kind + ' ' + s.name)[:width]
+            io = '{} ({})'.format(s.count_in, s.chars_in) if s.count_in is not None else '-'
+            if s.count_out is not None: io += ' → {} ({})'.format(s.count_out, s.chars_out)
+            rows.append('{:<{}} {:>8.2f} {:>5.1f}  {}'.format(label, width, s.time*1000, 100*s.time/total if total else 0, io))
+
+        text = '\n'.join(rows)
+        # Embed descriptions are limited to 2048 characters
+        if len(text) > 1900:
+            text = text[:1900] + '\n...'
+        embed = Embed(title='Profile', description=texttools.block_format(text), color=0x44aaff)
+        embed.set_footer(text='Total: {:.2f}ms, {} stages'.format(total*1000, len(self.stages)))
+        return embed
+
+# The Profile of the script currently being executed, if it's being profiled.
+_profile = ContextVar('profile', default=None)
+# How deeply nested the current stage is, a ContextVar since sources are evaluated concurrently.
+_depth = ContextVar('profile_depth', default=0)
+
+def active():
+    return _profile.get() is not None
+
+def start():
+    '''Start profiling the current script, returns its Profile.'''
+    profile = Profile()
+    _profile.set(profile)
+    return profile
+
+def stop():
+    _profile.set(None)
+
+@contextmanager
+def stage(kind, name, values=None, histogram=True):
+    '''
+    Context for timing a single stage, yields its Stage if profiling (and None otherwise),
+    which the caller should give the output values using .done(values).
+    histogram should be False for names that aren't from a limited set, so we don't keep adding new histograms.
+    '''
+    profile = _profile.get()
+    record = token = None
+    if profile is not None:
+        depth = _depth.get()
+        record = Stage(kind, name, depth, values)
+        profile.stages.append(record)
+        token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        if histogram: histograms[kind, name].add(elapsed)
+        if record is not None:
+            record.time = elapsed
+            _depth.reset(token)
+
+def stats_table(n=20, max_chars=1900):
+    '''A table of the n (kind, name)s that took up the most time in total, cut short to fit in max_chars.'''
+    top = sorted(histograms.items(), key=lambda item: item[1].total, reverse=True)[:max(n, 1)]
+    rows = ['{:<24} {:>7} {:>9} {:>8} {:>8} {:>8}'.format('name', 'calls', 'total ms', 'p50 ms', 'p95 ms', 'max ms')]
+    chars = len(rows[0])
+    for (kind, name), h in top:
+        row = '{:<24} {:>7} {:>9.1f} {:>8.2f} {:>8.2f} {:>8.2f}'.format(
+            (kind + ' ' + name)[:24], h.count, h.total*1000, h.percentile(.5)*1000, h.percentile(.95)*1000, h.max*1000)
+        chars += len(row) + 1
+        # Messages are limited to 2000 characters
+        if chars > max_chars:
+            rows.append('...')
+            break
+        rows.append(row)
+    return '\n'.join(rows)
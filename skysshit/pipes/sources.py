@@ -6,6 +6,9 @@ from functools import wraps
 
 from .signature import Sig
 from .pipe import Source, Pipes
+from . import database
+from .variables import Variables, SCOPES, namespace_key
+from lru import LRU
 
 from utils.texttools import *
 from utils.rand import *
@@ -53,8 +56,10 @@ def make_source(signature, pass_message=False, command=False):
 
 # Add fields here to make them easily accessible (readable and writable) both inside and outside of this file.
 class SourceResources:
-    previous_pipeline_output = []
-    var_dict = {'TEST': ['testing', '1', '2', 'three!']}
+    # The output of the previous script, by channel id
+    previous_pipeline_output = LRU(1000)
+    # Variables only persist across restarts with the sqlite backend
+    variables = Variables(database.connect(database.DIR(database.FILENAME)) if database.BACKEND == 'sqlite' else None)
     bot = None
 
 
@@ -230,23 +235,27 @@ async def custom_emoji_source(message, n):
 #####################################################
 _CATEGORY = 'BOT'
 
-@make_source({})
-async def output_source():
-    '''The entire set of output from the previous script that ran.'''
-    # TODO: make this work PER CHANNEL
-    return SourceResources.previous_pipeline_output
+@make_source({}, pass_message=True)
+async def output_source(message):
+    '''The entire set of output from the previous script that ran in this channel.'''
+    return SourceResources.previous_pipeline_output.get(message.channel.id, [])
 
 
 @make_source({
     'name'    : Sig(str, None, 'The variable name'),
-    'default' : Sig(str, None, 'The default value in case the variable isn\'t assigned (None to throw an error if it isn\'t assigned)', required=False)
-}, command=True)
-async def get_source(name, default):
-    '''Loads variables stored using the "set" pipe'''
-    if name in SourceResources.var_dict or default is None:
-        return SourceResources.var_dict[name]
-    else:
-        return [default]
+    'default' : Sig(str, None, 'The default value in case the variable isn\'t assigned (None to throw an error if it isn\'t assigned)', required=False),
+    'scope'   : Sig(str, None, 'Only look in this namespace: user/channel/guild (None to look in that order)', required=False, options=SCOPES),
+}, pass_message=True, command=True)
+async def get_source(message, name, default, scope):
+    '''Loads variables stored using the "set" spout'''
+    for scope in ([scope] if scope else SCOPES):
+        try:
+            return await SourceResources.variables.get(namespace_key(scope.lower(), message), name)
+        except KeyError:
+            pass
+    if default is None:
+        raise KeyError(name)
+    return [default]
 
 
 #####################################################
@@ -5,6 +5,7 @@ from discord import Embed
 from .signature import Sig
 from .pipe import Spout, Pipes
 from .sources import SourceResources
+from .variables import SCOPES, namespace_key
 from .events import events
 
 
@@ -81,10 +82,13 @@ async def suppress_print_spout(bot, message, values):
     pass
 
 
-@make_spout({'name' : Sig(str, None, 'The variable name')}, command=True)
-async def set_spout(bot, message, values, name):
+@make_spout({
+    'name' : Sig(str, None, 'The variable name'),
+    'scope': Sig(str, 'channel', 'Which namespace to store it in: user/channel/guild', options=SCOPES),
+}, command=True)
+async def set_spout(bot, message, values, name, scope):
     '''Stores the input as a variable with the given name, which can be retreived with {get (name)}.'''
-    SourceResources.var_dict[name] = values
+    await SourceResources.variables.set(namespace_key(scope.lower(), message), name, values)
 
 
 @make_spout({})
@@ -0,0 +1,189 @@
+import time
+import atexit
+import pickle
+import sqlite3
+import asyncio
+from collections import OrderedDict
+
+from lru import LRU
+
+from . import database
+
+###############################################################
+#                          Variables                          #
+###############################################################
+
+# Variables set using the "set" spout live in a namespace belonging to a guild, a channel or a user,
+# so that scripts in one server can't see (or clobber) the variables of another.
+# Each namespace has a quota on the total size of its variables, and evicts its least recently used ones to stay within it.
+# Variables also expire after a while of not being set.
+# Only recently used namespaces are kept in memory; all changes are written to the database in batches.
+# Expired variables are removed from memory when they're next looked up, and from the database every purge_interval.
+
+SCOPES = ['user', 'channel', 'guild']
+
+def namespace_key(scope, message):
+    '''The key of the namespace for the given scope, for the given message.'''
+    if scope == 'user':
+        return 'user:{}'.format(message.author.id)
+    # DMs don't have a guild, fall back to the channel.
+    if scope == 'guild' and message.guild is not None:
+        return 'guild:{}'.format(message.guild.id)
+    return 'channel:{}'.format(message.channel.id)
+
+
+class Namespace:
+    '''The variables in a single namespace, from least to most recently used, along with their total size.'''
+    __slots__ = ('vars', 'size')
+    def __init__(self):
+        # name -> (values, time set)
+        self.vars = OrderedDict()
+        self.size = 0
+
+
+def var_size(name, values):
+    return len(name) + sum(len(v) for v in values)
+
+
+class Variables:
+    '''
+    Namespaced variable store with O(1) get and set.
+        quota:          The maximum total size (in characters) of the variables in a single namespace.
+        max_vars:       The maximum number of variables in a single namespace.
+        ttl:            Variables expire this many seconds after being set. (None to never expire)
+        max_namespaces: The number of namespaces to keep in memory.
+        flush_interval: How many seconds changes are collected before being written to the database together.
+        purge_interval: At most how often expired variables are deleted from the database, along with a flush.
+    '''
+    def __init__(self, db=None, quota=100000, max_vars=1000, ttl=30*24*60*60, max_namespaces=1000, flush_interval=5, purge_interval=60*60):
+        self.db = db
+        self.quota = quota
+        self.max_vars = max_vars
+        self.ttl = ttl
+        self.namespaces = LRU(max_namespaces)
+        self.flush_interval = flush_interval
+        # Changes not yet written: key -> {name: (values, time set), or None if deleted}
+        self.dirty = {}
+        self.flush_handle = None
+        self.purge_interval = purge_interval
+        self.purged_at = 0
+        if db is not None:
+            # Don't lose the last few seconds of changes when the process exits.
+            atexit.register(self.close)
+
+    ## Namespaces
+
+    async def namespace(self, key):
+        if key in self.namespaces:
+            return self.namespaces[key]
+        ns = Namespace()
+        # Changes that were made while the namespace was out of memory, but haven't been written yet.
+        # (Those that get flushed while we wait on the query will be written after it's done, so hold on to them.)
+        pending = dict(self.dirty.get(key, {}))
+        if self.db is not None:
+            rows = await self.db.query_async('SELECT name, data FROM variables WHERE kind=?', (key,))
+            # Someone else may have loaded it while we were waiting.
+            if key in self.namespaces: return self.namespaces[key]
+            for name, data in rows:
+                ns.vars[name] = pickle.loads(data)
+        pending.update(self.dirty.get(key, {}))
+        for name, var in pending.items():
+            if var is None: ns.vars.pop(name, None)
+            else: ns.vars[name] = var
+        # Oldest first, so that's what we evict first.
+        ns.vars = OrderedDict(sorted(ns.vars.items(), key=lambda item: item[1][1]))
+        ns.size = sum(var_size(name, values) for name, (values, _) in ns.vars.items())
+        self.namespaces[key] = ns
+        return ns
+
+    ## Getting and setting
+
+    def expired(self, var):
+        return self.ttl is not None and time.time() - var[1] > self.ttl
+
+    async def get(self, key, name):
+        '''Get a variable's values from the given namespace, raises KeyError if it doesn't exist.'''
+        ns = await self.namespace(key)
+        var = ns.vars.get(name)
+        if var is None:
+            raise KeyError(name)
+        if self.expired(var):
+            self.remove(key, ns, name)
+            raise KeyError(name)
+        ns.vars.move_to_end(name)
+        return var[0]
+
+    async def set(self, key, name, values):
+        '''Set a variable in the given namespace, evicting the least recently used ones if that exceeds its quota.'''
+        size = var_size(name, values)
+        if size > self.quota:
+            raise ValueError('Variable "{}" is too big to be stored ({} > {} characters).'.format(name, size, self.quota))
+        ns = await self.namespace(key)
+        if name in ns.vars:
+            self.remove(key, ns, name)
+        while ns.vars and (ns.size + size > self.quota or len(ns.vars) >= self.max_vars):
+            self.remove(key, ns, next(iter(ns.vars)))
+
+        var = ns.vars[name] = (values, time.time())
+        ns.size += size
+        self.mark(key, name, var)
+
+    def remove(self, key, ns, name):
+        values, _ = ns.vars.pop(name)
+        ns.size -= var_size(name, values)
+        self.mark(key, name, None)
+
+    ## Writing back
+
+    def mark(self, key, name, var):
+        if self.db is None: return
+        self.dirty.setdefault(key, {})[name] = var
+        if self.flush_handle is not None: return
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None and loop.is_running():
+            self.flush_handle = loop.call_later(self.flush_interval, self.flush)
+        else:
+            self.flush()
+
+    def flush(self, wait=False):
+        '''Write all pending changes to the database in a single transaction, waiting for it to finish if wait is True.'''
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        statements = []
+        now = time.time()
+        if self.ttl is not None and now - self.purged_at >= self.purge_interval:
+            # Goes first, so it can't delete anything written below.
+            if not self.purged_at:
+                statements.append(('UPDATE variables SET set_at=? WHERE set_at IS NULL', (now,)))
+            statements.append(('DELETE FROM variables WHERE set_at < ?', (now - self.ttl,)))
+            self.purged_at = now
+        for key, changes in self.dirty.items():
+            for name, var in changes.items():
+                if var is None:
+                    statements.append(('DELETE FROM variables WHERE kind=? AND name=?', (key, name)))
+                else:
+                    statements.append(('INSERT OR REPLACE INTO variables (kind, name, data, set_at) VALUES (?, ?, ?, ?)', (key, name, pickle.dumps(var), var[1])))
+        self.dirty = {}
+        if not statements: return
+        if not wait:
+            self.db.execute(*statements)
+            return
+        try:
+            self.db.call(self.db._execute, statements)
+        except RuntimeError:
+            # The database thread was already shut down, because the interpreter is exiting.
+            connection = sqlite3.connect(self.db.path)
+            try:
+                with connection:
+                    for sql, params in statements: connection.execute(sql, params)
+            finally:
+                connection.close()
+
+    def close(self):
+        '''Write all pending changes right away, e.g. because the bot is shutting down.'''
+        if self.db is None: return
+        self.flush(wait=True)
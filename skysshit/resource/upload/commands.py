@@ -1,6 +1,7 @@
 import aiohttp
 import discord
 from discord.ext import commands
+from libneko import metrics
 from resource.upload import uploads
 from mycommands import MyCommands
 import utils.texttools as texttools
@@ -21,7 +22,7 @@ class UploadCommands(MyCommands):
         attached = ctx.message.attachments[0]
         print(attached)
 
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[metrics.trace_config()]) as session:
             async with session.get(attached.url) as response:
                 text = await response.text()
 
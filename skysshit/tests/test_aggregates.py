@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
+import collections
+import random
 import re
+import time
 import unittest
 
 import asynctest
@@ -19,10 +23,146 @@ class OrderedSetTest(unittest.TestCase):
     def test_mutable_ordered_set(self):
         in_data = [10, 9, 9, 10, 8, 5, 4, 7, 6, 3, 1, 0, 10, 10, 4]
         out_data = [10, 9, 8, 5, 4, 7, 6, 3, 1, 0]
-        fos = aggregates.FrozenOrderedSet(in_data)
-        result = list(fos)
+        mos = aggregates.MutableOrderedSet(in_data)
+        result = list(mos)
         self.assertEqual(out_data, result)
 
+    def test_empty(self):
+        self.assertEqual([], list(aggregates.FrozenOrderedSet()))
+        self.assertEqual([], list(aggregates.MutableOrderedSet()))
+
+    def test_frozen_indexing(self):
+        fos = aggregates.FrozenOrderedSet("hello world")
+        self.assertEqual("h", fos[0])
+        self.assertEqual("d", fos[-1])
+        self.assertEqual(4, fos.index(" "))
+        with self.assertRaises(ValueError):
+            fos.index("z")
+
+    def test_frozen_set_api(self):
+        fos = aggregates.FrozenOrderedSet([3, 1, 2])
+        other = aggregates.FrozenOrderedSet([2, 5])
+        self.assertEqual([3, 1, 2, 5], list(fos | other))
+        self.assertEqual([2], list(fos & other))
+        self.assertEqual([3, 1], list(fos - other))
+        self.assertEqual([3, 1, 5], list(fos ^ other))
+        self.assertEqual({1, 2, 3}, fos)
+        self.assertEqual(hash(frozenset({1, 2, 3})), hash(fos))
+        self.assertEqual(hash(aggregates.FrozenOrderedSet([2, 3, 1])), hash(fos))
+        self.assertTrue(fos.issubset([1, 2, 3, 4]))
+        self.assertTrue(fos.issuperset([1, 2]))
+        self.assertTrue(fos.isdisjoint({7}))
+        self.assertIsInstance(fos | other, aggregates.FrozenOrderedSet)
+
+    def test_mutable_discard_does_not_raise(self):
+        mos = aggregates.MutableOrderedSet([1, 2, 3])
+        mos.discard(4)
+        mos.discard(2)
+        mos.discard(2)
+        self.assertEqual([1, 3], list(mos))
+        with self.assertRaises(KeyError):
+            mos.remove(2)
+
+    def test_mutable_indexing_after_removal(self):
+        mos = aggregates.MutableOrderedSet(range(10))
+        for i in (0, 9, 4, 5):
+            mos.discard(i)
+        self.assertEqual([1, 2, 3, 6, 7, 8], list(mos))
+        self.assertEqual([1, 2, 3, 6, 7, 8], [mos[i] for i in range(len(mos))])
+        self.assertEqual(8, mos[-1])
+        self.assertEqual([2, 3, 6], mos[1:4])
+        self.assertEqual(3, mos.index(6))
+        with self.assertRaises(IndexError):
+            _ = mos[6]
+
+    def test_mutable_set_api(self):
+        mos = aggregates.MutableOrderedSet([1, 2])
+        mos |= [3]
+        mos -= {1}
+        mos ^= {2, 7}
+        self.assertEqual([3, 7], list(mos))
+        mos.update([8], [9, 3])
+        self.assertEqual([3, 7, 8, 9], list(mos))
+        mos.intersection_update([9, 7, 3])
+        self.assertEqual([3, 7, 9], list(mos))
+        mos.difference_update([7])
+        self.assertEqual([3, 9], list(mos))
+        self.assertEqual(9, mos.pop())
+        self.assertEqual(3, mos.pop(0))
+        with self.assertRaises(KeyError):
+            mos.pop()
+        self.assertIs(aggregates.OrderedSet, aggregates.MutableOrderedSet)
+
+    def test_mutable_matches_dict(self):
+        rng = random.Random(1)
+        mos, expected = aggregates.MutableOrderedSet(), {}
+        for _ in range(5000):
+            op, x = rng.random(), rng.randrange(100)
+            if op < 0.5:
+                mos.add(x)
+                expected.setdefault(x, None)
+            elif op < 0.9:
+                mos.discard(x)
+                expected.pop(x, None)
+            elif expected:
+                i = rng.randrange(len(expected))
+                self.assertEqual([*expected][i], mos[i])
+            self.assertEqual(len(expected), len(mos))
+        self.assertEqual([*expected], list(mos))
+
+
+class OrderedSetScalingTest(unittest.TestCase):
+    """
+    Rough benchmarks: ten times as many operations on ten times as many elements
+    should take nowhere near a hundred times as long.
+    """
+
+    @staticmethod
+    def _time(func, n):
+        start = time.perf_counter()
+        func(n)
+        return time.perf_counter() - start
+
+    def _assert_scales_linearly(self, func):
+        small, large = self._time(func, 2_000), self._time(func, 20_000)
+        self.assertLess(large, small * 30, f"{small:.4f}s for 2k, {large:.4f}s for 20k")
+
+    def test_frozen_contains(self):
+        def run(n):
+            fos = aggregates.FrozenOrderedSet(range(n))
+            for i in range(n):
+                assert i in fos
+
+        self._assert_scales_linearly(run)
+
+    def test_mutable_getitem(self):
+        def run(n):
+            mos = aggregates.MutableOrderedSet(range(n))
+            for i in range(n):
+                assert mos[i] == i
+
+        self._assert_scales_linearly(run)
+
+    def test_mutable_getitem_while_removing_from_front(self):
+        def run(n):
+            mos = aggregates.MutableOrderedSet(range(2 * n))
+            for i in range(n):
+                mos.discard(i)
+                assert mos[0] == i + 1
+
+        self._assert_scales_linearly(run)
+
+    def test_mutable_random_removal(self):
+        def run(n):
+            mos = aggregates.MutableOrderedSet(range(n))
+            order = [*range(n)]
+            random.Random(n).shuffle(order)
+            for i in order:
+                mos.discard(i)
+            assert not mos
+
+        self._assert_scales_linearly(run)
+
 
 class ProxyTest(unittest.TestCase):
     def test_init_dict(self):
@@ -139,17 +279,139 @@ class ObservableAsyncQueueTest(asynctest.TestCase):
         view2 = oaq.view
         self.assertIs(view1, view2)
 
-    async def test_getitem_uses_view(self):
+    async def test_view_is_unaffected_by_later_changes(self):
         oaq = aggregates.ObservableAsyncQueue()
-        await oaq.put("9")
-        await oaq.put("18")
+        await oaq.put_many(["9", "18", "27", "36"])
+
+        view = oaq.view
+        await oaq.put("0")
+        await oaq.get()
+
+        self.assertEqual(["9", "18", "27", "36"], list(view))
+        self.assertEqual(["18", "27", "36", "0"], list(oaq.view))
+
+    async def test_iterator_is_unaffected_by_later_changes(self):
+        oaq = aggregates.ObservableAsyncQueue()
+        await oaq.put_many(range(5))
+
+        started = iter(oaq)
+        not_started = iter(oaq)
+        self.assertEqual(0, next(started))
+        for _ in range(3):
+            oaq.get_nowait()
+        await oaq.put(5)
+
+        self.assertEqual([1, 2, 3, 4], list(started))
+        self.assertEqual([0, 1, 2, 3, 4], list(not_started))
+        self.assertEqual([3, 4, 5], list(oaq))
+
+    async def test_view_is_not_copied_if_not_held(self):
+        oaq = aggregates.ObservableAsyncQueue()
+        await oaq.put_many(["9", "18"])
+        buffer = oaq._queue
+
+        self.assertEqual(2, len(oaq.view))
         await oaq.put("27")
+        self.assertIs(buffer, oaq._queue)
+
+        view = oaq.view
         await oaq.put("36")
+        self.assertIsNot(buffer, oaq._queue)
+        self.assertEqual(3, len(view))
+
+    async def test_getitem_peeks_without_copying(self):
+        oaq = aggregates.ObservableAsyncQueue()
+        await oaq.put_many(["9", "18", "27", "36"])
+
+        self.assertEqual("9", oaq[0])
+        self.assertEqual("27", oaq[2])
+        self.assertEqual("36", oaq[-1])
+        self.assertEqual(["18", "27"], oaq[1:3])
+        self.assertIn("18", oaq)
+        self.assertNotIn("45", oaq)
+        self.assertIsNone(oaq._snapshot)
+
+        with self.assertRaises(IndexError):
+            _ = oaq[4]
+
+    async def test_version(self):
+        oaq = aggregates.ObservableAsyncQueue()
+        versions = [oaq.version]
+        await oaq.put("9")
+        versions.append(oaq.version)
+        await oaq.unshift("0")
+        versions.append(oaq.version)
+        await oaq.get()
+        versions.append(oaq.version)
+        await oaq.pop()
+        versions.append(oaq.version)
+        self.assertEqual(sorted(set(versions)), versions)
 
         view = oaq.view
-        view.append("0")
+        self.assertEqual(oaq.version, view.version)
+
+    async def test_put_many_get_many(self):
+        oaq = aggregates.ObservableAsyncQueue()
+        await oaq.put_many(range(10))
+        self.assertEqual([0, 1, 2], await oaq.get_many(3))
+        self.assertEqual([*range(3, 10)], await oaq.get_many())
 
-        self.assertEqual("0", oaq[4])
+    async def test_get_many_waits(self):
+        oaq = aggregates.ObservableAsyncQueue()
+        task = asyncio.ensure_future(oaq.get_many())
+        await asyncio.sleep(0)
+        self.assertFalse(task.done())
+        await oaq.put_many([1, 2])
+        self.assertEqual([1, 2], await task)
+
+    async def test_put_many_waits_for_space(self):
+        oaq = aggregates.ObservableAsyncQueue(maxsize=2)
+        task = asyncio.ensure_future(oaq.put_many(range(5)))
+        got = []
+        while len(got) < 5:
+            got += await oaq.get_many()
+        await task
+        self.assertEqual([*range(5)], got)
+
+    async def test_unshift_wakes_getter(self):
+        oaq = aggregates.ObservableAsyncQueue()
+        task = asyncio.ensure_future(oaq.get())
+        await asyncio.sleep(0)
+        await oaq.unshift("0")
+        self.assertEqual("0", await asyncio.wait_for(task, 1))
+
+    async def test_ring_buffer_matches_deque(self):
+        rng = random.Random(1)
+        ring, dq = aggregates._RingBuffer(), collections.deque()
+        for _ in range(5000):
+            op = rng.random()
+            if op < 0.3:
+                ring.append(op), dq.append(op)
+            elif op < 0.5:
+                ring.appendleft(op), dq.appendleft(op)
+            elif op < 0.7 and dq:
+                self.assertEqual(dq.popleft(), ring.popleft())
+            elif op < 0.9 and dq:
+                self.assertEqual(dq.pop(), ring.pop())
+            elif dq:
+                i = rng.randrange(len(dq))
+                self.assertEqual(dq[i], ring[i])
+            self.assertEqual(len(dq), len(ring))
+        self.assertEqual(list(dq), list(ring))
+
+    async def test_inspecting_is_cheap_under_load(self):
+        # Peeking and snapshotting between every put should stay linear overall.
+        def churn(n):
+            oaq = aggregates.ObservableAsyncQueue()
+            start = time.perf_counter()
+            for i in range(n):
+                oaq.put_nowait(i)
+                oaq.view.version
+                _ = oaq[len(oaq) // 2]
+            return time.perf_counter() - start
+
+        small, large = churn(2_000), churn(20_000)
+        self.assertLess(large, small * 30)
 
     async def test_unshift_works(self):
         oaq = aggregates.ObservableAsyncQueue()
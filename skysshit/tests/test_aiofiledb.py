@@ -112,3 +112,219 @@ class AioFileDbNoExternalAcccess(AioFileDbTesterMixin, asynctest.TestCase):
 
 class AioFileDbExpectExternalAcccess(AioFileDbTesterMixin, asynctest.TestCase):
     ASSUME_NO_EXTERNAL_CHANGES = False
+
+
+class AioFileDbJournaled(asynctest.TestCase):
+    FILE_NAME = "test-journal-db.json"
+
+    def tearDown(self):
+        for suffix in ("", ".wal", ".wal.1", ".tmp"):
+            if os.path.exists(self.FILE_NAME + suffix):
+                os.remove(self.FILE_NAME + suffix)
+
+    def setUp(self):
+        self.tearDown()
+        with open(self.FILE_NAME, "w") as fp:
+            fp.write('{"existing": 1}')
+
+    def open(self, **kwargs):
+        return aiofiledb.AsyncSimpleDatabase(self.FILE_NAME, journal=True, **kwargs)
+
+    async def test_changes_survive_reopening(self):
+        db = self.open()
+        await db.set("foo", 1)
+        await db.set("bar", [1, 2])
+        await db.delete("existing")
+        db.close()
+
+        # The snapshot itself is untouched, the changes are in the log.
+        with open(self.FILE_NAME) as fp:
+            self.assertEqual({"existing": 1}, json.load(fp))
+
+        db = self.open()
+        await db.wait_for_ready()
+        self.assertEqual({"foo": 1, "bar": [1, 2]}, dict(db.items()))
+        db.close()
+
+    async def test_concurrent_writes_share_a_commit(self):
+        db = self.open(commit_latency=0.05)
+        await db.wait_for_ready()
+        await asyncio.gather(*(db.set(f"key{i % 10}", i) for i in range(1000)))
+
+        with open(self.FILE_NAME + ".wal") as fp:
+            records = fp.read().splitlines()
+        # Every write to the same key within the commit is coalesced into one record.
+        self.assertEqual(10, len(records))
+        db.close()
+
+        db = self.open()
+        await db.wait_for_ready()
+        self.assertEqual(999, await db.get("key9"))
+        db.close()
+
+    async def test_compaction(self):
+        db = self.open(compact_after=10)
+        await db.wait_for_ready()
+        for i in range(25):
+            await db.set(str(i), i)
+        await db.write_to_disk()
+
+        with open(self.FILE_NAME) as fp:
+            data = json.load(fp)
+        self.assertEqual(26, len(data))
+        self.assertFalse(os.path.exists(self.FILE_NAME + ".wal"))
+        db.close()
+
+    async def test_compaction_while_mutating(self):
+        # Values are often mutated in place: get the cached object, change it, then set it again.
+        db = self.open()
+        await db.wait_for_ready()
+        for i in range(2 * aiofiledb.SNAPSHOT_CHUNK_SIZE):
+            await db.set(str(i), {"n": i})
+        await db.set("big", {str(i): i for i in range(100_000)})
+
+        compacting = asyncio.ensure_future(db.write_to_disk())
+        i = 0
+        while not compacting.done():
+            value = await db.get("big")
+            value[f"extra{i}"] = i
+            await db.set("big", value)
+            i += 1
+            await asyncio.sleep(0)
+        await compacting
+        await db.flush()
+        db.close()
+
+        db = self.open()
+        await db.wait_for_ready()
+        big = await db.get("big")
+        self.assertEqual(100_000 + i, len(big))
+        self.assertEqual(i - 1, big[f"extra{i - 1}"])
+        self.assertEqual(2 * aiofiledb.SNAPSHOT_CHUNK_SIZE + 2, len(dict(db.items())))
+        db.close()
+
+    async def test_failed_background_compaction_is_logged(self):
+        db = self.open(compact_after=5, commit_latency=0)
+        await db.wait_for_ready()
+
+        def fail(_):
+            raise OSError("disk full")
+
+        db._write_snapshot = fail
+        with self.assertLogs(db.log, level="ERROR"):
+            for i in range(10):
+                await db.set("foo", i)
+                await db.flush()
+            await asyncio.wait([db._compaction])
+        db.close()
+
+        db = self.open()
+        await db.wait_for_ready()
+        self.assertEqual(9, await db.get("foo"))
+        db.close()
+
+    async def test_torn_record_is_discarded(self):
+        db = self.open()
+        await db.set("foo", 1)
+        db.close()
+        with open(self.FILE_NAME + ".wal", "a") as fp:
+            fp.write('{"set": {"bar"')
+
+        db = self.open()
+        await db.wait_for_ready()
+        self.assertNotIn("bar", db)
+        await db.set("baz", 2)
+        db.close()
+
+        db = self.open()
+        await db.wait_for_ready()
+        self.assertEqual({"existing": 1, "foo": 1, "baz": 2}, dict(db.items()))
+        db.close()
+
+
+class AioFileDbChangeDetection(asynctest.TestCase):
+    FILE_NAME = "test-change-db.json"
+
+    def setUp(self):
+        with open(self.FILE_NAME, "w") as fp:
+            fp.write('{"foo": 1}')
+
+    def tearDown(self):
+        os.remove(self.FILE_NAME)
+
+    def make_db(self, expect_no_other_access):
+
+        class Tester(aiofiledb.AsyncSimpleDatabase):
+            reads = 0
+
+            async def read_data_from_disk(self):
+                type(self).reads += 1
+                await super().read_data_from_disk()
+
+        return Tester(self.FILE_NAME, expect_no_other_access=expect_no_other_access)
+
+    async def test_unchanged_file_is_not_reread(self):
+        for expect_no_other_access in (True, False):
+            db = self.make_db(expect_no_other_access)
+            for _ in range(100):
+                await db.get("foo")
+            await db.set("bar", 2)
+            await db.get("bar")
+            self.assertEqual(1, type(db).reads)
+            db.close()
+
+    async def test_external_change_is_reloaded(self):
+        db = self.make_db(False)
+        self.assertEqual(1, await db.get("foo"))
+
+        with open(self.FILE_NAME, "w") as fp:
+            fp.write('{"foo": 2, "bar": 3}')
+
+        self.assertEqual(2, await db.get("foo"))
+        self.assertEqual(2, await db.size())
+        self.assertEqual(2, type(db).reads)
+        db.close()
+
+
+class ShardedAioFileDb(asynctest.TestCase):
+    FILE_NAME = "test-sharded-db.json"
+    SHARDS = 4
+
+    def tearDown(self):
+        for i in range(self.SHARDS):
+            path = f"{self.FILE_NAME}.{i}-of-{self.SHARDS}"
+            if os.path.exists(path):
+                os.remove(path)
+
+    def open(self):
+        return aiofiledb.ShardedAsyncSimpleDatabase(self.FILE_NAME, shards=self.SHARDS)
+
+    async def test_get_set_delete(self):
+        db = self.open()
+        await db.wait_for_ready()
+        await db.set("foo", 1)
+        await db.set_many({str(i): i for i in range(100)})
+        await db.delete("50")
+
+        self.assertEqual(1, await db.get("foo"))
+        self.assertEqual(100, await db.size())
+        self.assertEqual({"1": 1, "99": 99}, await db.get_many(["1", "50", "99"]))
+        with self.assertRaises(KeyError):
+            await db.get("50")
+        db.close()
+
+        db = self.open()
+        await db.wait_for_ready()
+        self.assertEqual(100, await db.size())
+        self.assertEqual(1, await db.get("foo"))
+        db.close()
+
+    async def test_keys_are_spread_over_shards(self):
+        db = self.open()
+        await db.set_many({str(i): i for i in range(100)})
+        for shard in db.shards:
+            self.assertGreater(await shard.size(), 0)
+            with open(shard._file_name) as fp:
+                for key in json.load(fp):
+                    self.assertIs(shard, db.shard_for(key))
+        db.close()
@@ -42,3 +42,39 @@ class AioJsonTest(asynctest.TestCase):
             obj = await aiojson.aioload(fp)
 
         self.assertEqual(test_data_obj, obj)
+
+    async def test_large_roundtrip(self):
+        obj = {str(i): {"values": list(range(i % 7)), "name": f"item {i}"} for i in range(20000)}
+        self.assertTrue(aiojson._is_large(obj))
+
+        async with filesystem.aioopen(test_file, "w") as fp:
+            await aiojson.aiodump(obj, fp, indent=1)
+
+        with open(test_file) as fp:
+            data = fp.read()
+        self.assertEqual(json.dumps(obj, indent=1), data)
+        self.assertGreater(len(data), aiojson.LOAD_EXECUTOR_THRESHOLD)
+
+        async with filesystem.aioopen(test_file) as fp:
+            self.assertEqual(obj, await aiojson.aioload(fp))
+
+    async def test_aioload_beyond_orjson(self):
+        # Valid for the json module, but not for orjson, which is used when installed.
+        raw = '{"nan": NaN, "inf": Infinity, "big": 123456789012345678901234567890}'
+        with open(test_file, "w") as fp:
+            fp.write(raw)
+
+        async with filesystem.aioopen(test_file) as fp:
+            obj = await aiojson.aioload(fp)
+
+        self.assertNotEqual(obj["nan"], obj["nan"])
+        self.assertEqual(float("inf"), obj["inf"])
+        self.assertEqual(123456789012345678901234567890, obj["big"])
+
+    async def test_aioload_invalid(self):
+        with open(test_file, "w") as fp:
+            fp.write('{"foo": ')
+
+        async with filesystem.aioopen(test_file) as fp:
+            with self.assertRaises(json.JSONDecodeError):
+                await aiojson.aioload(fp)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests the event loop monitor notices, and attributes, a blocked event loop.
+"""
+import asyncio
+import time
+
+import asynctest
+from discord.ext import commands
+
+from libneko import loopmonitor, metrics
+
+
+class BlockingCog(commands.Cog):
+    def block(self, seconds):
+        time.sleep(seconds)
+
+
+class LoopMonitorTest(asynctest.TestCase):
+    async def test_measures_lag(self):
+        registry = metrics.Registry()
+        monitor = loopmonitor.LoopMonitor(interval=0.01, threshold=0.5, registry=registry)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            monitor.stop()
+        self.assertGreater(registry["event_loop_lag_seconds"].count, 0)
+        self.assertFalse(monitor.stalls)
+
+    async def test_detects_stall(self):
+        registry = metrics.Registry()
+        monitor = loopmonitor.LoopMonitor(interval=0.01, threshold=0.1, registry=registry)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            BlockingCog().block(0.4)
+            await asyncio.sleep(0.05)
+        finally:
+            monitor.stop()
+
+        self.assertEqual(1, len(monitor.stalls))
+        stall = monitor.stalls[0]
+        self.assertGreaterEqual(stall.duration, 0.3)
+        self.assertEqual("BlockingCog", stall.cog)
+        self.assertIsNone(stall.command)
+        self.assertIn("block", [frame.name for frame in stall.stack])
+        self.assertEqual(1, registry["event_loop_stalls_total"].labels("BlockingCog", "").value)
+        self.assertEqual(1, registry["event_loop_stall_seconds"].count)
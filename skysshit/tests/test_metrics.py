@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests the metrics registry, its Prometheus rendering and its HTTP endpoint.
+"""
+import asyncio
+import random
+import unittest
+
+import asynctest
+
+from libneko import metrics
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentiles_within_precision(self):
+        h = metrics.Registry().histogram("h", "Test.")
+        data = [random.uniform(1e-5, 10) for _ in range(5000)]
+        for value in data:
+            h.observe(value)
+        data.sort()
+        for p in (0.5, 0.9, 0.99):
+            expected = data[int(p * len(data)) - 1]
+            self.assertAlmostEqual(expected, h.percentile(p), delta=expected * 0.07)
+        self.assertEqual(len(data), h.count)
+        self.assertEqual(data[-1], h.max)
+
+    def test_small_values_are_exact(self):
+        h = metrics.Registry().histogram("h", "Test.", unit=1)
+        for value in range(1, 11):
+            h.observe(value)
+        self.assertEqual(5, h.percentile(0.5))
+        self.assertEqual(10, h.percentile(1))
+
+    def test_empty(self):
+        h = metrics.Registry().histogram("h", "Test.")
+        self.assertEqual(0.0, h.percentile(0.5))
+
+
+class RegistryTest(unittest.TestCase):
+    def test_same_metric_is_shared(self):
+        registry = metrics.Registry()
+        a = registry.counter("c", "Test.", ("x",))
+        b = registry.counter("c", "Test.", ("x",))
+        self.assertIs(a, b)
+
+        with self.assertRaises(ValueError):
+            registry.gauge("c", "Test.", ("x",))
+
+    def test_label_count_checked(self):
+        counter = metrics.Registry().counter("c", "Test.", ("x", "y"))
+        with self.assertRaises(ValueError):
+            counter.labels("a")
+
+    def test_counter_cannot_decrease(self):
+        counter = metrics.Registry().counter("c", "Test.")
+        with self.assertRaises(ValueError):
+            counter.inc(-1)
+
+    def test_render(self):
+        registry = metrics.Registry()
+        registry.counter("requests_total", "Requests.", ("path",)).labels('/a"b').inc(3)
+        registry.gauge("depth", "Depth.", function=lambda: 7)
+        registry.histogram("latency_seconds", "Latency.").observe(0.5)
+
+        text = registry.render()
+        self.assertIn("# TYPE requests_total counter", text)
+        self.assertIn('requests_total{path="/a\\"b"} 3', text)
+        self.assertIn("depth 7", text)
+        self.assertIn("# TYPE latency_seconds summary", text)
+        self.assertIn('latency_seconds{quantile="0.5"}', text)
+        self.assertIn("latency_seconds_count 1", text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_cache_hit_rates(self):
+        registry = metrics.Registry()
+        cache = metrics.CacheMetrics("things", registry)
+        cache.hit()
+        cache.hit()
+        cache.hit()
+        cache.miss()
+        self.assertEqual({"things": (0.75, 4)}, metrics.CacheMetrics.hit_rates(registry))
+        self.assertIn("cache things: 75.0% hits of 4", registry.summary())
+
+
+class ServeTest(asynctest.TestCase):
+    async def test_serve(self):
+        registry = metrics.Registry()
+        registry.counter("foo_total", "Foo.").inc()
+        server = await metrics.serve(registry, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = (await reader.read()).decode()
+            writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+        self.assertTrue(response.startswith("HTTP/1.0 200 OK"))
+        self.assertIn("foo_total 1", response)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests planning reaction changes on navigators.
+"""
+import types
+
+import asynctest
+
+from libneko.pag import navigator
+
+
+def _user(id):
+    return types.SimpleNamespace(id=id)
+
+
+ME = _user(0)
+ALICE = _user(1)
+BOB = _user(2)
+
+
+class ReactionPlanTest(asynctest.TestCase):
+    def setUp(self):
+        self.cache = navigator._ReactionCache()
+
+    def test_nothing_there(self):
+        self.assertEqual((False, [], [], ["a", "b"]), self.cache.plan(["a", "b"], ME))
+
+    def test_already_correct(self):
+        for emoji in "ab":
+            self.cache.add(emoji, ME)
+        self.assertEqual((False, [], [], []), self.cache.plan(["a", "b"], ME))
+
+    def test_removes_clicks(self):
+        for emoji in "abc":
+            self.cache.add(emoji, ME)
+        self.cache.add("b", ALICE)
+        self.assertEqual((False, [], [("b", ALICE)], []), self.cache.plan(["a", "b", "c"], ME))
+
+    def test_adds_missing_to_end(self):
+        self.cache.add("a", ME)
+        self.assertEqual((False, [], [], ["b", "c"]), self.cache.plan(["a", "b", "c"], ME))
+
+    def test_removes_hidden(self):
+        for emoji in "abc":
+            self.cache.add(emoji, ME)
+        self.assertEqual((False, [], [("c", ME)], []), self.cache.plan(["a", "b"], ME))
+
+    def test_keeps_position_of_others_reaction(self):
+        # Someone reacted with a button before we got to it.
+        self.cache.add("a", ME)
+        self.cache.add("b", ALICE)
+        self.assertEqual((False, ["b"], [("b", ALICE)], []), self.cache.plan(["a", "b"], ME))
+
+    def test_out_of_order(self):
+        self.cache.add("b", ME)
+        self.cache.add("a", ME)
+        # a can stay where it is, but b has to be moved after it.
+        self.assertEqual((False, [], [("b", ME)], ["b"]), self.cache.plan(["a", "b"], ME))
+
+    def test_clears_when_cheaper(self):
+        for emoji in "abc":
+            self.cache.add(emoji, ME)
+            self.cache.add(emoji, ALICE)
+            self.cache.add(emoji, BOB)
+        should_clear, fill, removals, additions = self.cache.plan(["x"], ME)
+        self.assertTrue(should_clear)
+        self.assertEqual(["x"], additions)
+
+    def test_remove_and_clear(self):
+        self.cache.add("a", ME)
+        self.cache.add("a", ALICE)
+        self.cache.remove("a", ALICE)
+        self.cache.remove("a", ALICE)
+        self.assertEqual({"a": {0: ME}}, dict(self.cache.users))
+        self.cache.remove("a", ME)
+        self.assertEqual({}, dict(self.cache.users))
+        self.cache.add("a", ME)
+        self.cache.clear()
+        self.assertEqual({}, dict(self.cache.users))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests lazily produced navigator pages.
+"""
+import asyncio
+
+import asynctest
+
+from libneko.pag import pagesource
+
+
+class SequencePageSourceTest(asynctest.TestCase):
+    async def test_renders_on_demand(self):
+        rendered = []
+
+        def render(page, index):
+            rendered.append(index)
+            return page.upper()
+
+        source = pagesource.SequencePageSource(["a", "b", "c", "d", "e", "f"], render, prefetch=1)
+        self.assertEqual(6, len(source))
+        self.assertTrue(source.is_complete)
+        self.assertEqual("C", await source.get_page(2))
+        await asyncio.sleep(0)
+        # Only the page requested and the pages either side of it are rendered.
+        self.assertEqual({1, 2, 3}, set(rendered))
+
+    async def test_coroutine_render(self):
+        async def render(page, index):
+            return f"{index}:{page}"
+
+        source = pagesource.SequencePageSource(["a", "b"], render)
+        self.assertEqual("1:b", await source.get_page(1))
+
+    async def test_out_of_range(self):
+        source = pagesource.SequencePageSource(["a"])
+        with self.assertRaises(IndexError):
+            await source.get_page(1)
+        with self.assertRaises(IndexError):
+            await source.get_page(-1)
+
+    async def test_lru(self):
+        source = pagesource.SequencePageSource([*map(str, range(100))], prefetch=0, cache_size=3)
+        for i in range(10):
+            await source.get_page(i)
+        self.assertIsNone(source.cached(0))
+        self.assertEqual("9", source.cached(9))
+        self.assertEqual(3, len(source._rendered))
+
+    async def test_concurrent_requests_render_once(self):
+        calls = []
+
+        async def render(page, index):
+            calls.append(index)
+            await asyncio.sleep(0.01)
+            return page
+
+        source = pagesource.SequencePageSource(["a", "b"], render, prefetch=0)
+        pages = await asyncio.gather(*(source.get_page(0) for _ in range(5)))
+        self.assertEqual(["a"] * 5, pages)
+        self.assertEqual([0], calls)
+
+    def test_cache_too_small(self):
+        with self.assertRaises(ValueError):
+            pagesource.SequencePageSource([], prefetch=2, cache_size=4)
+
+
+class AsyncIteratorPageSourceTest(asynctest.TestCase):
+    async def test_pulls_lazily(self):
+        pulled = []
+
+        async def generate():
+            for i in range(1000):
+                pulled.append(i)
+                yield i
+
+        source = pagesource.AsyncIteratorPageSource(generate(), prefetch=0)
+        self.assertEqual(0, len(source))
+        self.assertFalse(source.is_complete)
+
+        self.assertEqual(4, await source.get_page(4))
+        self.assertEqual([0, 1, 2, 3, 4], pulled)
+        self.assertEqual(5, len(source))
+
+    async def test_exhausts(self):
+        source = pagesource.AsyncIteratorPageSource(iter("abc"), prefetch=0)
+        self.assertEqual("c", await source.get_page(2))
+        self.assertFalse(source.is_complete)
+
+        with self.assertRaises(IndexError):
+            await source.get_page(3)
+        self.assertTrue(source.is_complete)
+        self.assertEqual(3, len(source))
+
+    async def test_unbounded(self):
+        def forever():
+            i = 0
+            while True:
+                yield i
+                i += 1
+
+        source = pagesource.AsyncIteratorPageSource(forever(), lambda p, i: p * 2)
+        self.assertEqual(200, await source.get_page(100))
+        # Going backwards uses the pages that were already pulled.
+        self.assertEqual(20, await source.get_page(10))
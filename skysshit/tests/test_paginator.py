@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests the paginator, and that pagination is incremental and linear.
+"""
+import time
+
+import asynctest
+
+from libneko.pag import paginator
+
+
+class ExplodeTest(asynctest.TestCase):
+    def test_splits_after_boundaries(self):
+        parts = paginator._explode_on_any("foo bar-baz,  bork\nqux")
+        self.assertEqual(["foo ", "bar-", "baz, ", " ", "bork\n", "qux"], parts)
+
+    def test_empty(self):
+        self.assertEqual([], paginator._explode_on_any(""))
+
+    def test_rejoins_to_input(self):
+        string = "lorem ipsum-dolor sit\tamet, consectetur\r\nadipiscing " * 1000
+        self.assertEqual(string, "".join(paginator._explode_on_any(string)))
+
+
+class PaginatorTest(asynctest.TestCase):
+    def test_empty(self):
+        self.assertEqual([], paginator.Paginator().pages)
+
+    def test_pages_fit(self):
+        p = paginator.Paginator(max_chars=100, prefix="```", suffix="```")
+        for i in range(500):
+            p.add_line(f"line {i}")
+
+        pages = p.pages
+        self.assertGreater(len(pages), 1)
+        for page in pages:
+            self.assertLessEqual(len(page), 100)
+            self.assertTrue(page.startswith("```\n"))
+            self.assertTrue(page.endswith("\n```"))
+
+        lines = [line for page in pages for line in page.split("\n") if line.startswith("line")]
+        self.assertEqual([f"line {i}" for i in range(500)], lines)
+
+    def test_max_lines(self):
+        p = paginator.Paginator(max_lines=3)
+        p.add_lines(*map(str, range(10)))
+        self.assertEqual(["\n0\n1\n2\n", "\n3\n4\n5\n", "\n6\n7\n8\n", "\n9\n\n"], p.pages)
+
+    def test_page_break(self):
+        p = paginator.Paginator()
+        p.add("foo").add_page_break().add_page_break().add("bar")
+        self.assertEqual(["\nfoo\n", "\nbar\n"], p.pages)
+
+    def test_page_break_to_back_only_adds_to_back(self):
+        p = paginator.Paginator()
+        p.add("foo").add_page_break()
+        p.add("bar", to_back=False)
+        self.assertEqual(["\nbarfoo\n"], p.pages)
+
+    def test_force_truncation(self):
+        p = paginator.Paginator(max_chars=12)
+        p.add("x" * 25)
+        pages = p.pages
+        self.assertEqual("x" * 25, "".join(page.strip() for page in pages))
+        self.assertTrue(all(len(page) <= 12 for page in pages))
+
+    def test_too_large_without_force_truncation(self):
+        p = paginator.Paginator(max_chars=12, force_truncation=False)
+        p.add("x" * 25)
+        with self.assertRaises(ValueError):
+            p.pages
+        # Still fails the same way on the next try.
+        with self.assertRaises(ValueError):
+            p.pages
+
+    def test_adding_to_back_after_paginating(self):
+        incremental = paginator.Paginator(max_chars=50)
+        for i in range(200):
+            incremental.add_line(f"item number {i}")
+            if i % 17 == 0:
+                incremental.pages
+
+        at_once = paginator.Paginator(max_chars=50)
+        for i in range(200):
+            at_once.add_line(f"item number {i}")
+
+        self.assertEqual(at_once.pages, incremental.pages)
+
+    def test_adding_to_front_after_paginating(self):
+        p = paginator.Paginator(max_chars=50)
+        p.add_lines("b", "c")
+        self.assertEqual(["\nb\nc\n\n"], p.pages)
+        p.add_line("a", to_back=False)
+        self.assertEqual(["\na\nb\nc\n\n"], p.pages)
+
+    def test_invert_after_paginating(self):
+        p = paginator.Paginator()
+        p.add("a", "b", "c")
+        self.assertEqual(["\nabc\n"], p.pages)
+        ~p
+        self.assertEqual(["\ncba\n"], p.pages)
+
+    def test_near_linear(self):
+        def paginate(n):
+            p = paginator.Paginator()
+            for i in range(n):
+                p.add_line(f"line {i} of some text that goes on for a while")
+            start = time.perf_counter()
+            p.pages
+            return time.perf_counter() - start
+
+        small, large = paginate(5_000), paginate(50_000)
+        # Ten times the input should be nowhere near a hundred times slower.
+        self.assertLess(large, small * 30)
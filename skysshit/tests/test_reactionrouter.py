@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests the navigator reaction router and its timer wheel.
+"""
+import asyncio
+import types
+
+import asynctest
+
+from libneko.pag import reactionrouter
+
+
+class TimerWheelTest(asynctest.TestCase):
+    async def test_fires_after_delay(self):
+        wheel = reactionrouter.TimerWheel(asyncio.get_event_loop(), resolution=0.01, slots=8)
+        fired = asyncio.Event()
+        start = asyncio.get_event_loop().time()
+        wheel.schedule(0.05, fired.set)
+        self.assertEqual(1, len(wheel))
+
+        await asyncio.wait_for(fired.wait(), 1)
+        elapsed = asyncio.get_event_loop().time() - start
+        self.assertGreaterEqual(elapsed, 0.05)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(0, len(wheel))
+
+    async def test_goes_round_more_than_once(self):
+        # 3 slots of 10ms: a 100ms timer has to pass its slot a few times first.
+        wheel = reactionrouter.TimerWheel(asyncio.get_event_loop(), resolution=0.01, slots=3)
+        fired = []
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        wheel.schedule(0.1, lambda: fired.append(loop.time() - start))
+        await asyncio.sleep(0.3)
+        self.assertEqual(1, len(fired))
+        self.assertGreaterEqual(fired[0], 0.1)
+
+    async def test_order(self):
+        wheel = reactionrouter.TimerWheel(asyncio.get_event_loop(), resolution=0.01, slots=4)
+        fired = []
+        for delay in (0.08, 0.02, 0.05):
+            wheel.schedule(delay, lambda d=delay: fired.append(d))
+        await asyncio.sleep(0.2)
+        self.assertEqual([0.02, 0.05, 0.08], fired)
+
+    async def test_cancel(self):
+        wheel = reactionrouter.TimerWheel(asyncio.get_event_loop(), resolution=0.01)
+        fired = []
+        timer = wheel.schedule(0.02, lambda: fired.append(1))
+        timer.cancel()
+        timer.cancel()
+        self.assertEqual(0, len(wheel))
+        await asyncio.sleep(0.05)
+        self.assertEqual([], fired)
+
+    async def test_stops_ticking_when_empty(self):
+        wheel = reactionrouter.TimerWheel(asyncio.get_event_loop(), resolution=0.01)
+        wheel.schedule(0.01, lambda: None)
+        await asyncio.sleep(0.05)
+        self.assertIsNone(wheel._tick_handle)
+
+
+class _FakeBot:
+    def __init__(self):
+        self.loop = asyncio.get_event_loop()
+        self.listeners = {}
+
+    def add_listener(self, func, name):
+        self.listeners.setdefault(name, []).append(func)
+
+
+class _FakeNavigator:
+    def __init__(self):
+        self.reactions = []
+        self.deleted = []
+
+    async def _on_reaction_add(self, reaction, user):
+        self.reactions.append((reaction, user))
+
+    async def _on_message_delete(self, message):
+        self.deleted.append(message)
+
+
+def _message(id):
+    return types.SimpleNamespace(id=id)
+
+
+def _reaction(message_id):
+    return types.SimpleNamespace(message=_message(message_id))
+
+
+class ReactionRouterTest(asynctest.TestCase):
+    def test_one_router_per_bot(self):
+        bot = _FakeBot()
+        router = reactionrouter.ReactionRouter.for_bot(bot)
+        self.assertIs(router, reactionrouter.ReactionRouter.for_bot(bot))
+        for event in ("on_reaction_add", "on_reaction_remove", "on_reaction_clear"):
+            self.assertEqual(1, len(bot.listeners[event]))
+        self.assertEqual(1, len(bot.listeners["on_message_delete"]))
+        self.assertIsNot(router, reactionrouter.ReactionRouter.for_bot(_FakeBot()))
+
+    async def test_routes_to_owner_only(self):
+        router = reactionrouter.ReactionRouter(_FakeBot())
+        a, b = _FakeNavigator(), _FakeNavigator()
+        router.track(1, a)
+        router.track(2, b)
+
+        await router.on_reaction_add(_reaction(1), "user")
+        await router.on_reaction_add(_reaction(3), "user")
+
+        self.assertEqual(1, len(a.reactions))
+        self.assertEqual([], b.reactions)
+
+    async def test_message_delete(self):
+        router = reactionrouter.ReactionRouter(_FakeBot())
+        nav = _FakeNavigator()
+        router.track(1, nav)
+        router.track(2, nav)
+
+        await router.on_message_delete(_message(2))
+        self.assertEqual(1, len(nav.deleted))
+
+        # No longer routed.
+        await router.on_reaction_add(_reaction(2), "user")
+        self.assertEqual([], nav.reactions)
+        self.assertEqual(1, len(router))
+
+    async def test_untrack_all(self):
+        router = reactionrouter.ReactionRouter(_FakeBot())
+        nav = _FakeNavigator()
+        for i in range(5):
+            router.track(i, nav)
+        router.untrack_all(nav)
+        self.assertEqual(0, len(router))
+        self.assertEqual({}, router._navigators)
@@ -1,6 +1,7 @@
 import asyncio
 import aiohttp
 
+from libneko import metrics
 from utils import cache
 
 
@@ -9,7 +10,8 @@ class HTTPSession(aiohttp.ClientSession):
     """ Abstract class for aiohttp. """
 
     def __init__(self, loop=None):
-        super().__init__(loop=loop or asyncio.get_event_loop())
+        # Records request latencies by host, see libneko.metrics.
+        super().__init__(loop=loop or asyncio.get_event_loop(), trace_configs=[metrics.trace_config()])
 
     def __del__(self):
         """
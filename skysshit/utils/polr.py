@@ -8,6 +8,8 @@ Uses modified code from
 """
 import aiohttp
 
+from libneko import metrics
+
 
 def _get_ending(lookup_url: str, api_base: str):
     """
@@ -27,7 +29,7 @@ async def shorten(long_url: str, api_base: str, api_key: str):
         'key': api_key,
         'response_type': 'json'
     }
-    async with aiohttp.ClientSession() as sess:
+    async with aiohttp.ClientSession(trace_configs=[metrics.trace_config()]) as sess:
         async with sess.get(api_base + '/api/v2/action/shorten', params=params) as r:
             data = await r.json()
             action = data.get('action')
@@ -48,7 +50,7 @@ async def lookup(lookup_url: str, api_base: str, api_key: str):
         'key': api_key,
         'response_type': 'json'
     }
-    async with aiohttp.ClientSession() as sess:
+    async with aiohttp.ClientSession(trace_configs=[metrics.trace_config()]) as sess:
         async with sess.get(api_base + '/api/v2/action/lookup', params=params) as r:
             data = await r.json()
             action = data.get('action')
@@ -66,7 +68,7 @@ async def delete(short_url: str, api_base: str, api_key: str):
         'response_type': 'json'
     }
     url_ending = _get_ending(short_url, api_base)
-    async with aiohttp.ClientSession() as sess:
+    async with aiohttp.ClientSession(trace_configs=[metrics.trace_config()]) as sess:
         async with sess.get(api_base + f'/api/v2/links/{url_ending}', params=params) as r:
             data = await r.json()
             if data['message'] == 'OK':
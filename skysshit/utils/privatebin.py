@@ -22,6 +22,8 @@ import zlib
 import aiohttp
 from sjcl import SJCL
 
+from libneko import metrics
+
 
 def _encrypt(text: str, password: str = None):
     """
@@ -115,7 +117,7 @@ async def upload(text: str, expires: str, password: str = None, formatter: str =
     async with aiohttp.ClientSession(headers={
         'User-Agent': 'privatebin.py/0.1.3 aiohttp/%s python/%s' % (aiohttp.__version__, python_version),
         'X-Requested-With': 'JSONHttpRequest'
-    }) as session:
+    }, trace_configs=[metrics.trace_config()]) as session:
         for tries in range(2):
             async with session.post(server, data=payload) as resp:
                 resp_json = await resp.json()
@@ -145,7 +147,7 @@ async def get(url: str, password: str = None):
     async with aiohttp.ClientSession(headers={
         'User-Agent': 'privatebin.py/0.1.3 aiohttp/%s python/%s' % (aiohttp.__version__, python_version),
         'X-Requested-With': 'JSONHttpRequest'
-    }) as session:
+    }, trace_configs=[metrics.trace_config()]) as session:
         for tries in range(2):
             async with session.get(_to_url(server, paste_id)) as _get:
                 resp_json = await _get.json()